@@ -1,11 +1,14 @@
+import hashlib
 import json
 import logging
 import os
 import re
 import sqlite3
+from contextlib import contextmanager
 from datetime import date, datetime
 from typing import Any, Dict, List, Optional
 
+from core.result_set import ResultSet
 from metadata.constants import (
     COLUMN_LABEL_TO_FIELD,
     DEFAULT_PERMISSIONS,
@@ -15,15 +18,56 @@ from metadata.constants import (
     normalize_permissions,
     validate_table_name,
 )
+from metadata.query_options import EDUCATION_KEYWORDS, GRADE_OPTIONS, POSITION_MAPPING
 
 logger = logging.getLogger("Database")
 
 
 RELATED_TABLES = ("rewards", "family", "resume")
 RELATED_IMPORT_IDENTITY_COLUMNS = {"id", "person_id", "sequence", "name"}
+# 明细表内容哈希列，用于 (person_id, content_hash) 去重；
+# base_info 中为上次导入时业务列的行指纹，重新导入时跳过未变化的人员
+CONTENT_HASH_COLUMN = "content_hash"
 DATE_DISPLAY_SUFFIX = "_display"
+# 明细表导入使用的临时暂存表（TEMP，仅当前连接可见）
+RELATED_IMPORT_STAGE_TABLE = "related_import_stage"
 SQLITE_BUSY_TIMEOUT_MS = 10000
 SQLITE_CONNECT_TIMEOUT_SECONDS = SQLITE_BUSY_TIMEOUT_MS / 1000
+# 数据库结构版本，保存在 PRAGMA user_version 中；结构或迁移逻辑变化时递增。
+SCHEMA_VERSION = 7
+# 分页计数/页边界缓存的最大条目数，数据变化时整体失效
+SEARCH_CACHE_LIMIT = 32
+# 流式读取时每批从游标取出的行数
+STREAM_BATCH_SIZE = 1000
+# person_key = 规范化序号 + 分隔符 + 去空格姓名，作为人员身份的唯一索引键
+PERSON_KEY_SEPARATOR = "\x1f"
+# 查询维度编码列 -> 来源列；导入时按 metadata.query_options 的映射计算并建索引
+BASE_INFO_FACET_COLUMNS = {
+    "position_level": "current_position",
+    "grade_code": "current_grade",
+    "education_mask": "fulltime_education",
+    "parttime_education_mask": "parttime_education",
+}
+BASE_INFO_INTERNAL_COLUMNS = {"person_key", CONTENT_HASH_COLUMN, *BASE_INFO_FACET_COLUMNS}
+# system_config 中记录各表上次成功导入文件哈希的键前缀
+IMPORT_FILE_HASH_KEY_PREFIX = "import_file_hash:"
+# 由触发器记录写入的表；system_config 只记录会影响导出和分析列的年度考核区间
+CHANGE_LOG_TABLES = ("base_info", *RELATED_TABLES, "system_config")
+CHANGE_LOG_CONFIG_KEY = "assessment_years"
+# system_config 中记录各表上次增量导出覆盖到的变更版本号的键前缀
+DELTA_EXPORT_VERSION_KEY_PREFIX = "delta_export_version:"
+# 学历关键词位序，education_mask 第 i 位表示学历文本包含第 i 个关键词
+EDUCATION_FACET_KEYWORDS = tuple(
+    dict.fromkeys(keyword for keywords in EDUCATION_KEYWORDS.values() for keyword in keywords)
+)
+POSITION_LEVEL_BY_TITLE = {
+    title: level for level, titles in POSITION_MAPPING.items() for title in titles
+}
+# system_config 中记录现有编码所依据的映射哈希；与当前映射不一致时打开数据库即重新计算编码
+FACET_MAPPING_HASH_KEY = "facet_mapping_hash"
+FACET_MAPPING_HASH = hashlib.sha1(
+    json.dumps([GRADE_OPTIONS, POSITION_MAPPING, EDUCATION_KEYWORDS], ensure_ascii=False).encode("utf-8")
+).hexdigest()
 BLANK_PLACEHOLDERS = {"-", "—", "–", "－", "无", "無", "暂无", "无日期", "n/a", "na"}
 
 RELATED_TABLE_COLUMNS = {
@@ -39,6 +83,7 @@ RELATED_TABLE_COLUMNS = {
         ("punishment_unit", "TEXT"),
         ("punishment_authority_type", "TEXT"),
         ("impact_period", "TEXT"),
+        ("content_hash", "TEXT"),
     ],
     "family": [
         ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
@@ -49,14 +94,26 @@ RELATED_TABLE_COLUMNS = {
         ("political_status", "TEXT"),
         ("work_unit", "TEXT"),
         ("position", "TEXT"),
+        ("content_hash", "TEXT"),
     ],
     "resume": [
         ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
         ("person_id", "INTEGER NOT NULL"),
         ("resume_text", "TEXT"),
+        ("content_hash", "TEXT"),
     ],
 }
 
+# 参与内容哈希的业务列，按固定顺序排列，与物理列顺序无关
+RELATED_HASH_COLUMNS = {
+    table_name: [
+        column
+        for column, _ in columns
+        if column not in RELATED_IMPORT_IDENTITY_COLUMNS and column != CONTENT_HASH_COLUMN
+    ]
+    for table_name, columns in RELATED_TABLE_COLUMNS.items()
+}
+
 
 RELATED_TABLE_DISPLAY_COLUMNS = {
     "rewards": [
@@ -95,14 +152,50 @@ RELATED_TABLE_DISPLAY_COLUMNS = {
     ],
 }
 
+# 全文检索（FTS5 trigram）覆盖的文本列；外部内容表由触发器与源表保持同步
+FULLTEXT_TABLES = {
+    "base_info": (
+        "base_info_fts",
+        (
+            "name",
+            "current_position",
+            "current_legal_position",
+            "fulltime_education",
+            "fulltime_school",
+            "parttime_education",
+            "parttime_school",
+            "hometown",
+            "rewards",
+            "remarks",
+        ),
+    ),
+    "resume": ("resume_fts", ("resume_text",)),
+}
+# trigram 分词至少需要 3 个字符才能走索引，更短的词回退到 LIKE
+FULLTEXT_MIN_TERM_LENGTH = 3
+
+# 分页排序键（keyset 分页按这些列做 seek）
+BASE_INFO_ORDER_COLUMNS = ("b.id",)
+RELATED_ORDER_COLUMNS = ("r.person_id", "r.id")
+
 
 os.environ["DISABLE_XML"] = "1"
 
 
 class Database:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, open_existing: bool = False):
+        """Open the database.
+
+        open_existing=True is the fast path for background tasks: when the file
+        already carries the current schema version no DDL or migration runs.
+        """
         self.conn = None
+        self._search_cache = {}
+        self._search_cache_token = None
+        self._fulltext_available = None
         self.connect(db_path)
+        if open_existing and self.schema_is_current():
+            return
         self.create_tables()
 
     def connect(self, db_path=None):
@@ -202,15 +295,25 @@ class Database:
         labels = dict(TABLE_FIELD_LABELS.get(table_name, []))
         return labels.get(field_name, field_name)
 
-    def _invalid_date_message(self, table_name: str, row_index: int, field_name: str, value) -> str:
-        label = self._field_label(table_name, field_name)
+    @classmethod
+    def _invalid_date_message(cls, table_name: str, row_index: int, field_name: str, value) -> str:
+        label = cls._field_label(table_name, field_name)
         return (
             f"第 {row_index} 行“{label}”格式无效，当前值为“{value}”。"
             "请填写类似 1990-01、1990.01、1990/01、1990年1月 的年月，或直接留空。"
         )
 
+    def get_schema_version(self) -> int:
+        return int(self.conn.execute("PRAGMA user_version").fetchone()[0])
+
+    def schema_is_current(self) -> bool:
+        return self.get_schema_version() >= SCHEMA_VERSION
+
+    def _set_schema_version(self, version: int):
+        self.conn.execute(f"PRAGMA user_version = {int(version)}")
+
     def create_tables(self):
-        """Create or migrate core data tables."""
+        """Create core data tables; run migrations only when the schema version changed."""
         tables = {
             "base_info": """
                 CREATE TABLE IF NOT EXISTS base_info (
@@ -248,7 +351,13 @@ class Database:
                     assessment_2 TEXT,
                     assessment_3 TEXT,
                     assessment_4 TEXT,
-                    remarks TEXT
+                    remarks TEXT,
+                    person_key TEXT,
+                    grade_code INTEGER,
+                    position_level TEXT,
+                    education_mask INTEGER,
+                    parttime_education_mask INTEGER,
+                    content_hash TEXT
                 );
             """,
             "system_config": """
@@ -281,13 +390,25 @@ class Database:
 
         cursor = self.conn.cursor()
         try:
+            missing_tables = [table_name for table_name in tables if not self._table_exists(table_name)]
             for table_name, ddl in tables.items():
                 cursor.execute(ddl)
                 logger.info(f"表 {table_name} 创建/验证成功")
 
-            self._migrate_related_tables()
-            self._migrate_date_display_columns()
-            self._create_indexes()
+            if missing_tables or not self.schema_is_current():
+                self._migrate_base_info_person_key()
+                self._migrate_base_info_facets()
+                self._migrate_base_info_content_hash()
+                self._migrate_related_tables()
+                self._migrate_date_display_columns()
+                self._migrate_related_content_hashes()
+                self._migrate_fulltext_indexes()
+                self._migrate_change_log()
+                self._create_indexes()
+                self._set_schema_version(SCHEMA_VERSION)
+                logger.info(f"数据库结构已迁移到版本 {SCHEMA_VERSION}")
+            elif self._get_facet_mapping_hash() != FACET_MAPPING_HASH:
+                self._migrate_base_info_facets()
             self.conn.commit()
         except sqlite3.Error as e:
             self.conn.rollback()
@@ -386,20 +507,331 @@ class Database:
                 f"CREATE INDEX IF NOT EXISTS idx_{table_name}_person_id ON {table_name}(person_id)"
             )
 
+    def _migrate_base_info_person_key(self):
+        cursor = self.conn.cursor()
+        if "person_key" not in self.get_table_columns("base_info"):
+            cursor.execute("ALTER TABLE base_info ADD COLUMN person_key TEXT")
+
+        rows = cursor.execute(
+            "SELECT id, sequence, name FROM base_info WHERE person_key IS NULL ORDER BY id"
+        ).fetchall()
+        updates = []
+        duplicates: Dict[str, List[int]] = {}
+        if rows:
+            # 旧库中序号/姓名规范化后可能撞键：键留给最早的记录，其余记录保持 person_key 为空，
+            # 避免唯一索引建不起来导致整个库无法打开，重复的 id 写入日志供人工合并。
+            taken = dict(cursor.execute(
+                "SELECT person_key, id FROM base_info WHERE person_key IS NOT NULL"
+            ).fetchall())
+            for row in rows:
+                person_key = self._person_key(row["sequence"], row["name"])
+                if not person_key:
+                    continue
+                if person_key in taken:
+                    duplicates.setdefault(person_key, [taken[person_key]]).append(row["id"])
+                    continue
+                taken[person_key] = row["id"]
+                updates.append((person_key, row["id"]))
+        if updates:
+            cursor.executemany("UPDATE base_info SET person_key=? WHERE id=?", updates)
+            logger.info(f"已为 {len(updates)} 条人员记录生成 person_key")
+        if duplicates:
+            sample = "; ".join(
+                self._describe_duplicate_person_key(person_key, ids)
+                for person_key, ids in list(duplicates.items())[:5]
+            )
+            logger.warning(
+                f"base_info 存在 {len(duplicates)} 组重复人员键，仅保留每组 id 最小的记录参与按人员匹配，"
+                f"请合并其余记录: {sample}"
+            )
+
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_base_info_person_key ON base_info(person_key)"
+        )
+
+    def _migrate_base_info_facets(self):
+        cursor = self.conn.cursor()
+        columns = set(self.get_table_columns("base_info"))
+        for facet_column in BASE_INFO_FACET_COLUMNS:
+            if facet_column not in columns:
+                column_type = "TEXT" if facet_column == "position_level" else "INTEGER"
+                cursor.execute(f"ALTER TABLE base_info ADD COLUMN {facet_column} {column_type}")
+
+        source_columns = [
+            source for source in BASE_INFO_FACET_COLUMNS.values() if source in columns
+        ]
+        if source_columns:
+            facet_columns = list(self._base_info_facets({column: None for column in source_columns}))
+            rows = cursor.execute(
+                f"SELECT id, {', '.join(source_columns)}, {', '.join(facet_columns)} FROM base_info"
+            ).fetchall()
+            assignments = ", ".join(f"{column}=?" for column in facet_columns)
+            updates = []
+            for row in rows:
+                facets = self._base_info_facets({column: row[column] for column in source_columns})
+                values = [facets[column] for column in facet_columns]
+                # 只改写编码确实变化的行，重复迁移不产生写入（也不进入变更日志）；
+                # 学历掩码为 NULL 与 0 同义（导入时未给出学历列的行保持 NULL）
+                stored = [
+                    0 if row[column] is None and column.endswith("_mask") else row[column]
+                    for column in facet_columns
+                ]
+                if values != stored:
+                    updates.append(values + [row["id"]])
+            if updates:
+                cursor.executemany(f"UPDATE base_info SET {assignments} WHERE id=?", updates)
+                logger.info(f"已为 {len(updates)} 条人员记录计算查询维度编码")
+        cursor.execute(
+            "REPLACE INTO system_config (config_key, config_value) VALUES (?, ?)",
+            (FACET_MAPPING_HASH_KEY, FACET_MAPPING_HASH),
+        )
+
+        # 组合条件计数可直接由覆盖索引完成；未归入职务层级的职务仍按原值过滤
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_base_info_facets ON base_info({', '.join(BASE_INFO_FACET_COLUMNS)})"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_base_info_grade_code ON base_info(grade_code)")
+        if "current_position" in columns:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_base_info_current_position ON base_info(current_position)"
+            )
+
+    def _get_facet_mapping_hash(self) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT config_value FROM system_config WHERE config_key=?",
+            (FACET_MAPPING_HASH_KEY,),
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _base_info_facets(record: Dict[str, Any]) -> Dict[str, Any]:
+        """按 query_options 的映射计算查询维度编码，只返回记录中出现的来源列对应的编码。"""
+        facets = {}
+        if "current_grade" in record:
+            grade = record["current_grade"]
+            grade = str(grade).strip() if grade is not None else ""
+            facets["grade_code"] = GRADE_OPTIONS.index(grade) if grade in GRADE_OPTIONS else None
+        if "current_position" in record:
+            facets["position_level"] = POSITION_LEVEL_BY_TITLE.get(record["current_position"])
+        for mask_column in ("education_mask", "parttime_education_mask"):
+            source_column = BASE_INFO_FACET_COLUMNS[mask_column]
+            if source_column in record:
+                text = "" if record[source_column] is None else str(record[source_column])
+                facets[mask_column] = sum(
+                    1 << bit for bit, keyword in enumerate(EDUCATION_FACET_KEYWORDS) if keyword in text
+                )
+        return facets
+
+    def _migrate_base_info_content_hash(self):
+        # 旧数据没有行指纹，下次导入时视为已变化并写入指纹
+        if CONTENT_HASH_COLUMN not in self.get_table_columns("base_info"):
+            self.conn.execute(f"ALTER TABLE base_info ADD COLUMN {CONTENT_HASH_COLUMN} TEXT")
+
     def _migrate_related_tables(self):
         for table_name in RELATED_TABLES:
             if "person_id" not in self.get_table_columns(table_name):
                 self._migrate_related_table(table_name)
 
-    def _migrate_related_table(self, table_name: str):
+    def _migrate_related_content_hashes(self):
+        cursor = self.conn.cursor()
+        for table_name in RELATED_TABLES:
+            if CONTENT_HASH_COLUMN not in self.get_table_columns(table_name):
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {CONTENT_HASH_COLUMN} TEXT")
+
+            hash_columns = RELATED_HASH_COLUMNS[table_name]
+            rows = cursor.execute(
+                f"SELECT id, {', '.join(hash_columns)} FROM {table_name} WHERE {CONTENT_HASH_COLUMN} IS NULL"
+            ).fetchall()
+            if rows:
+                cursor.executemany(
+                    f"UPDATE {table_name} SET {CONTENT_HASH_COLUMN}=? WHERE id=?",
+                    [(self._related_content_hash(table_name, dict(row)), row["id"]) for row in rows],
+                )
+                logger.info(f"已为表 {table_name} 的 {len(rows)} 条记录生成内容哈希")
+
+            # 历史数据可能已有重复明细，因此只建普通索引，去重由导入流程保证
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table_name}_person_content "
+                f"ON {table_name}(person_id, {CONTENT_HASH_COLUMN})"
+            )
+
+    def _fulltext_module_available(self) -> bool:
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fulltext_probe USING fts5(text, tokenize='trigram')")
+            cursor.execute("DROP TABLE temp.fulltext_probe")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _fulltext_enabled(self) -> bool:
+        if self._fulltext_available is None:
+            self._fulltext_available = (
+                all(self._table_exists(fts_table) for fts_table, _ in FULLTEXT_TABLES.values())
+                and self._fulltext_module_available()
+            )
+        return self._fulltext_available
+
+    def _migrate_fulltext_indexes(self):
+        self._fulltext_available = None
+        if not self._fulltext_module_available():
+            logger.warning("当前 SQLite 不支持 FTS5 trigram 分词，全文检索将回退为 LIKE 查询")
+            return
+
+        cursor = self.conn.cursor()
+        for source_table, (fts_table, fulltext_columns) in FULLTEXT_TABLES.items():
+            source_columns = set(self.get_table_columns(source_table))
+            columns = [column for column in fulltext_columns if column in source_columns]
+            column_list = ", ".join(columns)
+            new_values = ", ".join(f"new.{column}" for column in columns)
+            old_values = ", ".join(f"old.{column}" for column in columns)
+            created = not self._table_exists(fts_table)
+            cursor.execute(
+                f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                    {column_list}, content='{source_table}', content_rowid='id', tokenize='trigram'
+                )
+                """
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_after_insert AFTER INSERT ON {source_table} BEGIN
+                    INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+                """
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_after_delete AFTER DELETE ON {source_table} BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                END
+                """
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_after_update AFTER UPDATE OF {column_list} ON {source_table} BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                    INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+                """
+            )
+            if created:
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+                logger.info(f"已为表 {source_table} 建立全文索引 {fts_table}")
+
+    def _migrate_change_log(self):
+        """建立变更日志及其触发器：每行数据只保留最后一次变更，版本号单调递增。"""
+        cursor = self.conn.cursor()
+        created = not self._table_exists("change_log")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS change_log (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                op TEXT NOT NULL,
+                UNIQUE(table_name, row_id)
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_table_version ON change_log(table_name, version)")
+        for table_name in CHANGE_LOG_TABLES:
+            for op, row in (("insert", "new"), ("update", "new"), ("delete", "old")):
+                when = f" WHEN {row}.config_key = '{CHANGE_LOG_CONFIG_KEY}'" if table_name == "system_config" else ""
+                # 先删后插而不用 REPLACE：外层语句的 OR IGNORE 等冲突子句会覆盖触发器内的冲突处理
+                cursor.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {table_name}_change_after_{op}
+                    AFTER {op.upper()} ON {table_name}{when} BEGIN
+                        DELETE FROM change_log WHERE table_name = '{table_name}' AND row_id = {row}.id;
+                        INSERT INTO change_log (table_name, row_id, op) VALUES ('{table_name}', {row}.id, '{op}');
+                    END
+                    """
+                )
+            if created:
+                # 已有数据视为一次插入，首次增量导出即为全量
+                where = f" WHERE config_key = '{CHANGE_LOG_CONFIG_KEY}'" if table_name == "system_config" else ""
+                cursor.execute(
+                    f"INSERT INTO change_log (table_name, row_id, op)"
+                    f" SELECT '{table_name}', id, 'insert' FROM {table_name}{where}"
+                )
+        if created:
+            logger.info("已建立变更日志 change_log")
+
+    def get_change_version(self) -> int:
+        """返回变更日志的当前版本号；业务数据或年度考核区间写入后都会增大。"""
+        row = self.conn.execute("SELECT MAX(version) FROM change_log").fetchone()
+        return int(row[0] or 0)
+
+    def get_table_change_version(self, table_name: str, include_deletes: bool = True) -> int:
+        """返回该表在变更日志中的最新版本号，没有变更时为 0。
+
+        include_deletes 为假时只看新增和修改，即仍存在的行的最新变更。
+        """
+        validate_table_name(table_name)
+        sql = "SELECT MAX(version) FROM change_log WHERE table_name=?"
+        if not include_deletes:
+            sql += " AND op <> 'delete'"
+        row = self.conn.execute(sql, (table_name,)).fetchone()
+        return int(row[0] or 0)
+
+    def changes_since(self, version: int, table_name: Optional[str] = None) -> ResultSet:
+        """返回版本号大于 version 的变更 (version, table_name, row_id, op)，按版本升序。
+
+        每行数据只保留最后一次变更：插入后又修改记为 update，删除记为 delete。
+        指定 table_name 时只返回该表的变更。
+        """
+        conditions = ["version > ?"]
+        params = [int(version)]
+        if table_name is not None:
+            if table_name not in CHANGE_LOG_TABLES:
+                raise ValueError(f"表 {table_name} 没有变更日志")
+            conditions.append("table_name = ?")
+            params.append(table_name)
+        cursor = self._tuple_cursor()
+        cursor.execute(
+            f"SELECT version, table_name, row_id, op FROM change_log WHERE {' AND '.join(conditions)} ORDER BY version",
+            params,
+        )
+        return ResultSet.from_cursor(cursor)
+
+    def get_delta_export_version(self, table_name: str) -> int:
+        """返回该表上次增量导出覆盖到的变更版本号，从未增量导出时为 0。"""
+        validate_table_name(table_name)
+        row = self.conn.execute(
+            "SELECT config_value FROM system_config WHERE config_key=?",
+            (DELTA_EXPORT_VERSION_KEY_PREFIX + table_name,),
+        ).fetchone()
+        try:
+            return int(row[0]) if row else 0
+        except (TypeError, ValueError):
+            return 0
+
+    def set_delta_export_version(self, table_names, version: int):
+        """记录这些表本次增量导出覆盖到的变更版本号，下次增量导出从这里开始。
+
+        只推进实际导出的表；没有导出的表下次仍从各自的版本号开始。
+        """
+        for table_name in table_names:
+            validate_table_name(table_name)
+        self.conn.executemany(
+            "REPLACE INTO system_config (config_key, config_value) VALUES (?, ?)",
+            [(DELTA_EXPORT_VERSION_KEY_PREFIX + table_name, str(int(version))) for table_name in table_names],
+        )
+        self.conn.commit()
+
+    def _ensure_unique_base_person_keys(self):
         duplicate_keys = self._find_duplicate_base_person_keys()
         if duplicate_keys:
-            sample = ", ".join(
-                f"sequence={sequence or '空'}, name={name}, count={count}"
-                for sequence, name, count in duplicate_keys[:5]
+            sample = "; ".join(
+                self._describe_duplicate_person_key(person_key, ids)
+                for person_key, ids in duplicate_keys[:5]
             )
             raise sqlite3.IntegrityError(f"base_info 存在重复人员键，无法迁移: {sample}")
 
+    def _migrate_related_table(self, table_name: str):
+        self._ensure_unique_base_person_keys()
+
         unmatched = self._find_unmatched_related_rows(table_name)
         if unmatched:
             sample = ", ".join(
@@ -438,17 +870,24 @@ class Database:
 
     def _find_duplicate_base_person_keys(self) -> List[tuple]:
         cursor = self.conn.cursor()
-        rows = cursor.execute("SELECT sequence, name FROM base_info").fetchall()
-        counts = {}
-        for row in rows:
-            key = (self._normalize_sequence(row["sequence"]), str(row["name"] or "").strip())
-            counts[key] = counts.get(key, 0) + 1
+        rows = cursor.execute(
+            """
+            SELECT person_key, GROUP_CONCAT(id) AS ids
+            FROM base_info
+            WHERE person_key IS NOT NULL
+            GROUP BY person_key
+            HAVING COUNT(*) > 1
+            """
+        ).fetchall()
         return [
-            (sequence, name, count)
-            for (sequence, name), count in counts.items()
-            if name and count > 1
+            (row["person_key"], sorted(int(person_id) for person_id in row["ids"].split(",")))
+            for row in rows
         ]
 
+    def _describe_duplicate_person_key(self, person_key: str, ids: List[int]) -> str:
+        sequence, name = self._split_person_key(person_key)
+        return f"sequence={sequence or '空'}, name={name}, ids={','.join(str(person_id) for person_id in ids)}"
+
     def _find_unmatched_related_rows(self, table_name: str) -> List[Dict]:
         cursor = self.conn.cursor()
         rows = cursor.execute(f"SELECT * FROM {table_name}").fetchall()
@@ -535,20 +974,24 @@ class Database:
         else:
             self._insert_related_rows(table_name, normalized_data)
 
-    def _normalize_import_rows(self, table_name: str, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        valid_columns = set(self.get_table_columns(table_name))
-        date_fields = set(TABLE_DATE_FIELDS.get(table_name, []))
-        related_business_columns = []
-        if table_name in RELATED_TABLES:
-            valid_columns.update({"sequence", "name"})
-            related_business_columns = self._related_business_columns(table_name)
+    def _normalize_import_rows(
+        self,
+        table_name: str,
+        data: List[Dict[str, Any]],
+        row_offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """规范化导入行；row_offset 为分批处理时此前已读取的行数，用于错误提示中的行号。"""
+        valid_columns, date_fields, related_business_columns = self._import_field_rules(table_name)
 
         normalized_data = []
-        for row_index, row in enumerate(data, start=1):
+        column_map = {}
+        for row_index, row in enumerate(data, start=row_offset + 1):
             normalized_row = {}
             for col_name, value in row.items():
-                normalized_col = self.normalize_column_name(col_name)
-                logger.debug(f"列名映射: '{col_name}' -> '{normalized_col}'")
+                normalized_col = column_map.get(col_name)
+                if normalized_col is None:
+                    normalized_col = column_map[col_name] = self.normalize_column_name(col_name)
+                    logger.debug(f"列名映射: '{col_name}' -> '{normalized_col}'")
                 if normalized_col in valid_columns:
                     if normalized_col == "sequence":
                         value = self._sequence_value_for_storage(value)
@@ -575,6 +1018,17 @@ class Database:
                 normalized_data.append(normalized_row)
         return normalized_data
 
+    def _import_field_rules(self, table_name: str) -> tuple:
+        """返回导入时可写入的列、日期列和明细表业务列。"""
+        valid_columns = set(self.get_table_columns(table_name))
+        valid_columns.difference_update({CONTENT_HASH_COLUMN, *BASE_INFO_INTERNAL_COLUMNS})
+        date_fields = set(TABLE_DATE_FIELDS.get(table_name, []))
+        related_business_columns = []
+        if table_name in RELATED_TABLES:
+            valid_columns.update({"sequence", "name"})
+            related_business_columns = self._related_business_columns(table_name)
+        return valid_columns, date_fields, related_business_columns
+
     @staticmethod
     def _is_blank_import_value(value) -> bool:
         return Database._is_blank_value(value)
@@ -585,18 +1039,27 @@ class Database:
             for column in self.get_table_columns(table_name)
             if (
                 column not in RELATED_IMPORT_IDENTITY_COLUMNS
+                and column != CONTENT_HASH_COLUMN
                 and not self._is_date_display_column(table_name, column)
             )
         ]
 
+    @staticmethod
+    def _related_content_hash(table_name: str, record: Dict[str, Any]) -> str:
+        """按固定列顺序计算明细内容哈希；缺失和 None 均视为空字符串。"""
+        values = (record.get(column) for column in RELATED_HASH_COLUMNS[table_name])
+        payload = "\x1f".join("" if value is None else str(value) for value in values)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
     def _has_related_business_content(self, row: Dict[str, Any], business_columns: List[str]) -> bool:
         return any(
             column in row and not self._is_blank_import_value(row.get(column))
             for column in business_columns
         )
 
-    def _sequence_value_for_storage(self, value):
-        normalized = self._normalize_sequence(value)
+    @classmethod
+    def _sequence_value_for_storage(cls, value):
+        normalized = cls._normalize_sequence(value)
         if not normalized:
             return None
         try:
@@ -611,8 +1074,9 @@ class Database:
         seen_keys = {}
         duplicate_keys = []
         duplicate_samples = []
+        column_map = {}
         for index, record in enumerate(records, start=1):
-            key = self._extract_person_key(record, normalize_columns=True)
+            key = self._extract_person_key(self._normalize_record_columns(record, column_map))
             if not key:
                 continue
             if key in seen_keys:
@@ -632,133 +1096,541 @@ class Database:
         return f"人员基本信息导入失败，存在重复人员{extra}: {sample}"
 
     def _upsert_base_info_rows(self, rows: List[Dict[str, Any]]):
-        duplicate_keys, duplicate_samples = self._find_duplicate_base_person_keys_in_records(rows)
-        if duplicate_keys:
+        person_ids, fingerprints, keep, duplicate_samples = self.plan_base_info_import(rows)
+        if duplicate_samples:
             raise ValueError(self._format_duplicate_base_person_message(duplicate_samples))
+        self.write_base_info_rows(rows, person_ids, fingerprints, keep)
 
-        valid_columns = [column for column in self.get_table_columns("base_info") if column != "id"]
+    def _base_info_write_columns(self) -> List[str]:
+        return [
+            column
+            for column in self.get_table_columns("base_info")
+            if column not in {"id", *BASE_INFO_INTERNAL_COLUMNS}
+        ]
+
+    @staticmethod
+    def _base_info_fingerprint(row: Dict[str, Any], columns: List[str]) -> str:
+        """按固定列顺序计算导入行中业务列的指纹；只包含本行提供的列。"""
+        payload = "\x1f".join(
+            f"{column}\x1e{'' if row[column] is None else row[column]}"
+            for column in columns
+            if column in row
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def plan_base_info_import(self, rows: List[Dict[str, Any]]) -> tuple:
+        """一次遍历已规范化的人员行并与上次导入的行指纹比较。
+
+        返回 (每行已有人员 id 或 None, 每行指纹, 每行是否需要写入, 文件内重复样本)；
+        已有人员且指纹未变化的行不需要写入。
+        """
+        columns = self._base_info_write_columns()
+        existing = self._load_base_person_fingerprints()
+        seen_keys = {}
+        person_ids = []
+        fingerprints = []
+        keep = []
+        duplicate_samples = []
+        for index, row in enumerate(rows, start=1):
+            key = self._extract_person_key(row)
+            person_id, stored_fingerprint = existing.get(key, (None, None)) if key else (None, None)
+            fingerprint = self._base_info_fingerprint(row, columns)
+            person_ids.append(person_id)
+            fingerprints.append(fingerprint)
+            keep.append(person_id is None or stored_fingerprint != fingerprint)
+            if not key:
+                continue
+            if key in seen_keys:
+                duplicate_samples.append((seen_keys[key], index, key))
+                continue
+            seen_keys[key] = index
+        return person_ids, fingerprints, keep, duplicate_samples
+
+    def write_base_info_rows(
+        self,
+        rows: List[Dict[str, Any]],
+        person_ids: List[Optional[int]],
+        fingerprints: Optional[List[str]] = None,
+        keep: Optional[List[bool]] = None,
+        commit: bool = True,
+    ) -> int:
+        """按预先解析的人员 id 写入：有 id 的更新，其余新增，返回写入条数。
+
+        rows 须已规范化且无重复人员；keep 为假的行（指纹未变化）跳过，
+        fingerprints 缺省时按行计算。
+        commit=False 时不提交也不回滚，由调用方（如 savepoint()）管理事务。
+        """
+        valid_columns = self._base_info_write_columns()
+        if fingerprints is None:
+            fingerprints = [self._base_info_fingerprint(row, valid_columns) for row in rows]
+        if keep is None:
+            keep = [True] * len(rows)
         cursor = self.conn.cursor()
+        written = 0
         try:
-            for row in rows:
+            update_batches = {}
+            insert_batches = []
+            for row, existing_id, fingerprint, keep_row in zip(rows, person_ids, fingerprints, keep):
+                if not keep_row:
+                    continue
                 db_row = {column: row.get(column) for column in valid_columns if column in row}
                 if not db_row:
                     continue
-                key = self._extract_person_key(db_row)
-                existing_id = self._find_base_person_id_by_key(key) if key else None
+                written += 1
+                db_row.update(self._base_info_facets(db_row))
+                db_row[CONTENT_HASH_COLUMN] = fingerprint
                 if existing_id:
-                    update_columns = [column for column in db_row if column not in {"sequence", "name"}]
+                    update_columns = tuple(column for column in db_row if column not in {"sequence", "name"})
                     if update_columns:
-                        assignments = ", ".join(f"{column}=?" for column in update_columns)
                         values = [db_row[column] for column in update_columns]
                         values.append(existing_id)
-                        cursor.execute(f"UPDATE base_info SET {assignments} WHERE id=?", values)
+                        update_batches.setdefault(update_columns, []).append(values)
                     continue
 
-                columns = list(db_row.keys())
-                placeholders = ", ".join(["?"] * len(columns))
-                cursor.execute(
-                    f"INSERT INTO base_info ({', '.join(columns)}) VALUES ({placeholders})",
-                    [db_row[column] for column in columns],
+                key = self._extract_person_key(db_row)
+                if key:
+                    db_row["person_key"] = self._person_key(*key)
+                # 连续且列集合相同的新行合并为一批，保持原有插入顺序
+                insert_columns = tuple(db_row.keys())
+                if not insert_batches or insert_batches[-1][0] != insert_columns:
+                    insert_batches.append((insert_columns, []))
+                insert_batches[-1][1].append([db_row[column] for column in insert_columns])
+
+            for update_columns, values in update_batches.items():
+                assignments = ", ".join(f"{column}=?" for column in update_columns)
+                cursor.executemany(f"UPDATE base_info SET {assignments} WHERE id=?", values)
+
+            for insert_columns, values in insert_batches:
+                placeholders = ", ".join(["?"] * len(insert_columns))
+                cursor.executemany(
+                    f"INSERT INTO base_info ({', '.join(insert_columns)}) VALUES ({placeholders})",
+                    values,
                 )
-            self.conn.commit()
-            logger.info(f"成功导入 {len(rows)} 条数据到表 base_info")
+            if written:
+                self._forget_import_file_hash("base_info")
+            if commit:
+                self.conn.commit()
+                logger.info(f"成功导入 {written} 条数据到表 base_info，跳过 {len(rows) - written} 条未变化记录")
         except sqlite3.Error as e:
-            self.conn.rollback()
+            if commit:
+                self.conn.rollback()
             logger.error(f"导入数据到表 base_info 失败: {e}")
             raise
+        return written
+
+    def _load_base_person_fingerprints(self) -> Dict[tuple, tuple]:
+        """一次性读取现有人员的 (序号, 姓名) -> (id, 上次导入的行指纹) 映射。"""
+        cursor = self.conn.cursor()
+        return {
+            self._split_person_key(person_key): (person_id, fingerprint)
+            for person_id, person_key, fingerprint in cursor.execute(
+                f"SELECT id, person_key, {CONTENT_HASH_COLUMN} FROM base_info WHERE person_key IS NOT NULL"
+            )
+        }
+
+    def _load_base_person_key_map(self) -> Dict[tuple, int]:
+        """一次性读取现有人员的 (序号, 姓名) -> id 映射，避免逐行查询。"""
+        cursor = self.conn.cursor()
+        return {
+            self._split_person_key(person_key): person_id
+            for person_id, person_key in cursor.execute(
+                "SELECT id, person_key FROM base_info WHERE person_key IS NOT NULL"
+            )
+        }
 
     def _insert_related_rows(self, table_name: str, rows: List[Dict[str, Any]]):
-        valid_columns = [column for column in self.get_table_columns(table_name) if column != "id"]
-        related_business_columns = self._related_business_columns(table_name)
-        insert_rows = []
-        unresolved = []
+        indexed_rows = self._indexed_related_rows_with_content(table_name, rows)
+        if not indexed_rows:
+            return
 
-        for index, row in enumerate(rows, start=1):
-            if not self._has_related_business_content(row, related_business_columns):
-                continue
+        try:
+            with self._staged_related_import(table_name, indexed_rows) as unresolved:
+                if unresolved:
+                    raise ValueError(self._format_unresolved_related_message(table_name, unresolved))
+                inserted_count = self._insert_staged_related_rows(
+                    table_name,
+                    self._present_related_columns(table_name, rows),
+                )
+                self.conn.commit()
+            logger.info(f"成功导入 {inserted_count} 条数据到表 {table_name}")
+        except sqlite3.Error as e:
+            logger.error(f"导入数据到表 {table_name} 失败: {e}")
+            raise
 
-            try:
-                person_id = self._resolve_person_id(row)
-            except ValueError as e:
-                key = self._extract_person_key(row)
-                sequence, name = key if key else ("", "")
-                unresolved.append((index, sequence, name, str(e)))
-                continue
+    def import_related_rows(
+        self,
+        table_name: str,
+        records: List[Dict[str, Any]],
+        skip_existing: bool = True,
+    ) -> tuple:
+        """导入明细记录并跳过重复明细，返回 (新增条数, 跳过条数)。"""
+        validate_table_name(table_name)
+        if table_name not in RELATED_TABLES:
+            raise ValueError(f"{table_name} 不是明细表")
 
-            db_row = {
-                column: row.get(column)
-                for column in valid_columns
-                if column in row and column not in {"sequence", "name"}
-            }
-            db_row["person_id"] = person_id
-            insert_rows.append(db_row)
+        rows = self._normalize_import_rows(table_name, records)
+        indexed_rows = self._indexed_related_rows_with_content(table_name, rows)
+        if not indexed_rows:
+            return 0, 0
 
-        if unresolved:
-            sample = "; ".join(
-                f"第 {index} 行 序号={sequence or '空'} 姓名={name or '空'}: {message}"
-                for index, sequence, name, message in unresolved[:5]
+        try:
+            with self._staged_related_import(table_name, indexed_rows) as unresolved:
+                if unresolved:
+                    raise ValueError(unresolved[0][3])
+                self._mark_duplicate_staged_related_rows(table_name, skip_existing=skip_existing)
+                skipped_count = len(self._duplicate_staged_row_indexes())
+                inserted_count = self._insert_staged_related_rows(
+                    table_name,
+                    self._present_related_columns(table_name, rows),
+                )
+                self.conn.commit()
+            logger.info(f"成功导入 {inserted_count} 条数据到表 {table_name}，跳过 {skipped_count} 条重复明细")
+            return inserted_count, skipped_count
+        except sqlite3.Error as e:
+            logger.error(f"导入数据到表 {table_name} 失败: {e}")
+            raise
+
+    def plan_related_import(self, table_name: str, rows: List[Dict[str, Any]]) -> tuple:
+        """暂存一次已规范化的明细行，关联人员并判定重复。
+
+        返回 (无法关联的行, 每行 person_id, 每行内容哈希, 每行是否写入)；行号从 1 开始，
+        无业务内容或无法关联的行 person_id 为 None 且不写入。
+        """
+        validate_table_name(table_name)
+        count = len(rows)
+        person_ids = [None] * count
+        content_hashes = [None] * count
+        keep = [False] * count
+        indexed_rows = self._indexed_related_rows_with_content(table_name, rows)
+        if not indexed_rows:
+            return [], person_ids, content_hashes, keep
+
+        with self._staged_related_import(table_name, indexed_rows) as unresolved:
+            self._mark_duplicate_staged_related_rows(table_name, skip_existing=True)
+            for index, person_id, content_hash, keep_row in self.conn.execute(
+                f"SELECT row_index, person_id, {CONTENT_HASH_COLUMN}, keep "
+                f"FROM temp.{RELATED_IMPORT_STAGE_TABLE}"
+            ):
+                person_ids[index - 1] = person_id
+                content_hashes[index - 1] = content_hash
+                keep[index - 1] = bool(keep_row) and person_id is not None
+        return unresolved, person_ids, content_hashes, keep
+
+    def write_related_rows(
+        self,
+        table_name: str,
+        rows: List[Dict[str, Any]],
+        person_ids: List[Optional[int]],
+        content_hashes: List[Optional[str]],
+        keep: List[bool],
+        commit: bool = True,
+    ) -> int:
+        """按 plan_related_import 的结果直接写入需要保留的明细行，返回写入条数。
+
+        commit=False 时不提交也不回滚，由调用方（如 savepoint()）管理事务。
+        """
+        validate_table_name(table_name)
+        if table_name not in RELATED_TABLES:
+            raise ValueError(f"{table_name} 不是明细表")
+        columns = self._present_related_columns(table_name, rows)
+        values = [
+            (person_id, content_hash, *(row.get(column) for column in columns))
+            for row, person_id, content_hash, keep_row in zip(rows, person_ids, content_hashes, keep)
+            if keep_row
+        ]
+        if not values:
+            return 0
+        insert_columns = ["person_id", CONTENT_HASH_COLUMN, *columns]
+        try:
+            self.conn.executemany(
+                f"INSERT INTO {table_name} ({', '.join(insert_columns)}) "
+                f"VALUES ({', '.join(['?'] * len(insert_columns))})",
+                values,
             )
-            extra = f" 等 {len(unresolved)} 条" if len(unresolved) > 5 else ""
-            raise ValueError(f"{table_name} 导入失败，存在无法关联到 base_info 的人员{extra}: {sample}")
+            self._forget_import_file_hash(table_name)
+            if commit:
+                self.conn.commit()
+                logger.info(f"成功导入 {len(values)} 条数据到表 {table_name}")
+        except sqlite3.Error as e:
+            if commit:
+                self.conn.rollback()
+            logger.error(f"导入数据到表 {table_name} 失败: {e}")
+            raise
+        return len(values)
 
-        if not insert_rows:
+    @contextmanager
+    def savepoint(self, name: str = "import_chunk"):
+        """用 SAVEPOINT 包裹一段写入：正常退出时释放（最外层保存点释放即提交），异常时回滚到保存点。"""
+        self.conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            self.conn.execute(f"RELEASE SAVEPOINT {name}")
+            raise
+        self.conn.execute(f"RELEASE SAVEPOINT {name}")
+
+    @contextmanager
+    def read_snapshot(self):
+        """在一个读事务内执行多次查询，各查询看到同一份数据（WAL 模式下不阻塞写入）。
+
+        已处于事务中时直接沿用当前事务。
+        """
+        if self.conn.in_transaction:
+            yield
             return
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self.conn.rollback()
+
+    def import_snapshot(self, table_name: str) -> int:
+        """导入相关表在变更日志中的最新版本号，用于判断预览后数据库是否被修改。
 
-        columns = []
-        for row in insert_rows:
-            for column in row:
-                if column not in columns:
-                    columns.append(column)
+        插入、修改和删除都会使版本号增大，只改写已有行的修改同样能够察觉。
+        """
+        validate_table_name(table_name)
+        tables = ["base_info"] if table_name == "base_info" else ["base_info", table_name]
+        row = self.conn.execute(
+            f"SELECT MAX(version) FROM change_log WHERE table_name IN ({', '.join('?' * len(tables))})",
+            tables,
+        ).fetchone()
+        return int(row[0] or 0)
+
+    def get_import_file_hash(self, table_name: str) -> Optional[str]:
+        """返回该表上次成功导入文件的哈希；之后数据库已变化时返回 None。"""
+        row = self.conn.execute(
+            "SELECT config_value FROM system_config WHERE config_key=?",
+            (IMPORT_FILE_HASH_KEY_PREFIX + table_name,),
+        ).fetchone()
+        if not row:
+            return None
+        try:
+            record = json.loads(row[0])
+        except (TypeError, json.JSONDecodeError):
+            return None
+        if record.get("snapshot") != self.import_snapshot(table_name):
+            return None
+        return record.get("file_hash")
 
-        placeholders = ", ".join(["?"] * len(columns))
-        sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+    def set_import_file_hash(self, table_name: str, file_hash: str):
+        """记录成功导入的文件哈希及当前数据快照。"""
+        validate_table_name(table_name)
+        record = {"file_hash": file_hash, "snapshot": self.import_snapshot(table_name)}
+        self.conn.execute(
+            "REPLACE INTO system_config (config_key, config_value) VALUES (?, ?)",
+            (IMPORT_FILE_HASH_KEY_PREFIX + table_name, json.dumps(record)),
+        )
+        self.conn.commit()
 
+    def _forget_import_file_hash(self, table_name: str):
+        # 数据被写入后旧的文件哈希不再代表数据库内容；不提交，随调用方事务生效
+        self.conn.execute(
+            "DELETE FROM system_config WHERE config_key=?",
+            (IMPORT_FILE_HASH_KEY_PREFIX + table_name,),
+        )
+
+    def find_unresolved_related_rows(self, table_name: str, records: List[Dict[str, Any]]) -> List[tuple]:
+        """返回无法关联到 base_info 的明细行 (行号, 序号, 姓名, 原因)，行号从 1 开始。"""
+        validate_table_name(table_name)
+        column_map = {}
+        indexed_rows = [
+            (index, self._normalize_record_columns(record, column_map))
+            for index, record in enumerate(records, start=1)
+        ]
+        if not indexed_rows:
+            return []
+        with self._staged_related_import(table_name, indexed_rows) as unresolved:
+            return unresolved
+
+    @staticmethod
+    def _format_unresolved_related_message(table_name: str, unresolved: List[tuple]) -> str:
+        sample = "; ".join(
+            f"第 {index} 行 序号={sequence or '空'} 姓名={name or '空'}: {message}"
+            for index, sequence, name, message in unresolved[:5]
+        )
+        extra = f" 等 {len(unresolved)} 条" if len(unresolved) > 5 else ""
+        return f"{table_name} 导入失败，存在无法关联到 base_info 的人员{extra}: {sample}"
+
+    def _indexed_related_rows_with_content(self, table_name: str, rows: List[Dict[str, Any]]) -> List[tuple]:
+        related_business_columns = self._related_business_columns(table_name)
+        return [
+            (index, row)
+            for index, row in enumerate(rows, start=1)
+            if self._has_related_business_content(row, related_business_columns)
+        ]
+
+    def _related_stage_columns(self, table_name: str) -> List[str]:
+        return [
+            column
+            for column in self.get_table_columns(table_name)
+            if column not in RELATED_IMPORT_IDENTITY_COLUMNS and column != CONTENT_HASH_COLUMN
+        ]
+
+    def _present_related_columns(self, table_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        present = set()
+        for row in rows:
+            present.update(row)
+        return [column for column in self._related_stage_columns(table_name) if column in present]
+
+    @contextmanager
+    def _staged_related_import(self, table_name: str, indexed_rows: List[tuple]):
+        """把明细行写入临时暂存表并一次性关联 person_id，产出无法关联的行。
+
+        暂存在自己的 SAVEPOINT 内进行，退出时只回滚到该保存点并删除暂存表，
+        调用方已开启的事务及其写入不受影响；需要保留的写入须在块内提交。
+        """
+        stage_columns = self._related_stage_columns(table_name)
         cursor = self.conn.cursor()
+        cursor.execute(f"SAVEPOINT {RELATED_IMPORT_STAGE_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS temp.{RELATED_IMPORT_STAGE_TABLE}")
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE {RELATED_IMPORT_STAGE_TABLE} (
+                row_index INTEGER PRIMARY KEY,
+                explicit_person_id INTEGER,
+                person_key TEXT,
+                person_id INTEGER,
+                content_hash TEXT,
+                keep INTEGER NOT NULL DEFAULT 1,
+                {', '.join(stage_columns)}
+            )
+            """
+        )
         try:
-            values_to_insert = [[row.get(column) for column in columns] for row in insert_rows]
-            cursor.executemany(sql, values_to_insert)
-            self.conn.commit()
-            logger.info(f"成功导入 {len(insert_rows)} 条数据到表 {table_name}")
-        except sqlite3.Error as e:
-            self.conn.rollback()
-            logger.error(f"导入数据到表 {table_name} 失败: {e}")
-            raise
+            yield self._load_related_import_stage(table_name, stage_columns, indexed_rows)
+        finally:
+            # 块内已提交时保存点随之结束，无需回滚
+            if self.conn.in_transaction:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {RELATED_IMPORT_STAGE_TABLE}")
+                cursor.execute(f"RELEASE SAVEPOINT {RELATED_IMPORT_STAGE_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS temp.{RELATED_IMPORT_STAGE_TABLE}")
+
+    def _load_related_import_stage(
+        self,
+        table_name: str,
+        stage_columns: List[str],
+        indexed_rows: List[tuple],
+    ) -> List[tuple]:
+        keys = {}
+        errors = []
+        stage_values = []
+        for index, row in indexed_rows:
+            key = self._extract_person_key(row)
+            keys[index] = key
+            explicit_person_id = None
+            raw_person_id = row.get("person_id")
+            if raw_person_id not in (None, ""):
+                try:
+                    explicit_person_id = int(float(str(raw_person_id).strip()))
+                except (TypeError, ValueError):
+                    errors.append((index, f"person_id 无效: {raw_person_id}"))
+                    continue
+            elif not key:
+                errors.append((index, "缺少姓名"))
+                continue
 
-    def _resolve_person_id(self, row: Dict[str, Any]) -> int:
-        person_id = row.get("person_id")
-        if person_id not in (None, ""):
-            try:
-                person_id_int = int(float(str(person_id).strip()))
-            except (TypeError, ValueError):
-                raise ValueError(f"person_id 无效: {person_id}")
-            cursor = self.conn.cursor()
-            existing = cursor.execute("SELECT id FROM base_info WHERE id=?", (person_id_int,)).fetchone()
-            if not existing:
-                raise ValueError(f"person_id 不存在: {person_id_int}")
-            return person_id_int
+            person_key = self._person_key(*key) if key else None
+            stage_values.append([
+                index,
+                explicit_person_id,
+                person_key,
+                self._related_content_hash(table_name, row),
+                *(row.get(column) for column in stage_columns),
+            ])
 
-        key = self._extract_person_key(row)
-        if not key:
-            raise ValueError("缺少姓名")
-        person_id_int = self._find_base_person_id_by_key(key)
-        if not person_id_int:
-            sequence, name = key
-            raise ValueError(f"未找到匹配人员: 序号={sequence or '空'}, 姓名={name}")
-        return person_id_int
+        cursor = self.conn.cursor()
+        insert_columns = ["row_index", "explicit_person_id", "person_key", CONTENT_HASH_COLUMN, *stage_columns]
+        cursor.executemany(
+            f"INSERT INTO temp.{RELATED_IMPORT_STAGE_TABLE} ({', '.join(insert_columns)}) "
+            f"VALUES ({', '.join(['?'] * len(insert_columns))})",
+            stage_values,
+        )
+        cursor.execute(
+            f"""
+            UPDATE temp.{RELATED_IMPORT_STAGE_TABLE}
+            SET person_id = CASE
+                WHEN explicit_person_id IS NOT NULL THEN (
+                    SELECT b.id FROM base_info b WHERE b.id = {RELATED_IMPORT_STAGE_TABLE}.explicit_person_id
+                )
+                ELSE (
+                    SELECT b.id FROM base_info b WHERE b.person_key = {RELATED_IMPORT_STAGE_TABLE}.person_key
+                )
+            END
+            """
+        )
+        for index, explicit_person_id in cursor.execute(
+            f"SELECT row_index, explicit_person_id FROM temp.{RELATED_IMPORT_STAGE_TABLE} WHERE person_id IS NULL"
+        ).fetchall():
+            if explicit_person_id is not None:
+                errors.append((index, f"person_id 不存在: {explicit_person_id}"))
+                continue
+            sequence, name = keys[index]
+            errors.append((index, f"未找到匹配人员: 序号={sequence or '空'}, 姓名={name}"))
+
+        errors.sort()
+        return [(index, *(keys[index] or ("", "")), message) for index, message in errors]
+
+    def _mark_duplicate_staged_related_rows(self, table_name: str, skip_existing: bool = True):
+        """标记批次内重复及（可选）与库中已有明细重复的暂存行，每组只保留最早一行。"""
+        stage = RELATED_IMPORT_STAGE_TABLE
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""
+            UPDATE temp.{stage} SET keep = 0
+            WHERE person_id IS NOT NULL AND row_index NOT IN (
+                SELECT MIN(row_index) FROM temp.{stage}
+                WHERE person_id IS NOT NULL
+                GROUP BY person_id, content_hash
+            )
+            """
+        )
+        if not skip_existing:
+            return
+
+        cursor.execute(
+            f"""
+            UPDATE temp.{stage} SET keep = 0
+            WHERE keep = 1 AND person_id IS NOT NULL AND EXISTS (
+                SELECT 1 FROM {table_name} t
+                WHERE t.person_id = {stage}.person_id AND t.content_hash = {stage}.content_hash
+            )
+            """
+        )
+
+    def _duplicate_staged_row_indexes(self) -> List[int]:
+        cursor = self.conn.cursor()
+        return [
+            row[0]
+            for row in cursor.execute(
+                f"SELECT row_index FROM temp.{RELATED_IMPORT_STAGE_TABLE} "
+                "WHERE keep = 0 AND person_id IS NOT NULL ORDER BY row_index"
+            )
+        ]
+
+    def _insert_staged_related_rows(self, table_name: str, insert_columns: List[str]) -> int:
+        columns = ", ".join(["person_id", CONTENT_HASH_COLUMN, *insert_columns])
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""
+            INSERT INTO {table_name} ({columns})
+            SELECT {columns} FROM temp.{RELATED_IMPORT_STAGE_TABLE}
+            WHERE keep = 1 AND person_id IS NOT NULL
+            ORDER BY row_index
+            """
+        )
+        return cursor.rowcount
 
     def _find_base_person_id_by_key(self, key: Optional[tuple]) -> Optional[int]:
         if not key:
             return None
-        sequence, name = key
         cursor = self.conn.cursor()
-        rows = cursor.execute(
-            "SELECT id, sequence FROM base_info WHERE TRIM(name)=?",
-            (name,),
-        ).fetchall()
-        for row in rows:
-            if self._normalize_sequence(row["sequence"]) == sequence:
-                return row["id"]
-        return None
+        row = cursor.execute(
+            "SELECT id FROM base_info WHERE person_key=?",
+            (self._person_key(*key),),
+        ).fetchone()
+        return row["id"] if row else None
 
     def get_table_columns(self, table_name: str) -> List[str]:
         validate_table_name(table_name)
@@ -784,6 +1656,18 @@ class Database:
 
         return text
 
+    @classmethod
+    def _person_key(cls, sequence, name) -> Optional[str]:
+        name = str(name or "").strip()
+        if not name:
+            return None
+        return f"{cls._normalize_sequence(sequence)}{PERSON_KEY_SEPARATOR}{name}"
+
+    @staticmethod
+    def _split_person_key(person_key: str) -> tuple:
+        sequence, name = person_key.split(PERSON_KEY_SEPARATOR, 1)
+        return sequence, name
+
     def _get_related_select_columns(self, table_name: str) -> List[str]:
         select_columns = list(RELATED_TABLE_DISPLAY_COLUMNS[table_name])
         for field_name in TABLE_DATE_FIELDS.get(table_name, []):
@@ -792,25 +1676,21 @@ class Database:
                 select_columns.append(display_column)
         return select_columns
 
-    def _fetch_related_person_data(self, table_name: str, person_ids: List[int]) -> List[Dict]:
-        validate_table_name(table_name)
-        if table_name not in RELATED_TABLES or not person_ids:
-            return []
-
-        placeholders = ", ".join(["?"] * len(person_ids))
-        select_columns = ", ".join(self._get_related_select_columns(table_name))
+    def _tuple_cursor(self) -> sqlite3.Cursor:
+        """返回逐行产出元组的游标，供 ResultSet 直接使用，省去 sqlite3.Row 转换。"""
         cursor = self.conn.cursor()
-        cursor.execute(
-            f"""
-            SELECT {select_columns}
-            FROM {table_name} r
-            JOIN base_info b ON b.id = r.person_id
-            WHERE r.person_id IN ({placeholders})
-            ORDER BY r.person_id, r.id
-            """,
-            person_ids,
-        )
-        return [dict(row) for row in cursor.fetchall()]
+        cursor.row_factory = None
+        return cursor
+
+    @staticmethod
+    def _iter_cursor_batches(cursor, batch_size: int):
+        """从活动游标按批取行，每批为共享表头的 ResultSet，避免一次性 fetchall。"""
+        columns = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield ResultSet(columns, rows)
 
     def _build_personnel_search_clause(
         self,
@@ -822,29 +1702,35 @@ class Database:
         birth_end: str = None,
         education: list = None,
         parttime_education: list = None,
+        keyword: str = None,
         table_alias: str = "b",
     ) -> tuple:
         alias = f"{table_alias}." if table_alias else ""
         base_conditions = []
         params = []
+        use_fulltext = bool(name or keyword) and self._fulltext_enabled()
 
         if name:
-            base_conditions.append(f"{alias}name LIKE ?")
+            if use_fulltext and len(name) >= FULLTEXT_MIN_TERM_LENGTH:
+                base_conditions.append(f"{alias}id IN (SELECT rowid FROM base_info_fts WHERE name LIKE ?)")
+            else:
+                base_conditions.append(f"{alias}name LIKE ?")
             params.append(f"%{name}%")
 
+        for term in (keyword or "").split():
+            term_conditions, term_params = self._keyword_condition(term, alias, use_fulltext)
+            base_conditions.append(term_conditions)
+            params.extend(term_params)
+
         if grades:
-            grade_conditions = []
-            for grade in grades:
-                grade_conditions.append(f"{alias}current_grade LIKE ?")
-                params.append(f"%{grade}%")
-            base_conditions.append(f"({' OR '.join(grade_conditions)})")
+            grade_sql, grade_params = self._grade_condition(grades, alias)
+            base_conditions.append(grade_sql)
+            params.extend(grade_params)
 
         if position:
-            position_conditions = []
-            for pos in position:
-                position_conditions.append(f"{alias}current_position = ?")
-                params.append(pos)
-            base_conditions.append(f"({' OR '.join(position_conditions)})")
+            position_sql, position_params = self._position_condition(position, alias)
+            base_conditions.append(position_sql)
+            params.extend(position_params)
 
         birth_start_key = self._month_key(birth_start)
         birth_end_key = self._month_key(birth_end)
@@ -859,22 +1745,245 @@ class Database:
             base_conditions.append(f"{alias}birth_date <= ?")
             params.append(birth_end_key)
 
-        if education:
-            edu_conditions = []
-            for keyword in education:
-                edu_conditions.append(f"{alias}fulltime_education LIKE ?")
-                params.append(f"%{keyword}%")
-            base_conditions.append(f"({' OR '.join(edu_conditions)})")
-
-        if parttime_education:
-            parttime_conditions = []
-            for keyword in parttime_education:
-                parttime_conditions.append(f"{alias}parttime_education LIKE ?")
-                params.append(f"%{keyword}%")
-            base_conditions.append(f"({' OR '.join(parttime_conditions)})")
+        for column, keywords in (
+            ("fulltime_education", education),
+            ("parttime_education", parttime_education),
+        ):
+            if keywords:
+                education_sql, education_params = self._education_condition(column, keywords, alias)
+                base_conditions.append(education_sql)
+                params.extend(education_params)
 
         return base_conditions, params
 
+    @staticmethod
+    def _like_any_condition(column_sql: str, values: list) -> tuple:
+        conditions = " OR ".join(f"{column_sql} LIKE ?" for _ in values)
+        return f"({conditions})", [f"%{value}%" for value in values]
+
+    @staticmethod
+    def _in_condition(column_sql: str, values: list) -> str:
+        return f"{column_sql} IN ({', '.join(['?'] * len(values))})"
+
+    def _grade_condition(self, grades: list, alias: str) -> tuple:
+        """职级模糊匹配：标准职级走 grade_code 索引，非标准文本（grade_code 为空）仍按 LIKE 匹配。"""
+        if not all(grade in GRADE_OPTIONS for grade in grades):
+            return self._like_any_condition(f"{alias}current_grade", grades)
+        codes = [
+            code
+            for code, option in enumerate(GRADE_OPTIONS)
+            if any(grade in option for grade in grades)
+        ]
+        # 非标准文本放进独立子查询，外层条件只引用索引列，便于走覆盖索引
+        like_sql, like_params = self._like_any_condition("current_grade", grades)
+        return (
+            f"({self._in_condition(f'{alias}grade_code', codes)} OR {alias}id IN "
+            f"(SELECT id FROM base_info WHERE grade_code IS NULL AND {like_sql}))",
+            [*codes, *like_params],
+        )
+
+    def _position_condition(self, positions: list, alias: str) -> tuple:
+        """现任职务精确匹配：整组覆盖的职务层级按 position_level 过滤，其余职务按原值过滤。"""
+        selected = set(positions)
+        levels = [
+            level
+            for level in POSITION_MAPPING
+            if all(
+                title in selected
+                for title, title_level in POSITION_LEVEL_BY_TITLE.items()
+                if title_level == level
+            )
+        ]
+        remaining = [
+            title
+            for title in dict.fromkeys(positions)
+            if POSITION_LEVEL_BY_TITLE.get(title) not in levels
+        ]
+        conditions = []
+        if levels:
+            conditions.append(self._in_condition(f"{alias}position_level", levels))
+        if remaining:
+            conditions.append(self._in_condition(f"{alias}current_position", remaining))
+        return f"({' OR '.join(conditions)})", [*levels, *remaining]
+
+    def _education_condition(self, column: str, keywords: list, alias: str) -> tuple:
+        """学历关键词匹配：已知关键词合成一个位掩码，与 education_mask 按位与判断是否包含任一关键词。"""
+        if not all(keyword in EDUCATION_FACET_KEYWORDS for keyword in keywords):
+            return self._like_any_condition(f"{alias}{column}", keywords)
+        selected_mask = 0
+        for keyword in keywords:
+            selected_mask |= 1 << EDUCATION_FACET_KEYWORDS.index(keyword)
+        mask_column = "education_mask" if column == "fulltime_education" else "parttime_education_mask"
+        return f"({alias}{mask_column} & ?) != 0", [selected_mask]
+
+    def _data_version_token(self) -> tuple:
+        """数据变化标记：其他连接提交会改变 data_version，本连接写入会改变 total_changes。"""
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return data_version, self.conn.total_changes
+
+    def _cached_search_value(self, cache_key: tuple, compute):
+        token = self._data_version_token()
+        if token != self._search_cache_token:
+            self._search_cache = {}
+            self._search_cache_token = token
+        if cache_key not in self._search_cache:
+            if len(self._search_cache) >= SEARCH_CACHE_LIMIT:
+                self._search_cache.pop(next(iter(self._search_cache)))
+            self._search_cache[cache_key] = compute()
+        return self._search_cache[cache_key]
+
+    def _count_search_rows(self, from_sql: str, params: list) -> int:
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) AS total_count{from_sql}", params)
+        return int(cursor.fetchone()["total_count"])
+
+    def _locate_page_end_key(
+        self,
+        table_sql: str,
+        base_conditions: list,
+        params: list,
+        order_columns: tuple,
+        page_end_keys: Dict[int, tuple],
+        page: int,
+        page_size: int,
+    ) -> Optional[tuple]:
+        """定位第 page 页最后一行的排序键，超出结果范围时返回 None。
+
+        从最近的已知页边界向前或向后只扫描排序键，仍是一次 OFFSET 扫描：
+        首次跳到远离已知边界的页时，代价随与边界相隔的行数增长；定位到的边界会被缓存。
+        """
+        below = max((known for known in page_end_keys if known < page), default=0)
+        above = min((known for known in page_end_keys if known > page), default=None)
+        conditions = list(base_conditions)
+        query_params = list(params)
+        if above is not None and above - page < page - below:
+            keyset_sql, keyset_params = self._keyset_condition(order_columns, page_end_keys[above], "<=")
+            direction = "DESC"
+            skip_rows = (above - page) * page_size
+        else:
+            if below:
+                keyset_sql, keyset_params = self._keyset_condition(order_columns, page_end_keys[below])
+            else:
+                keyset_sql, keyset_params = None, []
+            direction = "ASC"
+            skip_rows = (page - below) * page_size - 1
+        if keyset_sql:
+            conditions.append(keyset_sql)
+            query_params.extend(keyset_params)
+
+        where_sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+        order_sql = ", ".join(f"{column} {direction}" for column in order_columns)
+        cursor = self.conn.cursor()
+        row = cursor.execute(
+            f"SELECT {', '.join(order_columns)}{table_sql}{where_sql} ORDER BY {order_sql} LIMIT 1 OFFSET ?",
+            [*query_params, skip_rows],
+        ).fetchone()
+        if row is None:
+            return None
+        page_end_keys[page] = tuple(row)
+        return page_end_keys[page]
+
+    @staticmethod
+    def _keyset_condition(order_columns: tuple, after_key, operator: str = ">") -> tuple:
+        if not isinstance(after_key, (tuple, list)):
+            after_key = (after_key,)
+        if len(after_key) != len(order_columns):
+            raise ValueError(f"分页键长度应为 {len(order_columns)}: {after_key}")
+        if len(order_columns) == 1:
+            return f"{order_columns[0]} {operator} ?", list(after_key)
+        placeholders = ", ".join(["?"] * len(order_columns))
+        return f"({', '.join(order_columns)}) {operator} ({placeholders})", list(after_key)
+
+    def _fetch_search_page(
+        self,
+        select_sql: str,
+        table_sql: str,
+        base_conditions: list,
+        params: list,
+        order_columns: tuple,
+        cache_key: tuple,
+        limit: Optional[int],
+        offset: int,
+        after_key,
+    ) -> ResultSet:
+        offset = max(0, offset or 0)
+        page_end_keys = None
+        page_index = 0
+        if limit is not None and limit > 0 and after_key is None:
+            page_end_keys = self._cached_search_value(("page_end_keys", *cache_key, limit), dict)
+            page_index = offset // limit
+            if page_index:
+                after_key = page_end_keys.get(page_index) or self._locate_page_end_key(
+                    table_sql,
+                    base_conditions,
+                    params,
+                    order_columns,
+                    page_end_keys,
+                    page_index,
+                    limit,
+                )
+                if after_key is None:
+                    # 定位扫描已确认本页超出结果范围，不再重复扫描；LIMIT 0 只取列名
+                    cursor = self._tuple_cursor()
+                    cursor.execute(f"{select_sql}{table_sql} LIMIT 0")
+                    return ResultSet.from_cursor(cursor)
+                offset -= page_index * limit
+
+        conditions = list(base_conditions)
+        query_params = list(params)
+        if after_key is not None:
+            keyset_sql, keyset_params = self._keyset_condition(order_columns, after_key)
+            conditions.append(keyset_sql)
+            query_params.extend(keyset_params)
+
+        where_sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+        data_sql = f"{select_sql}{table_sql}{where_sql} ORDER BY {', '.join(order_columns)}"
+        if limit is not None:
+            data_sql += " LIMIT ? OFFSET ?"
+            query_params.extend([limit, offset])
+        cursor = self._tuple_cursor()
+        cursor.execute(data_sql, query_params)
+        rows = ResultSet.from_cursor(cursor)
+        if page_end_keys is not None and offset == 0 and len(rows) == limit:
+            # 记住本页末行键，顺序翻到下一页时可直接 seek
+            page_end_keys[page_index + 1] = tuple(rows[-1][column.split(".", 1)[1]] for column in order_columns)
+        return rows
+
+    @staticmethod
+    def _keyword_condition(term: str, alias: str, use_fulltext: bool) -> tuple:
+        """单个关键词：命中基本信息文本列或本人简历即可。"""
+        if use_fulltext and len(term) >= FULLTEXT_MIN_TERM_LENGTH:
+            phrase = '"' + term.replace('"', '""') + '"'
+            return (
+                f"({alias}id IN (SELECT rowid FROM base_info_fts WHERE base_info_fts MATCH ?)"
+                f" OR {alias}id IN (SELECT person_id FROM resume"
+                f" WHERE id IN (SELECT rowid FROM resume_fts WHERE resume_fts MATCH ?)))"
+            ), [phrase, phrase]
+
+        columns = FULLTEXT_TABLES["base_info"][1]
+        like_conditions = [f"{alias}{column} LIKE ?" for column in columns]
+        like_conditions.append(f"{alias}id IN (SELECT person_id FROM resume WHERE resume_text LIKE ?)")
+        pattern = f"%{term}%"
+        return f"({' OR '.join(like_conditions)})", [pattern] * len(like_conditions)
+
+    def _search_query_parts(self, table_name: str, conditions: Dict[str, Any]) -> tuple:
+        base_conditions, params = self._build_personnel_search_clause(table_alias="b", **conditions)
+        if table_name == "base_info":
+            table_sql = " FROM base_info b"
+            # person_key 与查询维度编码仅供内部索引使用，不进入结果集
+            select_columns = [
+                f"b.{column}"
+                for column in self.get_table_columns("base_info")
+                if column not in BASE_INFO_INTERNAL_COLUMNS
+            ]
+            select_sql = f"SELECT {', '.join(select_columns)}"
+            order_columns = BASE_INFO_ORDER_COLUMNS
+        else:
+            table_sql = f" FROM {table_name} r JOIN base_info b ON b.id = r.person_id"
+            select_sql = f"SELECT {', '.join(self._get_related_select_columns(table_name))}"
+            order_columns = RELATED_ORDER_COLUMNS
+        return select_sql, table_sql, base_conditions, params, order_columns
+
     def search_personnel(
         self,
         name: str = None,
@@ -887,78 +1996,123 @@ class Database:
         table_name: str = None,
         limit: int = None,
         offset: int = 0,
+        after_key=None,
+        keyword: str = None,
     ):
+        """按条件查询人员信息。
+
+        指定 table_name 或 limit 时只查询单表并返回 total_count。after_key 为上一页最后一行的
+        排序键（base_info 为 id，明细表为 (person_id, id)），给定时按 keyset 方式翻页；
+        仅给 offset 时，顺序翻页和已访问过的页借助缓存的页边界直接 seek；首次跳到远处的页
+        仍需从最近的已知边界做一次只读排序键的 OFFSET 扫描。总数与页边界按筛选条件缓存，
+        数据变化后失效。
+        keyword 按空白拆分为多个词，每个词须命中基本信息文本列或本人简历（FTS5 全文索引）。
+        大结果集请改用 iter_search_personnel 分批读取。
+        """
+        conditions = {
+            "name": name,
+            "grades": grades,
+            "position": position,
+            "birth_start": birth_start,
+            "birth_end": birth_end,
+            "education": education,
+            "parttime_education": parttime_education,
+            "keyword": keyword,
+        }
         try:
-            cursor = self.conn.cursor()
-            base_conditions, params = self._build_personnel_search_clause(
-                name=name,
-                grades=grades,
-                position=position,
-                birth_start=birth_start,
-                birth_end=birth_end,
-                education=education,
-                parttime_education=parttime_education,
-                table_alias="b",
-            )
-            where_sql = " WHERE " + " AND ".join(base_conditions) if base_conditions else ""
             paginated = limit is not None
             effective_table = table_name or "base_info"
 
             if table_name is not None:
                 validate_table_name(table_name)
 
-            if table_name is None and not paginated:
-                base_sql = f"SELECT b.* FROM base_info b{where_sql} ORDER BY b.id"
-                cursor.execute(base_sql, params)
-                base_info_data = [dict(row) for row in cursor.fetchall()]
-                person_ids = [row["id"] for row in base_info_data if row.get("id") is not None]
-
-                results = {"base_info": base_info_data}
-                results["rewards"] = self._fetch_related_person_data("rewards", person_ids)
-                results["family"] = self._fetch_related_person_data("family", person_ids)
-                results["resume"] = self._fetch_related_person_data("resume", person_ids)
-                results["total_count"] = len(base_info_data)
+            if table_name is None and not paginated and after_key is None:
+                results = {
+                    search_table: ResultSet.concat(self.iter_search_personnel(search_table, **conditions))
+                    for search_table in ("base_info", *RELATED_TABLES)
+                }
+                results["total_count"] = len(results["base_info"])
 
-                logger.info(f"搜索完成，找到 {len(base_info_data)} 条基础信息记录")
+                logger.info(f"搜索完成，找到 {results['total_count']} 条基础信息记录")
                 return results
 
+            select_sql, table_sql, base_conditions, params, order_columns = self._search_query_parts(
+                effective_table, conditions
+            )
+            where_sql = " WHERE " + " AND ".join(base_conditions) if base_conditions else ""
+            cache_key = (effective_table, where_sql, tuple(params))
+            total_count = self._cached_search_count(effective_table, table_sql, where_sql, params)
+            rows = self._fetch_search_page(
+                select_sql,
+                table_sql,
+                base_conditions,
+                params,
+                order_columns,
+                cache_key,
+                limit,
+                offset,
+                after_key,
+            )
+            results = {effective_table: rows, "total_count": total_count}
             if effective_table == "base_info":
-                count_sql = f"SELECT COUNT(*) AS total_count FROM base_info b{where_sql}"
-                cursor.execute(count_sql, params)
-                total_count = int(cursor.fetchone()["total_count"])
-
-                base_sql = f"SELECT b.* FROM base_info b{where_sql} ORDER BY b.id"
-                query_params = list(params)
-                if paginated:
-                    base_sql += " LIMIT ? OFFSET ?"
-                    query_params.extend([limit, max(0, offset or 0)])
-                cursor.execute(base_sql, query_params)
-                rows = [dict(row) for row in cursor.fetchall()]
-                results = {"base_info": rows, "total_count": total_count}
                 logger.info(f"搜索完成，找到 {total_count} 条基础信息记录")
-                return results
-
-            join_sql = f" FROM {effective_table} r JOIN base_info b ON b.id = r.person_id{where_sql}"
-            count_sql = f"SELECT COUNT(*) AS total_count{join_sql}"
-            cursor.execute(count_sql, params)
-            total_count = int(cursor.fetchone()["total_count"])
-
-            select_columns = ", ".join(self._get_related_select_columns(effective_table))
-            data_sql = f"SELECT {select_columns}{join_sql} ORDER BY r.person_id, r.id"
-            query_params = list(params)
-            if paginated:
-                data_sql += " LIMIT ? OFFSET ?"
-                query_params.extend([limit, max(0, offset or 0)])
-            cursor.execute(data_sql, query_params)
-            rows = [dict(row) for row in cursor.fetchall()]
-            results = {effective_table: rows, "total_count": total_count}
-            logger.info(f"搜索完成，找到 {total_count} 条 {effective_table} 记录")
+            else:
+                logger.info(f"搜索完成，找到 {total_count} 条 {effective_table} 记录")
             return results
 
         except sqlite3.Error as e:
             logger.error(f"搜索人员信息失败: {e}")
             raise
 
+    def count_search_personnel(self, table_name: str = "base_info", **conditions) -> int:
+        """返回 search_personnel 在该表上的匹配总数；与分页查询共用总数缓存。"""
+        validate_table_name(table_name)
+        _, table_sql, base_conditions, params, _ = self._search_query_parts(table_name, conditions)
+        where_sql = " WHERE " + " AND ".join(base_conditions) if base_conditions else ""
+        return self._cached_search_count(table_name, table_sql, where_sql, params)
+
+    def _cached_search_count(self, table_name: str, table_sql: str, where_sql: str, params: list) -> int:
+        return self._cached_search_value(
+            ("count", table_name, where_sql, tuple(params)),
+            lambda: self._count_search_rows(f"{table_sql}{where_sql}", params),
+        )
+
+    def iter_search_personnel(
+        self,
+        table_name: str = "base_info",
+        batch_size: int = STREAM_BATCH_SIZE,
+        changed_since: Optional[int] = None,
+        **conditions,
+    ):
+        """按 search_personnel 的筛选条件流式读取单表全部匹配记录。
+
+        逐批产出 ResultSet，每批最多 batch_size 行，峰值内存与结果集大小无关。
+        给定 changed_since 时只读取变更版本号大于它的新增或修改行（见 changes_since）。
+        读取期间占用一个活动游标，应在同一线程内消费完毕或关闭生成器。
+        """
+        validate_table_name(table_name)
+        select_sql, table_sql, base_conditions, params, order_columns = self._search_query_parts(
+            table_name, conditions
+        )
+        if changed_since is not None:
+            alias = "b" if table_name == "base_info" else "r"
+            base_conditions = [
+                *base_conditions,
+                f"{alias}.id IN (SELECT row_id FROM change_log"
+                " WHERE table_name = ? AND version > ? AND op <> 'delete')",
+            ]
+            params = [*params, table_name, int(changed_since)]
+        where_sql = " WHERE " + " AND ".join(base_conditions) if base_conditions else ""
+        cursor = self._tuple_cursor()
+        try:
+            cursor.execute(f"{select_sql}{table_sql}{where_sql} ORDER BY {', '.join(order_columns)}", params)
+            yield from self._iter_cursor_batches(cursor, batch_size)
+        except sqlite3.Error as e:
+            logger.error(f"流式读取表 {table_name} 失败: {e}")
+            raise
+        finally:
+            cursor.close()
+
     def get_password(self, username: str) -> Optional[str]:
         cursor = self.conn.cursor()
         cursor.execute("SELECT password FROM users WHERE username=?", (username,))
@@ -983,10 +2137,11 @@ class Database:
             self.conn.rollback()
             return False
 
-    def get_all_data(self, table_name: str) -> List[Dict]:
+    def iter_all_data(self, table_name: str, batch_size: int = STREAM_BATCH_SIZE):
+        """流式读取整张表，逐批产出 ResultSet。"""
         validate_table_name(table_name)
+        cursor = self._tuple_cursor()
         try:
-            cursor = self.conn.cursor()
             if table_name in RELATED_TABLES:
                 select_columns = ", ".join(self._get_related_select_columns(table_name))
                 cursor.execute(
@@ -999,71 +2154,34 @@ class Database:
                 )
             else:
                 cursor.execute(f"SELECT * FROM {table_name}")
-            return [dict(row) for row in cursor.fetchall()]
+            yield from self._iter_cursor_batches(cursor, batch_size)
+        finally:
+            cursor.close()
+
+    def get_all_data(self, table_name: str) -> ResultSet:
+        validate_table_name(table_name)
+        try:
+            return ResultSet.concat(self.iter_all_data(table_name))
         except sqlite3.Error as e:
             logger.error(f"获取表 {table_name} 数据失败: {e}")
-            return []
-
-    def _extract_person_key(self, record: Dict, normalize_columns: bool = False) -> Optional[tuple]:
-        if normalize_columns:
-            normalized_record = {}
-            for column_name, value in record.items():
-                normalized_record[self.normalize_column_name(column_name)] = value
-            record = normalized_record
-
+            return ResultSet(())
+
+    def _normalize_record_columns(self, record: Dict, column_map: Dict[str, str]) -> Dict:
+        normalized_record = {}
+        for column_name, value in record.items():
+            normalized_column = column_map.get(column_name)
+            if normalized_column is None:
+                normalized_column = column_map[column_name] = self.normalize_column_name(column_name)
+            normalized_record[normalized_column] = value
+        return normalized_record
+
+    def _extract_person_key(self, record: Dict) -> Optional[tuple]:
         name = str(record.get("name") or "").strip()
         if not name:
             return None
 
         return self._normalize_sequence(record.get("sequence")), name
 
-    @staticmethod
-    def _related_import_record_key(person_id: int, record: Dict[str, Any]) -> tuple:
-        content_key = tuple(
-            sorted(
-                (key, str(value))
-                for key, value in record.items()
-                if key not in RELATED_IMPORT_IDENTITY_COLUMNS
-                and not key.endswith(DATE_DISPLAY_SUFFIX)
-            )
-        )
-        return person_id, content_key
-
-    def _filter_duplicate_related_import_rows(
-        self,
-        table_name: str,
-        records: List[Dict[str, Any]],
-        skip_existing: bool = True,
-    ) -> tuple:
-        validate_table_name(table_name)
-        if table_name not in RELATED_TABLES:
-            return records, 0
-
-        rows = self._normalize_import_rows(table_name, records)
-        related_business_columns = self._related_business_columns(table_name)
-        filtered_rows = []
-        seen_record_keys = set()
-        skipped_count = 0
-
-        for row in rows:
-            if not self._has_related_business_content(row, related_business_columns):
-                continue
-
-            person_id = self._resolve_person_id(row)
-            record_key = self._related_import_record_key(person_id, row)
-            if record_key in seen_record_keys:
-                skipped_count += 1
-                continue
-
-            if skip_existing and self._related_record_exists(table_name, person_id, row):
-                skipped_count += 1
-                continue
-
-            seen_record_keys.add(record_key)
-            filtered_rows.append(row)
-
-        return filtered_rows, skipped_count
-
     def find_duplicate_person_keys(self, table_name: str, records: List[Dict]) -> List[tuple]:
         validate_table_name(table_name)
         if not records:
@@ -1071,69 +2189,30 @@ class Database:
 
         if table_name == "base_info":
             duplicate_keys, _ = self._find_duplicate_base_person_keys_in_records(records)
-            existing_keys = {
-                key
-                for key in (self._extract_person_key(row) for row in self.get_all_data("base_info"))
-                if key
-            }
+            existing_keys = self._load_base_person_key_map()
             duplicates = []
+            column_map = {}
             for record in records:
-                key = self._extract_person_key(record, normalize_columns=True)
+                key = self._extract_person_key(self._normalize_record_columns(record, column_map))
                 if key and key in existing_keys:
                     duplicates.append(key)
             duplicates.extend(duplicate_keys)
             return duplicates
 
-        duplicates = []
-        seen_record_keys = set()
-        related_business_columns = self._related_business_columns(table_name)
-        normalized_records = self._normalize_import_rows(table_name, records)
-        for normalized_record in normalized_records:
-            if not self._has_related_business_content(normalized_record, related_business_columns):
-                continue
-
-            person_id = None
-            try:
-                person_id = self._resolve_person_id(normalized_record)
-            except ValueError:
-                continue
-
-            record_key = self._related_import_record_key(person_id, normalized_record)
-            if record_key in seen_record_keys:
-                key = self._extract_person_key(normalized_record)
-                if key:
-                    duplicates.append(key)
-                continue
-            seen_record_keys.add(record_key)
-
-            if self._related_record_exists(table_name, person_id, normalized_record):
-                key = self._extract_person_key(normalized_record)
-                if key:
-                    duplicates.append(key)
-        return duplicates
+        rows = self._normalize_import_rows(table_name, records)
+        indexed_rows = self._indexed_related_rows_with_content(table_name, rows)
+        if not indexed_rows:
+            return []
 
-    def _related_record_exists(self, table_name: str, person_id: int, record: Dict[str, Any]) -> bool:
-        table_columns = set(self.get_table_columns(table_name))
-        comparable_columns = [
-            column
-            for column in record
-            if (
-                column in table_columns
-                and column not in {"id", "person_id", "sequence", "name"}
-                and not self._is_date_display_column(table_name, column)
-            )
+        rows_by_index = dict(indexed_rows)
+        with self._staged_related_import(table_name, indexed_rows):
+            self._mark_duplicate_staged_related_rows(table_name)
+            duplicate_indexes = self._duplicate_staged_row_indexes()
+        return [
+            key
+            for key in (self._extract_person_key(rows_by_index[index]) for index in duplicate_indexes)
+            if key
         ]
-        conditions = ["person_id = ?"]
-        params = [person_id]
-        for column in comparable_columns:
-            conditions.append(f"COALESCE(CAST({column} AS TEXT), '') = ?")
-            params.append("" if record.get(column) is None else str(record.get(column)))
-        cursor = self.conn.cursor()
-        row = cursor.execute(
-            f"SELECT 1 FROM {table_name} WHERE {' AND '.join(conditions)} LIMIT 1",
-            params,
-        ).fetchone()
-        return row is not None
 
     def clear_business_data(self) -> bool:
         try:
@@ -1142,6 +2221,10 @@ class Database:
                 cursor.execute(f"DELETE FROM {table_name}")
             cursor.execute("DELETE FROM base_info")
             cursor.execute("DELETE FROM system_config WHERE config_key='assessment_years'")
+            cursor.execute(
+                "DELETE FROM system_config WHERE config_key LIKE ?",
+                (IMPORT_FILE_HASH_KEY_PREFIX + "%",),
+            )
             self.conn.commit()
             logger.info("业务数据表和年度考核配置已清空")
             return True
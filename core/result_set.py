@@ -0,0 +1,150 @@
+"""Compact query results: one shared column header plus row tuples."""
+
+from collections.abc import Mapping, Sequence
+from typing import Any, Iterable, Optional
+
+
+class RowView(Mapping):
+    """Read-only dict-like view of one ResultSet row."""
+
+    __slots__ = ("_positions", "_values")
+
+    def __init__(self, positions: dict, values: tuple):
+        self._positions = positions
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._positions[key]]
+
+    def get(self, key, default=None):
+        position = self._positions.get(key)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResultSet(Sequence):
+    """Rows stored as tuples against a shared header.
+
+    Iterating or indexing yields RowView objects, so code written for lists of
+    dicts keeps working without a dict being built per row. Slicing and
+    project() share the row storage or build new tuples, never dicts.
+    """
+
+    __slots__ = ("columns", "rows", "_positions")
+
+    def __init__(self, columns: Iterable[str], rows: Optional[Iterable[tuple]] = None):
+        self.columns = tuple(columns)
+        self.rows = rows if isinstance(rows, list) else list(rows or ())
+        self._positions = {column: index for index, column in enumerate(self.columns)}
+
+    @classmethod
+    def from_cursor(cls, cursor, rows=None) -> "ResultSet":
+        """Build from an executed cursor; rows default to cursor.fetchall()."""
+        columns = [description[0] for description in cursor.description or ()]
+        if rows is None:
+            rows = cursor.fetchall()
+        if rows and not isinstance(rows[0], tuple):
+            rows = [tuple(row) for row in rows]
+        return cls(columns, rows)
+
+    @classmethod
+    def from_dicts(cls, records: Iterable[Mapping], columns: Optional[Iterable[str]] = None) -> "ResultSet":
+        """Build from mappings; columns default to every key in first-seen order."""
+        records = list(records)
+        if columns is None:
+            columns = {}
+            for record in records:
+                columns.update(dict.fromkeys(record))
+        columns = tuple(columns)
+        return cls(columns, [tuple(record.get(column) for column in columns) for record in records])
+
+    @classmethod
+    def coerce(cls, data) -> "ResultSet":
+        """Return data unchanged when it is a ResultSet, otherwise wrap a sequence of mappings."""
+        if isinstance(data, cls):
+            return data
+        return cls.from_dicts(data or ())
+
+    @classmethod
+    def concat(cls, parts: Iterable) -> "ResultSet":
+        """Join batches (ResultSets or sequences of mappings) into one ResultSet.
+
+        The header is the union of every batch's columns in first-seen order;
+        rows from batches without a column get None there.
+        """
+        parts = [part for part in map(cls.coerce, parts) if part]
+        columns = {}
+        for part in parts:
+            columns.update(dict.fromkeys(part.columns))
+        columns = tuple(columns)
+        rows = []
+        for part in parts:
+            rows.extend(part.project(columns).rows)
+        return cls(columns, rows)
+
+    def project(self, columns: Iterable[str], default: Any = None) -> "ResultSet":
+        """Return a ResultSet with only the given columns; missing ones are filled with default."""
+        columns = tuple(columns)
+        if columns == self.columns:
+            return self
+        positions = [self._positions.get(column) for column in columns]
+        return ResultSet(
+            columns,
+            [
+                tuple(default if position is None else values[position] for position in positions)
+                for values in self.rows
+            ],
+        )
+
+    def column(self, name: str) -> list:
+        position = self._positions[name]
+        return [values[position] for values in self.rows]
+
+    def to_dicts(self) -> list:
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ResultSet(self.columns, self.rows[index])
+        return RowView(self._positions, self.rows[index])
+
+    def __iter__(self):
+        positions = self._positions
+        for values in self.rows:
+            yield RowView(positions, values)
+
+    def __eq__(self, other):
+        if isinstance(other, ResultSet) and other.columns == self.columns:
+            return self.rows == other.rows
+        if isinstance(other, (ResultSet, list, tuple)):
+            return len(self) == len(other) and all(row == other_row for row, other_row in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ResultSet(columns={list(self.columns)!r}, rows={len(self.rows)})"
+
+
+def json_default(value):
+    """json.dumps default hook: serialize ResultSet/RowView as plain lists and dicts."""
+    if isinstance(value, ResultSet):
+        return value.to_dicts()
+    if isinstance(value, RowView):
+        return dict(value)
+    return str(value)
@@ -1,5 +1,12 @@
-"""Query form options and mappings."""
+"""Query form options and mappings.
 
+GRADE_OPTIONS, POSITION_MAPPING and EDUCATION_KEYWORDS also define the facet
+codes stored in base_info (grade_code, position_level and the education
+masks). The database records a hash of these three; after any edit the next
+open sees a different hash and recomputes the facets of every stored person.
+"""
+
+# The position in this list is the stored grade_code
 GRADE_OPTIONS = [
     "副厅", "正处", "副处", "二级高级检察官", "三级高级检察官",
     "四级高级检察官", "一级检察官", "二级检察官", "三级检察官",
@@ -12,6 +19,7 @@ GRADE_OPTIONS = [
 
 POSITION_LEVELS = ["副厅", "正县", "副县", "正科", "副科", "副科级以上", "其他"]
 
+# Title -> level is stored as position_level
 POSITION_MAPPING = {
     "副厅": ["检察长"],
     "正县": ["常务副检察长"],
@@ -41,6 +49,7 @@ POSITION_GROUPS = {
 
 EDUCATION_LEVELS = ["博士", "硕士", "学士", "专科", "本科及以上"]
 
+# The first-seen order of the keywords assigns the education mask bits
 EDUCATION_KEYWORDS = {
     "博士": ["博士"],
     "硕士": ["硕士"],
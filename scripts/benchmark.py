@@ -0,0 +1,1096 @@
+# -*- coding: utf-8 -*-
+"""Performance benchmarks for the database and import/export pipelines.
+
+Usage:
+    python scripts/benchmark.py open --sizes 1000 20000 200000
+    python scripts/benchmark.py upsert --sizes 1000 20000
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.database import Database  # noqa: E402
+from core.result_set import ResultSet  # noqa: E402
+from metadata.constants import TABLE_FIELD_LABELS, TABLE_LABELS  # noqa: E402
+from services.excel_import import (  # noqa: E402
+    IMPORT_CHUNK_SIZE,
+    ImportColumnPlan,
+    clean_column_name,
+    convert_excel_date,
+    import_prepared_records,
+    import_workbook,
+    plan_import_session,
+    prepare_import_preview,
+)
+from services.excel_export import export_all_tables, export_table_batches  # noqa: E402
+from services.excel_reader import (  # noqa: E402
+    READ_BATCH_SIZE,
+    ExcelSheetReader,
+    MergedRangeFill,
+    columns_from_rows,
+)
+from metadata.query_options import (  # noqa: E402
+    EDUCATION_KEYWORDS,
+    GRADE_OPTIONS,
+    POSITION_GROUPS,
+    POSITION_MAPPING,
+)
+
+
+BENCHMARKS = {}
+POSITION_TITLES = [title for titles in POSITION_MAPPING.values() for title in titles]
+EDUCATION_TEXTS = ["大学本科 法学学士", "研究生 法学硕士", "博士研究生 法学博士", "大专", "中专"]
+
+
+def benchmark(name: str, help_text: str):
+    def decorator(func):
+        BENCHMARKS[name] = (func, help_text)
+        return func
+
+    return decorator
+
+
+def timed(func, repeat: int = 5, setup=None) -> float:
+    """Return the median wall-clock time of func() in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def synthetic_person(index: int) -> dict:
+    return {
+        "sequence": index,
+        "name": f"人员{index:06d}",
+        "current_position": POSITION_TITLES[index % len(POSITION_TITLES)],
+        "current_grade": GRADE_OPTIONS[index % len(GRADE_OPTIONS)],
+        "gender": "男" if index % 2 else "女",
+        "birth_date": f"{1960 + index % 40}.{index % 12 + 1:02d}",
+        "work_start_date": f"{1980 + index % 40}.{index % 12 + 1:02d}",
+        "fulltime_education": EDUCATION_TEXTS[index % len(EDUCATION_TEXTS)],
+        "hometown": "江苏南京",
+    }
+
+
+def _bulk_insert(conn, table_name: str, rows: list):
+    columns = list(rows[0].keys())
+    placeholders = ", ".join("?" for _ in columns)
+    conn.executemany(
+        f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})",
+        [tuple(row[column] for column in columns) for row in rows],
+    )
+
+
+def _with_date_display(row: dict, date_fields) -> dict:
+    row = dict(row)
+    for field_name in date_fields:
+        if field_name in row:
+            display_value = row[field_name]
+            row[field_name] = display_value.replace(".", "-")
+            row[f"{field_name}_display"] = display_value
+    return row
+
+
+def build_roster_database(db_path: str, person_count: int, family_per_person: int = 0):
+    """Create a database with synthetic persons using raw bulk inserts."""
+    db = Database(db_path)
+    try:
+        persons = [
+            _with_date_display(synthetic_person(index), ("birth_date", "work_start_date"))
+            for index in range(1, person_count + 1)
+        ]
+        for person in persons:
+            person["person_key"] = Database._person_key(person["sequence"], person["name"])
+            person.update(Database._base_info_facets(person))
+        _bulk_insert(db.conn, "base_info", persons)
+        if family_per_person:
+            family_rows = [
+                _with_date_display(
+                    {
+                        "person_id": index,
+                        "relation": f"亲属{member}",
+                        "family_name": f"家属{index:06d}-{member}",
+                        "birth_date": f"{1930 + index % 60}.{member % 12 + 1:02d}",
+                        "work_unit": "某单位",
+                    },
+                    ("birth_date",),
+                )
+                for index in range(1, person_count + 1)
+                for member in range(family_per_person)
+            ]
+            for row in family_rows:
+                row["content_hash"] = Database._related_content_hash("family", row)
+            _bulk_insert(db.conn, "family", family_rows)
+        db.conn.commit()
+    finally:
+        db.close()
+
+
+@benchmark("open", "Database open latency against roster size")
+def bench_open(args):
+    print(f"{'persons':>10} {'migrating open':>16} {'versioned open':>16} {'open_existing':>15}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+
+            def reset_schema_version():
+                conn = sqlite3.connect(db_path)
+                conn.execute("PRAGMA user_version = 0")
+                conn.close()
+
+            def open_database():
+                Database(db_path).close()
+
+            def open_existing_database():
+                Database(db_path, open_existing=True).close()
+
+            migrating_ms = timed(open_database, args.repeat, setup=reset_schema_version)
+            versioned_ms = timed(open_database, args.repeat)
+            fast_ms = timed(open_existing_database, args.repeat)
+            print(f"{size:>10} {migrating_ms:>14.1f}ms {versioned_ms:>14.1f}ms {fast_ms:>13.1f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("upsert", "Re-import of an existing base_info roster")
+def bench_upsert(args):
+    print(f"{'persons':>10} {'re-import':>12}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+            persons = [synthetic_person(index) for index in range(1, size + 1)]
+            db = Database(db_path)
+            try:
+                upsert_ms = timed(lambda: db.import_excel_data("base_info", persons), args.repeat)
+            finally:
+                db.close()
+            print(f"{size:>10} {upsert_ms:>10.1f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("resolve", "Person identity lookups against roster size")
+def bench_resolve(args):
+    lookups = 2000
+    print(f"{'persons':>10} {f'{lookups} lookups':>14}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+            step = max(size // lookups, 1)
+            keys = [(str(index), f"人员{index:06d}") for index in range(1, size + 1, step)][:lookups]
+            db = Database(db_path)
+            try:
+                resolve_ms = timed(lambda: [db._find_base_person_id_by_key(key) for key in keys], args.repeat)
+            finally:
+                db.close()
+            print(f"{size:>10} {resolve_ms:>12.1f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("related", "Import of family rows (4 per person) with duplicate skipping")
+def bench_related(args):
+    print(f"{'family rows':>12} {'import':>12}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            person_count = max(size // 4, 1)
+            build_roster_database(db_path, person_count)
+            family_rows = [
+                {
+                    "sequence": index,
+                    "name": f"人员{index:06d}",
+                    "relation": f"亲属{member}",
+                    "family_name": f"家属{index:06d}-{member}",
+                    "birth_date": f"{1930 + index % 60}.{member % 12 + 1:02d}",
+                    "work_unit": "某单位",
+                }
+                for index in range(1, person_count + 1)
+                for member in range(4)
+            ]
+
+            def reset_family():
+                conn = sqlite3.connect(db_path)
+                conn.execute("DELETE FROM family")
+                conn.commit()
+                conn.close()
+
+            db = Database(db_path)
+            try:
+                import_ms = timed(
+                    lambda: db.import_related_rows("family", family_rows),
+                    args.repeat,
+                    setup=reset_family,
+                )
+            finally:
+                db.close()
+            print(f"{len(family_rows):>12} {import_ms:>10.1f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("page", "search_personnel page 1 versus page 2000 (50 rows per page)")
+def bench_page(args):
+    page_size = 50
+    print(f"{'persons':>10} {'table':>10} {'first page 2000':>16} {'page 1':>10} {'page 2000':>10}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size, family_per_person=2)
+            db = Database(db_path)
+            try:
+                for table_name in ("base_info", "family"):
+                    def load_page(page):
+                        return db.search_personnel(
+                            table_name=table_name,
+                            limit=page_size,
+                            offset=(page - 1) * page_size,
+                        )
+
+                    last_page = min(2000, max(size * (1 if table_name == "base_info" else 2) // page_size, 1))
+                    first_visit_ms = timed(lambda: load_page(last_page), 1)
+                    page_one_ms = timed(lambda: load_page(1), args.repeat)
+                    page_last_ms = timed(lambda: load_page(last_page), args.repeat)
+                    print(
+                        f"{size:>10} {table_name:>10} {first_visit_ms:>14.1f}ms "
+                        f"{page_one_ms:>8.2f}ms {page_last_ms:>8.2f}ms"
+                    )
+            finally:
+                db.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("fulltext", "Keyword search over resumes with the FTS index versus LIKE scans")
+def bench_fulltext(args):
+    print(f"{'persons':>10} {'LIKE':>10} {'FTS':>10}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+            filler = "某区人民检察院第一检察部检察官助理，负责审查起诉工作。" * 60
+            conn = sqlite3.connect(db_path)
+            conn.executemany(
+                "INSERT INTO resume (person_id, resume_text) VALUES (?, ?)",
+                (
+                    (index, filler + ("未成年人检察" if index % 500 == 0 else ""))
+                    for index in range(1, size + 1)
+                ),
+            )
+            conn.commit()
+            conn.close()
+            db = Database(db_path)
+            try:
+                def search():
+                    db._search_cache.clear()
+                    return db.search_personnel(table_name="base_info", keyword="未成年人检察")
+
+                fts_ms = timed(search, args.repeat)
+                original = Database._fulltext_enabled
+                Database._fulltext_enabled = lambda self: False
+                try:
+                    like_ms = timed(search, args.repeat)
+                finally:
+                    Database._fulltext_enabled = original
+            finally:
+                db.close()
+            print(f"{size:>10} {like_ms:>8.1f}ms {fts_ms:>8.1f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("facets", "Combined grade/position/education filters: facet columns versus LIKE chains")
+def bench_facets(args):
+    grades = ["一级检察官", "二级检察官"]
+    positions = [title for level in POSITION_GROUPS["副科级以上"] for title in POSITION_MAPPING[level]]
+    education = EDUCATION_KEYWORDS["硕士"]
+    like_sql = " AND ".join(
+        [
+            "(" + " OR ".join("current_grade LIKE ?" for _ in grades) + ")",
+            "(" + " OR ".join("current_position = ?" for _ in positions) + ")",
+            "(" + " OR ".join("fulltime_education LIKE ?" for _ in education) + ")",
+        ]
+    )
+    like_params = [f"%{grade}%" for grade in grades] + positions + [f"%{keyword}%" for keyword in education]
+    print(f"{'persons':>10} {'LIKE chains':>12} {'facets':>10}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+            db = Database(db_path)
+            try:
+                def facet_search():
+                    db._search_cache.clear()
+                    return db.search_personnel(
+                        table_name="base_info",
+                        grades=grades,
+                        position=positions,
+                        education=education,
+                        limit=50,
+                    )
+
+                def like_search():
+                    return db.conn.execute(
+                        f"SELECT * FROM base_info WHERE {like_sql} ORDER BY id LIMIT 50", like_params
+                    ).fetchall() + db.conn.execute(
+                        f"SELECT COUNT(*) FROM base_info WHERE {like_sql}", like_params
+                    ).fetchall()
+
+                like_ms = timed(like_search, args.repeat)
+                facet_ms = timed(facet_search, args.repeat)
+            finally:
+                db.close()
+            print(f"{size:>10} {like_ms:>10.1f}ms {facet_ms:>8.1f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def peak_mib(func) -> float:
+    """Return the peak traced Python heap while running func(), in MiB."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark("stream", "Peak Python memory reading a full search result: search_personnel versus streaming")
+def bench_stream(args):
+    print(f"{'persons':>10} {'search_personnel':>18} {'iter_search_personnel':>22}")
+
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size, family_per_person=2)
+            db = Database(db_path)
+            try:
+                def read_all():
+                    return sum(
+                        len(db.search_personnel(table_name=table_name)[table_name])
+                        for table_name in ("base_info", "family")
+                    )
+
+                def stream_all():
+                    return sum(
+                        len(batch)
+                        for table_name in ("base_info", "family")
+                        for batch in db.iter_search_personnel(table_name)
+                    )
+
+                list_mib = peak_mib(read_all)
+                stream_mib = peak_mib(stream_all)
+            finally:
+                db.close()
+            print(f"{size:>10} {list_mib:>15.1f}MiB {stream_mib:>19.1f}MiB")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("resultset", "Memory retained by a full base_info result: list of dicts versus ResultSet")
+def bench_resultset(args):
+    print(f"{'persons':>10} {'list of dicts':>15} {'ResultSet':>12}")
+
+    def retained_mib(func) -> float:
+        tracemalloc.start()
+        try:
+            result = func()
+            retained = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            del result
+            return retained
+        finally:
+            tracemalloc.stop()
+
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+            db = Database(db_path)
+            try:
+                dicts_mib = retained_mib(
+                    lambda: db.search_personnel(table_name="base_info")["base_info"].to_dicts()
+                )
+                result_set_mib = retained_mib(lambda: db.search_personnel(table_name="base_info")["base_info"])
+            finally:
+                db.close()
+            print(f"{size:>10} {dicts_mib:>12.1f}MiB {result_set_mib:>9.1f}MiB")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def write_family_workbook(path: str, row_count: int):
+    """Write a family sheet with two detail rows per person and merged sequence/name cells."""
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["序号", "姓名", "称谓", "家庭成员姓名", "出生日期", "家庭成员工作单位"])
+    for index in range(row_count):
+        person = index // 2 + 1
+        first = index % 2 == 0
+        sheet.append([
+            person if first else None,
+            f"人员{person:06d}" if first else None,
+            "父亲" if first else "母亲",
+            f"家属{index:07d}",
+            f"{1930 + index % 60}.{index % 12 + 1:02d}",
+            "某单位",
+        ])
+        if not first:
+            sheet.merge_cells(start_row=index + 1, start_column=1, end_row=index + 2, end_column=1)
+            sheet.merge_cells(start_row=index + 1, start_column=2, end_row=index + 2, end_column=2)
+    workbook.save(path)
+
+
+def write_roster_sheets(path: str, person_count: int, sheets=("base_info", "family", "resume")):
+    """Write base_info/family/resume sheets named after TABLE_LABELS, one workbook per call."""
+    import openpyxl
+
+    rows = {
+        "base_info": (["序号", "姓名", "职级/等级"], [
+            [index, f"人员{index:06d}", GRADE_OPTIONS[index % len(GRADE_OPTIONS)]]
+            for index in range(1, person_count + 1)
+        ]),
+        "family": (["序号", "姓名", "称谓", "家庭成员姓名"], [
+            [index, f"人员{index:06d}", relation, f"家属{index:06d}-{relation}"]
+            for index in range(1, person_count + 1)
+            for relation in ("父亲", "母亲")
+        ]),
+        "resume": (["序号", "姓名", "简历"], [
+            [index, f"人员{index:06d}", f"{1990 + index % 30}.09- 某单位工作"]
+            for index in range(1, person_count + 1)
+        ]),
+    }
+    workbook = openpyxl.Workbook(write_only=True)
+    for table_name in sheets:
+        sheet = workbook.create_sheet(TABLE_LABELS[table_name])
+        header, values = rows[table_name]
+        sheet.append(header)
+        for row in values:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def read_workbook_legacy(path: str) -> int:
+    """The pre-streaming import read: pandas, then a full openpyxl load for merged ranges."""
+    import openpyxl
+    import pandas as pd
+
+    df = pd.read_excel(path, sheet_name=0, dtype=str)
+    sheet = openpyxl.load_workbook(path, data_only=True).active
+    for merged_range in list(sheet.merged_cells.ranges):
+        if merged_range.min_row == 1:
+            continue
+        value = sheet.cell(row=merged_range.min_row, column=merged_range.min_col).value
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for col in range(merged_range.min_col, merged_range.max_col + 1):
+                df.iat[row - 2, col - 1] = str(value) if value is not None else ""
+    return len(df.dropna(how="all"))
+
+
+def read_workbook_streaming(path: str) -> int:
+    with ExcelSheetReader(path, fill_merged=True) as reader:
+        return sum(len(batch[0]) for batch in reader.iter_batches())
+
+
+@benchmark("excel_read", "Reading a merged family workbook: pandas plus openpyxl versus the streaming reader")
+def bench_excel_read(args):
+    print(f"{'rows':>10} {'legacy':>10} {'legacy peak':>13} {'streaming':>11} {'streaming peak':>16}")
+
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            path = os.path.join(work_dir, "family.xlsx")
+            write_family_workbook(path, size)
+            assert read_workbook_legacy(path) == read_workbook_streaming(path) == size
+            legacy_ms = timed(lambda: read_workbook_legacy(path), repeat=args.repeat)
+            streaming_ms = timed(lambda: read_workbook_streaming(path), repeat=args.repeat)
+            legacy_mib = peak_mib(lambda: read_workbook_legacy(path))
+            streaming_mib = peak_mib(lambda: read_workbook_streaming(path))
+            print(
+                f"{size:>10} {legacy_ms:>8.0f}ms {legacy_mib:>10.1f}MiB "
+                f"{streaming_ms:>9.0f}ms {streaming_mib:>13.1f}MiB"
+            )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("merge_fill", "Filling merged sequence/name cells: per-cell df.iat writes versus MergedRangeFill")
+def bench_merge_fill(args):
+    import pandas as pd
+
+    print(f"{'rows':>10} {'merges':>8} {'df.iat':>10} {'MergedRangeFill':>17}")
+    for size in args.sizes:
+        rows = [
+            [str(index // 2 + 1) if index % 2 == 0 else None, f"人员{index // 2 + 1:06d}" if index % 2 == 0 else None,
+             "父亲" if index % 2 == 0 else "母亲", f"家属{index:07d}"]
+            for index in range(size)
+        ]
+        # Two rows per person with sequence and name merged; sheet row 1 is the header.
+        ranges = [
+            (row, col, row + 1, col)
+            for row in range(2, size + 1, 2)
+            for col in (1, 2)
+        ]
+
+        def fill_iat():
+            df = pd.DataFrame(rows, dtype=str)
+            for min_row, min_col, max_row, max_col in ranges:
+                value = df.iat[min_row - 2, min_col - 1]
+                for row in range(min_row, max_row + 1):
+                    for col in range(min_col, max_col + 1):
+                        df.iat[row - 2, col - 1] = str(value) if value is not None else ""
+            return df
+
+        def fill_ranges():
+            merged_fill = MergedRangeFill(ranges, 1, 4)
+            batches = []
+            for start in range(0, size, READ_BATCH_SIZE):
+                columns = columns_from_rows(rows[start:start + READ_BATCH_SIZE])
+                merged_fill.fill(columns, start + 2)
+                batches.append(columns)
+            return batches
+
+        assert fill_ranges()[-1][1][-1] == fill_iat().iat[size - 1, 1]
+        iat_ms = timed(fill_iat, repeat=args.repeat)
+        ranges_ms = timed(fill_ranges, repeat=args.repeat)
+        print(f"{size:>10} {len(ranges):>8} {iat_ms:>8.0f}ms {ranges_ms:>15.1f}ms")
+
+
+@benchmark("import_convert", "Converting a base_info sheet to records: iterrows versus ImportColumnPlan")
+def bench_import_convert(args):
+    import re
+
+    import pandas as pd
+
+    labels = dict(TABLE_FIELD_LABELS["base_info"])
+    fields = list(synthetic_person(1))
+    columns = [labels[field_name] for field_name in fields]
+    print(f"{'rows':>10} {'iterrows':>10} {'row dicts':>11} {'columns':>9}")
+
+    for size in args.sizes:
+        rows = [[str(synthetic_person(index)[field_name]) for field_name in fields] for index in range(1, size + 1)]
+        batches = [rows[start:start + READ_BATCH_SIZE] for start in range(0, size, READ_BATCH_SIZE)]
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db = Database(os.path.join(work_dir, "bench.db"))
+            try:
+                def convert_iterrows():
+                    df = pd.DataFrame(rows, columns=columns)
+                    records = []
+                    for _, row in df.iterrows():
+                        record = {}
+                        for col_name, value in row.items():
+                            re.search(r'(\d{4})年年度考核结果', col_name)
+                            record[clean_column_name(col_name)] = convert_excel_date(value)
+                        records.append(record)
+                    return db._normalize_import_rows("base_info", records)
+
+                def convert_row_dicts():
+                    records = []
+                    for offset, batch in enumerate(batches):
+                        batch_records = [
+                            {column: convert_excel_date(value) for column, value in zip(columns, row)}
+                            for row in batch
+                        ]
+                        records.extend(
+                            db._normalize_import_rows("base_info", batch_records, row_offset=offset * READ_BATCH_SIZE)
+                        )
+                    return records
+
+                column_batches = [columns_from_rows(batch) for batch in batches]
+
+                def convert_columns():
+                    plan = ImportColumnPlan(db, "base_info", columns)
+                    records = []
+                    for offset, batch in enumerate(column_batches):
+                        records.extend(plan.convert(batch, row_offset=offset * READ_BATCH_SIZE))
+                    return records
+
+                assert convert_iterrows() == convert_row_dicts() == convert_columns()
+                iterrows_ms = timed(convert_iterrows, repeat=args.repeat)
+                row_dicts_ms = timed(convert_row_dicts, repeat=args.repeat)
+                columns_ms = timed(convert_columns, repeat=args.repeat)
+            finally:
+                db.close()
+            print(f"{size:>10} {iterrows_ms:>8.0f}ms {row_dicts_ms:>9.0f}ms {columns_ms:>7.0f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("import_commit", "Import commit time: re-resolving records versus writing a preview ImportSession")
+def bench_import_commit(args):
+    print(f"{'persons':>10} {'table':>10} {'records':>11} {'session':>9}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            template_path = os.path.join(work_dir, "template.db")
+            build_roster_database(template_path, size)
+            db_path = os.path.join(work_dir, "bench.db")
+            workloads = {
+                "base_info": [
+                    dict(synthetic_person(index), current_grade=GRADE_OPTIONS[(index + 1) % len(GRADE_OPTIONS)])
+                    for index in range(1, size + 1)
+                ],
+                "family": [
+                    {
+                        "sequence": index,
+                        "name": f"人员{index:06d}",
+                        "relation": f"亲属{member}",
+                        "family_name": f"家属{index:06d}-{member}",
+                        "birth_date": f"{1930 + index % 60}.{member % 12 + 1:02d}",
+                    }
+                    for index in range(1, size + 1)
+                    for member in range(2)
+                ],
+            }
+            for table_name, raw_records in workloads.items():
+                db = Database(template_path)
+                try:
+                    records = db._normalize_import_rows(table_name, raw_records)
+                    session, _duplicate_keys, error_message = plan_import_session(db, table_name, records)
+                    assert error_message is None, error_message
+                finally:
+                    db.close()
+
+                def reset():
+                    shutil.copyfile(template_path, db_path)
+
+                def commit_records():
+                    assert import_prepared_records(db_path, table_name, records)["success"]
+
+                def commit_session():
+                    assert import_prepared_records(db_path, table_name, records, None, session)["success"]
+
+                records_ms = timed(commit_records, repeat=args.repeat, setup=reset)
+                session_ms = timed(commit_session, repeat=args.repeat, setup=reset)
+                print(f"{size:>10} {table_name:>10} {records_ms:>9.0f}ms {session_ms:>7.0f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("import_chunks", "Family import commit: one transaction versus savepoint chunks, with the longest write-lock hold")
+def bench_import_chunks(args):
+    print(f"{'persons':>10} {'chunk':>8} {'total':>9} {'max lock':>9}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            template_path = os.path.join(work_dir, "template.db")
+            build_roster_database(template_path, size)
+            db_path = os.path.join(work_dir, "bench.db")
+            raw_records = [
+                {"sequence": index, "name": f"人员{index:06d}", "relation": f"亲属{member}", "family_name": f"家属{member}"}
+                for index in range(1, size + 1)
+                for member in range(2)
+            ]
+            db = Database(template_path)
+            try:
+                records = db._normalize_import_rows("family", raw_records)
+                session, _duplicate_keys, error_message = plan_import_session(db, "family", records)
+                assert error_message is None, error_message
+            finally:
+                db.close()
+
+            for chunk_size in (len(records), IMPORT_CHUNK_SIZE):
+                holds = []
+
+                def reset():
+                    shutil.copyfile(template_path, db_path)
+                    holds.clear()
+
+                def commit():
+                    marks = [time.perf_counter()]
+
+                    def report(_info):
+                        now = time.perf_counter()
+                        holds.append(now - marks[-1])
+                        marks.append(now)
+
+                    result = import_prepared_records(db_path, "family", records, None, session, report, None, chunk_size)
+                    assert result["success"], result["message"]
+
+                total_ms = timed(commit, repeat=args.repeat, setup=reset)
+                print(f"{size:>10} {chunk_size:>8} {total_ms:>7.0f}ms {max(holds) * 1000:>7.0f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("import_workbook", "Importing base_info, family and resume: one file per table versus one workbook job")
+def bench_import_workbook(args):
+    print(f"{'persons':>10} {'per table':>11} {'workbook':>10}")
+    tables = ("base_info", "family", "resume")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            template_path = os.path.join(work_dir, "template.db")
+            Database(template_path).close()
+            db_path = os.path.join(work_dir, "bench.db")
+            workbook_path = os.path.join(work_dir, "roster.xlsx")
+            write_roster_sheets(workbook_path, size, tables)
+            table_paths = {}
+            for table_name in tables:
+                table_paths[table_name] = os.path.join(work_dir, f"{table_name}.xlsx")
+                write_roster_sheets(table_paths[table_name], size, (table_name,))
+
+            def reset():
+                shutil.copyfile(template_path, db_path)
+
+            def per_table():
+                for table_name in tables:
+                    preview = prepare_import_preview(table_paths[table_name], db_path, table_name)
+                    assert preview["success"], preview["message"]
+                    result = import_prepared_records(
+                        db_path, table_name, preview["records"], preview["assessment_years"], preview["session"]
+                    )
+                    assert result["success"], result["message"]
+
+            def whole_workbook():
+                result = import_workbook(workbook_path, db_path)
+                assert result["success"], result["message"]
+
+            per_table_ms = timed(per_table, repeat=args.repeat, setup=reset)
+            workbook_ms = timed(whole_workbook, repeat=args.repeat, setup=reset)
+            print(f"{size:>10} {per_table_ms:>9.0f}ms {workbook_ms:>8.0f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("reimport", "Monthly base_info re-import with 3% changed rows: update every person versus fingerprint skip")
+def bench_reimport(args):
+    print(f"{'persons':>10} {'update all':>11} {'WAL':>9} {'fingerprint':>12} {'WAL':>9}")
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            template_path = os.path.join(work_dir, "template.db")
+            db_path = os.path.join(work_dir, "bench.db")
+            roster = [synthetic_person(index) for index in range(1, size + 1)]
+            db = Database(template_path)
+            try:
+                db.import_excel_data("base_info", roster)
+                db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                rows = db._normalize_import_rows("base_info", [
+                    dict(person, current_grade="一级") if index % 33 == 0 else person
+                    for index, person in enumerate(roster)
+                ])
+            finally:
+                db.close()
+
+            def reset():
+                shutil.copyfile(template_path, db_path)
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+
+            def wal_mib():
+                path = db_path + "-wal"
+                return os.path.getsize(path) / (1024 * 1024) if os.path.exists(path) else 0.0
+
+            def write(skip_unchanged):
+                db = Database(db_path, open_existing=True)
+                try:
+                    person_ids, fingerprints, keep, _ = db.plan_base_info_import(rows)
+                    db.write_base_info_rows(rows, person_ids, fingerprints, keep if skip_unchanged else None)
+                    return wal_mib()
+                finally:
+                    db.close()
+
+            results = []
+            for skip_unchanged in (False, True):
+                wal = []
+                elapsed = timed(lambda: wal.append(write(skip_unchanged)), repeat=args.repeat, setup=reset)
+                results.append((elapsed, max(wal)))
+            (all_ms, all_wal), (skip_ms, skip_wal) = results
+            print(f"{size:>10} {all_ms:>9.0f}ms {all_wal:>6.1f}MiB {skip_ms:>10.0f}ms {skip_wal:>6.1f}MiB")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("flat_import", "Family extract import (2 rows per person): xlsx versus UTF-8 and GBK CSV")
+def bench_flat_import(args):
+    import csv
+
+    import openpyxl
+
+    print(f"{'rows':>10} {'xlsx':>10} {'csv utf-8':>11} {'csv gbk':>9}")
+    header = ["序号", "姓名", "称谓", "家庭成员姓名", "出生日期", "家庭成员工作单位"]
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            template_path = os.path.join(work_dir, "template.db")
+            build_roster_database(template_path, (size + 1) // 2)
+            db_path = os.path.join(work_dir, "bench.db")
+            rows = [
+                [person, f"人员{person:06d}", relation, f"家属{person:06d}-{relation}", f"{1930 + person % 60}.{month:02d}", "某单位"]
+                for person in range(1, (size + 1) // 2 + 1)
+                for relation, month in (("父亲", 3), ("母亲", 7))
+            ][:size]
+            paths = {"xlsx": os.path.join(work_dir, "family.xlsx")}
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet(TABLE_LABELS["family"])
+            for row in [header] + rows:
+                sheet.append(row)
+            workbook.save(paths["xlsx"])
+            for encoding in ("utf-8", "gbk"):
+                paths[encoding] = os.path.join(work_dir, f"family-{encoding}.csv")
+                with open(paths[encoding], "w", encoding=encoding, newline="") as stream:
+                    writer = csv.writer(stream)
+                    writer.writerow(header)
+                    writer.writerows(rows)
+
+            def reset():
+                shutil.copyfile(template_path, db_path)
+
+            def import_file(path):
+                preview = prepare_import_preview(path, db_path, "family")
+                assert preview["success"], preview["message"]
+                result = import_prepared_records(
+                    db_path, "family", preview["records"], preview["assessment_years"], preview["session"]
+                )
+                assert result["success"], result["message"]
+
+            elapsed = [
+                timed(lambda: import_file(paths[label]), repeat=args.repeat, setup=reset)
+                for label in ("xlsx", "utf-8", "gbk")
+            ]
+            print(f"{size:>10} {elapsed[0]:>8.0f}ms {elapsed[1]:>9.0f}ms {elapsed[2]:>7.0f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def export_table_legacy(db: Database, path: str, table_name: str) -> int:
+    """The pre-streaming export: full result into a DataFrame, cell-wise escaping, df.to_excel."""
+    import pandas as pd
+
+    from metadata.constants import TABLE_DATE_FIELDS, get_table_field_labels
+    from services.excel_export import escape_excel_formulas
+
+    data = ResultSet.concat(db.iter_search_personnel(table_name))
+    df = pd.DataFrame.from_records(data.rows, columns=list(data.columns))
+    for field_name in TABLE_DATE_FIELDS.get(table_name, []):
+        display_column = f"{field_name}_display"
+        if field_name in df.columns and display_column in df.columns:
+            display_values = df[display_column]
+            has_display_value = display_values.notna() & (display_values.astype(str) != "")
+            df.loc[has_display_value, field_name] = display_values[has_display_value]
+    field_labels = get_table_field_labels(table_name)
+    ordered_columns = [field_name for field_name in field_labels if field_name in df.columns]
+    df = df.loc[:, ordered_columns].rename(columns=field_labels)
+    escape_excel_formulas(df).to_excel(path, index=False)
+    return len(data)
+
+
+@benchmark("export", "Exporting family rows to xlsx: DataFrame plus to_excel versus streaming write-only export")
+def bench_export(args):
+    print(f"{'rows':>10} {'legacy':>10} {'legacy peak':>13} {'streaming':>11} {'streaming peak':>16}")
+
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, (size + 1) // 2, family_per_person=2)
+            path = os.path.join(work_dir, "family.xlsx")
+            db = Database(db_path)
+            try:
+                def legacy():
+                    return export_table_legacy(db, path, "family")
+
+                def streaming():
+                    return export_table_batches(db.iter_search_personnel("family"), path, "family")
+
+                assert legacy() == streaming()
+                legacy_ms = timed(legacy, repeat=args.repeat)
+                streaming_ms = timed(streaming, repeat=args.repeat)
+                legacy_mib = peak_mib(legacy)
+                streaming_mib = peak_mib(streaming)
+            finally:
+                db.close()
+            print(
+                f"{size:>10} {legacy_ms:>8.0f}ms {legacy_mib:>10.1f}MiB "
+                f"{streaming_ms:>9.0f}ms {streaming_mib:>13.1f}MiB"
+            )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("export_all", "Exporting every table: one export per table versus one multi-sheet job")
+def bench_export_all(args):
+    print(f"{'persons':>10} {'per table':>11} {'one job':>9} {'largest table':>15}")
+
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size, family_per_person=2)
+
+            def export_table(table_name):
+                # The per-menu flow: count query, fresh connection, full query, own workbook
+                db = Database(db_path)
+                try:
+                    if db.search_personnel(table_name=table_name, limit=1, offset=0)["total_count"]:
+                        path = os.path.join(work_dir, f"{table_name}.xlsx")
+                        export_table_batches(db.iter_search_personnel(table_name), path, table_name)
+                finally:
+                    db.close()
+
+            def per_table():
+                for table_name in TABLE_LABELS:
+                    export_table(table_name)
+
+            def one_job():
+                db = Database(db_path)
+                try:
+                    export_all_tables(db, os.path.join(work_dir, "all.xlsx"))
+                finally:
+                    db.close()
+
+            per_table_ms = timed(per_table, repeat=args.repeat)
+            one_job_ms = timed(one_job, repeat=args.repeat)
+            largest_ms = timed(lambda: export_table("family"), repeat=args.repeat)
+            print(f"{size:>10} {per_table_ms:>9.0f}ms {one_job_ms:>7.0f}ms {largest_ms:>13.0f}ms")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@benchmark("export_formats", "Full base_info extract streamed from the database: xlsx versus CSV, JSON Lines and Parquet")
+def bench_export_formats(args):
+    from services import excel_export
+
+    extensions = [".xlsx", ".csv", ".jsonl"] + ([".parquet"] if excel_export.pq is not None else [])
+    print(f"{'persons':>10}" + "".join(f"{extension:>11}" for extension in extensions))
+
+    for size in args.sizes:
+        work_dir = tempfile.mkdtemp(prefix="personnel_bench_")
+        try:
+            db_path = os.path.join(work_dir, "bench.db")
+            build_roster_database(db_path, size)
+            db = Database(db_path)
+            try:
+                elapsed = [
+                    timed(
+                        lambda extension=extension: export_table_batches(
+                            db.iter_search_personnel("base_info"),
+                            os.path.join(work_dir, f"base_info{extension}"),
+                            "base_info",
+                        ),
+                        repeat=args.repeat,
+                    )
+                    for extension in extensions
+                ]
+            finally:
+                db.close()
+            print(f"{size:>10}" + "".join(f"{value:>9.0f}ms" for value in elapsed))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+ESCAPE_COLUMNS = 35
+ESCAPE_TEXTS = [
+    *EDUCATION_TEXTS, *POSITION_TITLES[:8], *GRADE_OPTIONS[:8], "江苏南京", "1985.07", "", None,
+    # The odd cell a user typed that Excel would read as a formula
+    "=HYPERLINK(\"x\")", " -2", "@SUM(A1)", "+86 13800000000", "'=1+1",
+]
+
+
+def export_rows_legacy(rows, value_positions, overlays):
+    """The cell-wise export stage: per-row projection, display overlay and escaping."""
+    from operator import itemgetter
+
+    from services.excel_export import escape_excel_formula
+
+    pick = itemgetter(*value_positions)
+    result = []
+    for values in rows:
+        row = list(pick(values))
+        for index, display_position in overlays:
+            display_value = values[display_position]
+            if display_value is not None and str(display_value) != "":
+                row[index] = display_value
+        result.append([escape_excel_formula(value) for value in row])
+    return result
+
+
+@benchmark("escape", "Formula escaping and date display overlay on 35 text columns: per cell versus per column")
+def bench_escape(args):
+    import random
+
+    import pandas as pd
+
+    from services.excel_export import _export_rows, escape_excel_formula, escape_excel_formulas
+
+    print(f"{'rows':>10} {'cells':>10} {'rows cell-wise':>15} {'rows columnar':>14} {'df map':>9} {'df columnar':>12}")
+    value_positions = list(range(ESCAPE_COLUMNS))
+    # The first two columns are date fields with a *_display column after the exported ones
+    overlays = [(0, ESCAPE_COLUMNS), (1, ESCAPE_COLUMNS + 1)]
+    for size in args.sizes:
+        generator = random.Random(size)
+        rows = [
+            tuple(generator.choice(ESCAPE_TEXTS) for _ in range(ESCAPE_COLUMNS))
+            + (generator.choice(["1980.01", "", None]), generator.choice(["2001.09", None]))
+            for _ in range(size)
+        ]
+        if export_rows_legacy(rows, value_positions, overlays) != [
+            list(row) for row in _export_rows(rows, value_positions, overlays)
+        ]:
+            raise AssertionError("columnar export rows differ from the cell-wise rows")
+        df = pd.DataFrame.from_records(rows).iloc[:, :ESCAPE_COLUMNS]
+
+        cell_rows_ms = timed(lambda: export_rows_legacy(rows, value_positions, overlays), repeat=args.repeat)
+        columnar_rows_ms = timed(lambda: _export_rows(rows, value_positions, overlays), repeat=args.repeat)
+        df_map_ms = timed(
+            lambda: df.apply(lambda column: column.map(escape_excel_formula)), repeat=args.repeat
+        )
+        df_columnar_ms = timed(lambda: escape_excel_formulas(df), repeat=args.repeat)
+        print(
+            f"{size:>10} {size * ESCAPE_COLUMNS:>10} {cell_rows_ms:>13.0f}ms {columnar_rows_ms:>12.0f}ms"
+            f" {df_map_ms:>7.0f}ms {df_columnar_ms:>10.0f}ms"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run personnel system performance benchmarks.")
+    subparsers = parser.add_subparsers(dest="name", required=True)
+    for name, (_func, help_text) in BENCHMARKS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("--sizes", type=int, nargs="+", default=[1000, 20000, 200000])
+        subparser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+    BENCHMARKS[args.name][0](args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
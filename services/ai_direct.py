@@ -5,6 +5,7 @@ from typing import Any, Callable, Dict, List, Optional, Sequence
 
 import requests
 
+from core.result_set import json_default
 from services.ollama_manager import ollama_api_url
 
 
@@ -298,4 +299,4 @@ def _project_rows(rows: Sequence[dict], selected_fields: Sequence[str]) -> List[
 
 
 def _to_json(value) -> str:
-    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=json_default)
@@ -1,9 +1,21 @@
 """Excel export helpers."""
 
+import csv
+import json
 import logging
+import os
+import re
+from typing import Callable, Dict, Optional
 
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font
+from pandas.api.types import infer_dtype, is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
 
+from core.result_set import ResultSet
 from metadata.constants import (
     TABLE_DATE_FIELDS,
     TABLE_LABELS,
@@ -11,9 +23,20 @@ from metadata.constants import (
     validate_table_name,
 )
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 logger = logging.getLogger("ExcelExport")
 
 DANGEROUS_EXCEL_FORMULA_PREFIXES = ("=", "+", "-", "@")
+# A NUL separator followed by optional whitespace and a formula prefix; \s matches
+# exactly the characters str.lstrip() removes, and NUL is not one of them
+_FORMULA_CANDIDATE = re.compile(r"\x00\s*[=+\-@]")
+SHEET_TITLE_LIMIT = 31
+HEADER_FONT = Font(bold=True)
 
 
 def escape_excel_formula(value):
@@ -27,50 +50,362 @@ def escape_excel_formula(value):
     return value
 
 
+def _escaped_texts(texts: list) -> Dict[str, str]:
+    """Return {text: escaped text} for the distinct strings that need escaping."""
+    joined = "\x00" + "\x00".join(texts)
+    if joined.count("\x00") != len(texts):
+        # A NUL inside the text would shift the positions; check each value instead
+        return {text: escape_excel_formula(text) for text in texts if escape_excel_formula(text) is not text}
+    escaped = {}
+    index = previous = 0
+    for match in _FORMULA_CANDIDATE.finditer(joined):
+        index += joined.count("\x00", previous, match.start())
+        previous = match.start()
+        escaped[texts[index]] = escape_excel_formula(texts[index])
+    return escaped
+
+
+def escape_excel_formula_column(values) -> list:
+    """Return escape_excel_formula applied to every value of a column, as a list.
+
+    Each distinct string is checked once: the distinct values are joined with
+    NUL separators and one regex scan finds those starting with a formula
+    prefix. When none do, the column comes back as it is; otherwise the escaped
+    values are substituted with a dictionary lookup per value.
+    """
+    values = values.tolist() if isinstance(values, (np.ndarray, pd.Series)) else list(values)
+    try:
+        distinct = dict.fromkeys(values)
+    except TypeError:
+        # Unhashable values
+        return [escape_excel_formula(value) for value in values]
+    escaped = _escaped_texts([value for value in distinct if isinstance(value, str)])
+    if not escaped:
+        return values
+    # Only strings are keys, so numbers and None are never replaced
+    return list(map(escaped.get, values, values))
+
+
 def escape_excel_formulas(df: pd.DataFrame) -> pd.DataFrame:
     """Escape formula-like strings before writing an Excel workbook."""
-    return df.apply(lambda column: column.map(escape_excel_formula))
+    def escape_column(column: pd.Series) -> pd.Series:
+        if column.dtype == object:
+            return pd.Series(escape_excel_formula_column(column), index=column.index, dtype=object)
+        if is_numeric_dtype(column) or is_bool_dtype(column) or is_datetime64_any_dtype(column):
+            return column
+        return column.map(escape_excel_formula)
 
+    return df.apply(escape_column)
 
-def export_table_data(data, file_path: str, table_name: str, assessment_years=None) -> int:
-    """Export table data to an Excel file and return exported row count."""
-    validate_table_name(table_name)
-    if not data:
-        raise ValueError("没有可导出的数据")
 
-    df = pd.DataFrame(data)
-    for field_name in TABLE_DATE_FIELDS.get(table_name, []):
-        display_column = f"{field_name}_display"
-        if field_name in df.columns and display_column in df.columns:
-            display_values = df[display_column]
-            has_display_value = display_values.notna() & (display_values.astype(str) != "")
-            df.loc[has_display_value, field_name] = display_values[has_display_value]
-
-    internal_columns = [
-        column
-        for column in df.columns
-        if column in {"id", "person_id"} or column.endswith("_display")
-    ]
-    if internal_columns:
-        df = df.drop(columns=internal_columns)
+def _export_layout(columns, table_name: str, assessment_years=None) -> tuple:
+    """Return (header labels, value positions, display overlays) for a batch header.
 
+    Internal columns (id, person_id, *_display) and unknown fields are dropped;
+    date fields take their *_display value when it is set.
+    """
+    positions = {column: index for index, column in enumerate(columns)}
     field_labels = get_table_field_labels(table_name, assessment_years)
-    ordered_columns = [
-        field_name
-        for field_name in field_labels
-        if field_name in df.columns
+    exported = [field_name for field_name in field_labels if field_name in positions]
+    date_fields = set(TABLE_DATE_FIELDS.get(table_name, []))
+    overlays = [
+        (index, positions[f"{field_name}_display"])
+        for index, field_name in enumerate(exported)
+        if field_name in date_fields and f"{field_name}_display" in positions
     ]
-    df = df.loc[:, ordered_columns].rename(
-        columns={
-            field_name: field_labels[field_name]
-            for field_name in ordered_columns
-        }
+    return (
+        [field_labels[field_name] for field_name in exported],
+        [positions[field_name] for field_name in exported],
+        overlays,
     )
-    df = escape_excel_formulas(df)
 
-    df.to_excel(file_path, index=False)
 
-    row_count = len(data)
+def _object_array(values) -> np.ndarray:
+    # np.empty plus slice assignment always gives a 1-D array, whatever the values are
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _overlay_column(values, displays) -> list:
+    """Return values with every display value that is set (not None or "") laid over them."""
+    displays = list(displays)
+    if displays.count(None) == len(displays):
+        return list(values)
+    if infer_dtype(displays, skipna=True) not in ("string", "empty"):
+        return [
+            display if display is not None and str(display) != "" else value
+            for value, display in zip(values, displays)
+        ]
+    # For text, None and NaN the truth value is exactly "not None and str() != ''"
+    displays = _object_array(displays)
+    merged = _object_array(values)
+    shown = displays.astype(bool)
+    merged[shown] = displays[shown]
+    return merged.tolist()
+
+
+def _export_rows(rows, value_positions, overlays, escape_formulas: bool = True) -> list:
+    # Work column by column: transposing with zip(*rows) is one C-level pass, and
+    # the overlay and escaping then scan whole columns instead of single cells
+    columns = list(zip(*rows))
+    exported = [columns[position] for position in value_positions]
+    for index, display_position in overlays:
+        exported[index] = _overlay_column(exported[index], columns[display_position])
+    if escape_formulas:
+        exported = [escape_excel_formula_column(column) for column in exported]
+    return list(zip(*exported))
+
+
+def _iter_export_batches(batches, table_name: str, assessment_years=None, escape_formulas: bool = True):
+    """Yield (header labels, rows) for each non-empty batch, rows as tuples in header order.
+
+    The layout is taken from the first non-empty batch; later batches with other
+    columns are projected onto it.
+    """
+    columns = None
+    for batch in batches:
+        batch = ResultSet.coerce(batch)
+        if not batch:
+            continue
+        if columns is None:
+            columns = batch.columns
+            headers, value_positions, overlays = _export_layout(columns, table_name, assessment_years)
+        elif batch.columns != columns:
+            batch = batch.project(columns)
+        yield headers, _export_rows(batch.rows, value_positions, overlays, escape_formulas)
+
+
+def _strip_illegal_characters(rows) -> list:
+    """Drop the control characters that openpyxl refuses to write; most batches have none."""
+    texts = [value for row in rows for value in row if isinstance(value, str)]
+    if not ILLEGAL_CHARACTERS_RE.search("\n".join(texts)):
+        return rows
+    return [
+        tuple(ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value for value in row)
+        for row in rows
+    ]
+
+
+def _add_sheet(workbook: Workbook, title: str):
+    return workbook.create_sheet(title[:SHEET_TITLE_LIMIT])
+
+
+def _append_header(sheet, headers):
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = HEADER_FONT
+        cells.append(cell)
+    sheet.append(cells)
+
+
+def _write_table_sheet(sheet, batches, table_name: str, assessment_years=None, on_batch=None) -> int:
+    """Write row batches to one write-only sheet and return the row count.
+
+    The header comes from the first non-empty batch; a table without rows gets
+    the full label header. on_batch(rows_written) is called after each batch.
+    """
+    headers = None
+    row_count = 0
+    for batch_headers, rows in _iter_export_batches(batches, table_name, assessment_years):
+        if headers is None:
+            headers = batch_headers
+            _append_header(sheet, headers)
+        for row in _strip_illegal_characters(rows):
+            sheet.append(row)
+        row_count += len(rows)
+        if on_batch is not None:
+            on_batch(row_count)
+    if headers is None:
+        _append_header(sheet, get_table_field_labels(table_name, assessment_years).values())
+    return row_count
+
+
+def _write_csv(export_batches, file_path: str) -> int:
+    # UTF-8 with BOM so that Excel opens the file without garbling Chinese text
+    row_count = 0
+    with open(file_path, "w", encoding="utf-8-sig", newline="") as stream:
+        writer = csv.writer(stream)
+        for headers, rows in export_batches:
+            if not row_count:
+                writer.writerow(headers)
+            writer.writerows(rows)
+            row_count += len(rows)
+    return row_count
+
+
+def _write_json_lines(export_batches, file_path: str) -> int:
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    row_count = 0
+    with open(file_path, "w", encoding="utf-8", newline="\n") as stream:
+        for headers, rows in export_batches:
+            stream.write("".join(f"{encode(dict(zip(headers, row)))}\n" for row in rows))
+            row_count += len(rows)
+    return row_count
+
+
+def _write_parquet(export_batches, file_path: str) -> int:
+    # Every column is written as text, matching what the CSV and xlsx exports hold
+    writer = None
+    row_count = 0
+    try:
+        for headers, rows in export_batches:
+            if writer is None:
+                schema = pa.schema([(header, pa.string()) for header in headers])
+                writer = pq.ParquetWriter(file_path, schema)
+            columns = [
+                pa.array([None if value is None else str(value) for value in column], pa.string())
+                for column in zip(*rows)
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            row_count += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return row_count
+
+
+# extension -> (writer, escape formula-like text); anything else is written as xlsx
+FLAT_EXPORT_WRITERS = {
+    ".csv": (_write_csv, True),
+    ".jsonl": (_write_json_lines, False),
+    ".parquet": (_write_parquet, False),
+}
+EXPORT_FILE_EXTENSIONS = (".xlsx", *FLAT_EXPORT_WRITERS)
+
+
+def export_table_batches(batches, file_path: str, table_name: str, assessment_years=None) -> int:
+    """Stream row batches into an export file and return the exported row count.
+
+    batches is any iterable of ResultSets or sequences of mappings, such as
+    Database.iter_search_personnel(); only one batch is held at a time. The
+    format follows the file extension: .csv (UTF-8 with BOM), .jsonl, .parquet
+    (requires pyarrow) or otherwise xlsx. Every format uses the same columns
+    and headers as the xlsx export; formula-like text is escaped for xlsx and
+    CSV only, since the other formats are not opened in Excel.
+    """
+    validate_table_name(table_name)
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext in FLAT_EXPORT_WRITERS:
+        if file_ext == ".parquet" and pq is None:
+            raise ImportError("缺少pyarrow依赖，无法导出.parquet文件，请安装pyarrow或使用.csv/.jsonl格式")
+        write, escape_formulas = FLAT_EXPORT_WRITERS[file_ext]
+        try:
+            row_count = write(
+                _iter_export_batches(batches, table_name, assessment_years, escape_formulas), file_path
+            )
+            if not row_count:
+                raise ValueError("没有可导出的数据")
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+    else:
+        # openpyxl's write-only mode streams rows to a temporary file and writes
+        # strings inline, so memory does not grow with the row count
+        workbook = Workbook(write_only=True)
+        sheet = _add_sheet(workbook, TABLE_LABELS.get(table_name, table_name))
+        row_count = _write_table_sheet(sheet, batches, table_name, assessment_years)
+        if not row_count:
+            raise ValueError("没有可导出的数据")
+        workbook.save(file_path)
+
     table_label = TABLE_LABELS.get(table_name, table_name)
     logger.info(f"成功导出{table_label} {row_count}条记录到: {file_path}")
     return row_count
+
+
+def export_all_tables(
+    db,
+    file_path: str,
+    tables=None,
+    report_progress: Optional[Callable[[dict], None]] = None,
+    changed_since: Optional[Dict[str, int]] = None,
+    **conditions,
+) -> Dict[str, int]:
+    """Export every table matching the search conditions into one workbook, one sheet per table.
+
+    All tables are read inside one read transaction, so the sheets come from the
+    same snapshot even if an import commits meanwhile. changed_since maps table
+    names to change versions; a table listed there only exports rows added or
+    modified after its version. report_progress receives {"table", "index",
+    "total", "rows"} after each batch. Returns row counts by table name; raises
+    ValueError when no table has matching rows.
+    """
+    tables = [table_name for table_name in TABLE_LABELS if tables is None or table_name in tables]
+    counts = {}
+    workbook = Workbook(write_only=True)
+    with db.read_snapshot():
+        assessment_years = db.get_assessment_years()
+        for index, table_name in enumerate(tables, start=1):
+            def on_batch(rows, table_name=table_name, index=index):
+                if report_progress is not None:
+                    report_progress({"table": table_name, "index": index, "total": len(tables), "rows": rows})
+
+            on_batch(0)
+            sheet = _add_sheet(workbook, TABLE_LABELS[table_name])
+            counts[table_name] = _write_table_sheet(
+                sheet,
+                db.iter_search_personnel(
+                    table_name=table_name,
+                    changed_since=(changed_since or {}).get(table_name),
+                    **conditions,
+                ),
+                table_name,
+                assessment_years,
+                on_batch,
+            )
+        if not any(counts.values()):
+            raise ValueError("没有可导出的数据")
+    workbook.save(file_path)
+
+    logger.info(f"成功导出全部表到: {file_path}，" + "，".join(
+        f"{TABLE_LABELS[table_name]} {count}条" for table_name, count in counts.items()
+    ))
+    return counts
+
+
+def export_changed_tables(
+    db,
+    file_path: str,
+    tables=None,
+    report_progress: Optional[Callable[[dict], None]] = None,
+) -> Dict[str, int]:
+    """Export only the rows added or modified since the last delta export, one sheet per table.
+
+    Every table keeps its own starting version, so a user who may only export
+    some tables does not move the starting point of the others. The change
+    version is read in the same snapshot as the rows and recorded for the
+    exported tables once the workbook is written. Deleted rows are not part of
+    the workbook; see Database.changes_since for them. Raises ValueError when
+    none of the given tables changed since its own starting version, or when
+    the only changes are deletions; in that case the starting versions still
+    move forward.
+    """
+    tables = [table_name for table_name in TABLE_LABELS if tables is None or table_name in tables]
+    since = {table_name: db.get_delta_export_version(table_name) for table_name in tables}
+    with db.read_snapshot():
+        version = db.get_change_version()
+        # 按各表自己的起点判断，其他表（包括无权导出的表）的变化不算
+        if all(db.get_table_change_version(table_name) <= table_since for table_name, table_since in since.items()):
+            raise ValueError("自上次增量导出以来数据没有变化")
+        # 只有删除时没有可写入的行；仍推进起点，否则之后的增量导出会一直失败
+        deletes_only = all(
+            db.get_table_change_version(table_name, include_deletes=False) <= table_since
+            for table_name, table_since in since.items()
+        )
+        if not deletes_only:
+            counts = export_all_tables(db, file_path, tables, report_progress, changed_since=since)
+    db.set_delta_export_version(tables, version)
+    if deletes_only:
+        raise ValueError("自上次增量导出以来只有记录被删除，没有新增或修改的数据可导出")
+    return counts
+
+
+def export_table_data(data, file_path: str, table_name: str, assessment_years=None) -> int:
+    """Export table data to an Excel file and return exported row count."""
+    validate_table_name(table_name)
+    if not data:
+        raise ValueError("没有可导出的数据")
+    return export_table_batches([data], file_path, table_name, assessment_years)
@@ -1,20 +1,28 @@
+import hashlib
+import numpy as np
 import pandas as pd
 import logging
 import re
 import os  # 添加os模块导入
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Any
-from openpyxl import load_workbook
-try:
-    import xlrd
-except ImportError:
-    xlrd = None
+from typing import Callable, List, Dict, Any, Optional
 
 from core.database import Database, RELATED_TABLES
 from metadata.constants import TABLE_LABELS
+from services.excel_reader import ExcelSheetReader, ExcelWorkbook, MergedCellsError
+from services.flat_file_reader import CSV_EXTENSIONS, PARQUET_EXTENSIONS, open_flat_file_reader
+from services.import_validation import ImportValidationReport
 
 logger = logging.getLogger('ExcelImport')
 
+MERGED_CELL_TABLES = ('rewards', 'family')
+ASSESSMENT_COLUMN_PATTERN = re.compile(r'(\d{4})年年度考核结果')
+# 提交时每批写入的行数；每批一个 SAVEPOINT，释放时提交，批与批之间不持有写锁
+IMPORT_CHUNK_SIZE = 2000
+IMPORT_FILE_EXTENSIONS = ('.xlsx', '.xls') + CSV_EXTENSIONS + PARQUET_EXTENSIONS
+
 
 def clean_column_name(name: str) -> str:
     """清理Excel列名，处理空格和换行符，保留特殊符号"""
@@ -54,146 +62,351 @@ def convert_excel_date(val: Any) -> str:
     return str(val)
 
 
+class ImportCancelled(Exception):
+    """用户取消了导入；written 为取消前已提交的行数。"""
+
+    def __init__(self, written: int = 0):
+        super().__init__("导入已取消")
+        self.written = written
+
+
+class ImportWriteError(Exception):
+    """按批写入时出错；written 为出错前已提交的行数，这些行不会随出错批次回滚。"""
+
+    def __init__(self, written: int, error: Exception):
+        super().__init__(str(error))
+        self.written = written
+        self.error = error
+
+
+class ImportProgress:
+    """累计解析、校验、写入的行数，并通过回调报告进度和速度。
+
+    report 接收一个字典：stage、parsed、validated、written、total、rows_per_sec；
+    is_cancelled 返回真时，导入流程在下一个批次边界停止。
+    """
+
+    def __init__(self, report: Optional[Callable[[dict], None]] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None):
+        self.report = report
+        self.is_cancelled = is_cancelled
+        self.counts = {"parsed": 0, "validated": 0, "written": 0}
+        self.total = None
+        self._stage_started = {}
+
+    def check_cancelled(self, written: int = 0):
+        if self.is_cancelled is not None and self.is_cancelled():
+            raise ImportCancelled(written)
+
+    def advance(self, stage: str, count: int):
+        now = time.perf_counter()
+        started = self._stage_started.setdefault(stage, now)
+        self.counts[stage] += count
+        if self.report is None:
+            return
+        elapsed = now - started
+        self.report({
+            "stage": stage,
+            **self.counts,
+            "total": self.total,
+            "rows_per_sec": self.counts[stage] / elapsed if elapsed > 0 else None,
+        })
+
+    def start(self, stage: str, total: Optional[int] = None):
+        """开始新阶段：记录总行数并从此刻计算速度。
+
+        同一阶段只有第一次 start 生效，整本工作簿导入可先按所有工作表的总行数开始。
+        """
+        if stage in self._stage_started:
+            return
+        self.total = total
+        self._stage_started[stage] = time.perf_counter()
+
+
+@dataclass
+class ImportSession:
+    """预览阶段得到的导入结果，提交时直接写入，不再重新规范化、关联人员和判重。
+
+    person_ids：base_info 为每行匹配到的已有人员 id（None 表示新增），明细表为每行关联到的人员 id；
+    content_hashes：base_info 为行指纹，明细表为内容哈希；
+    keep 为 False 的行不写入：base_info 中是指纹未变化的人员，明细表中是重复明细或无法写入的行。
+    snapshot 为预览时的数据库快照，提交前若数据库已变化则退回完整导入流程；
+    file_hash 为导入文件的内容哈希，导入成功后记录，用于跳过未修改的文件。
+    """
+
+    table_name: str
+    rows: List[Dict[str, Any]]
+    assessment_years: List[int] = field(default_factory=list)
+    person_ids: List[Optional[int]] = field(default_factory=list)
+    content_hashes: List[Optional[str]] = field(default_factory=list)
+    keep: List[bool] = field(default_factory=list)
+    snapshot: Optional[int] = None
+    file_hash: Optional[str] = None
+
+    @property
+    def skipped_count(self) -> int:
+        return sum(1 for person_id, keep in zip(self.person_ids, self.keep) if person_id is not None and not keep)
+
+    def diff(self) -> Dict[str, int]:
+        """按新增、已变化、未变化统计各行；明细表没有“已变化”，重复明细计为未变化。"""
+        counts = {"new": 0, "changed": 0, "unchanged": 0}
+        for person_id, keep in zip(self.person_ids, self.keep):
+            if not keep:
+                if person_id is not None:
+                    counts["unchanged"] += 1
+            elif person_id is None or self.table_name in RELATED_TABLES:
+                counts["new"] += 1
+            else:
+                counts["changed"] += 1
+        return counts
+
+
+def file_content_hash(file_path: str) -> str:
+    """分块计算文件内容的 SHA-256，用于判断文件是否与上次成功导入的相同。"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _map_distinct(values: np.ndarray, func) -> np.ndarray:
+    """对每个不同的值只调用一次 func，再逐个查表展开回整列，空值按 None 计算。
+
+    用字典去重而不是 pd.factorize：factorize 会在 NUL 字符处截断对象数组中的字符串，
+    把不同的单元格文本当作同一个值。
+    """
+    values = np.asarray(values, dtype=object)
+    blank = pd.isna(values)
+    if blank.any():
+        values = values.copy()
+        values[blank] = None
+    values = values.tolist()
+    mapped = {value: func(value) for value in dict.fromkeys(values)}
+    result = np.empty(len(values), dtype=object)
+    result[:] = [mapped[value] for value in values]
+    return result
+
+
+class ImportColumnPlan:
+    """按列转换导入数据。
+
+    表头到字段的映射、年度考核列映射和每列的处理方式在构造时只解析一次；
+    convert() 对每批数据逐列处理，日期、序号等按不同值计算后整列展开，
+    最后才组装为记录字典。结果与逐行调用 Database._normalize_import_rows 一致。
+    """
+
+    def __init__(self, db: Database, table_name: str, columns: List[str], year_to_index: Dict[int, str] = None):
+        self.table_name = table_name
+        valid_columns, date_fields, business_columns = db._import_field_rules(table_name)
+        year_to_index = year_to_index or {}
+
+        positions = {}
+        for position, col_name in enumerate(columns):
+            match = ASSESSMENT_COLUMN_PATTERN.search(col_name)
+            if match and int(match.group(1)) in year_to_index:
+                col_name = year_to_index[int(match.group(1))]
+            field_name = db.normalize_column_name(col_name)
+            if field_name in valid_columns:
+                # 同名列以最后一列为准，字段顺序保持首次出现的位置
+                positions[field_name] = position
+        self.fields = [
+            (field_name, position, self._field_kind(field_name, date_fields))
+            for field_name, position in positions.items()
+        ]
+        self.display_columns = {
+            field_name: Database._date_display_column(field_name)
+            for field_name, _position, kind in self.fields
+            if kind == "date"
+            and Database._date_display_column(field_name) in valid_columns
+            and Database._date_display_column(field_name) not in positions
+        }
+        self.business_columns = [column for column in business_columns if column in positions]
+        logger.debug(f"导入列映射: {[(field_name, columns[position]) for field_name, position, _ in self.fields]}")
+
+    @staticmethod
+    def _field_kind(field_name: str, date_fields) -> str:
+        if field_name == "sequence":
+            return "sequence"
+        if field_name in date_fields:
+            return "date"
+        return "value"
+
+    def convert(self, columns: List[np.ndarray], row_offset: int = 0) -> List[Dict[str, Any]]:
+        """把一批按列排列的数据（字符串或 None）转换为规范化记录；row_offset 用于错误提示中的行号。"""
+        if not columns or not len(columns[0]) or not self.fields:
+            return []
+        output, invalid, keep = self._convert_columns(columns)
+        first = None
+        for field_name, (_position, bad, values) in invalid.items():
+            index = int(bad.argmax())
+            if first is None or index < first[0]:
+                first = (index, field_name, values[index])
+        if first is not None:
+            index, field_name, value = first
+            raise ValueError(Database._invalid_date_message(self.table_name, row_offset + index + 1, field_name, value))
+        return self._records(output, keep)
+
+    def validate(self, columns: List[np.ndarray], row_numbers: np.ndarray, report: ImportValidationReport):
+        """与 convert 相同，但不在第一个无效日期处停止：所有无效日期按工作表坐标记入 report。
+
+        无效日期在记录中为 None；返回转换后的记录，并把每条记录的行号追加到 report.record_rows。
+        """
+        if not columns or not len(columns[0]) or not self.fields:
+            return []
+        output, invalid, keep = self._convert_columns(columns)
+        for field_name, (position, bad, values) in invalid.items():
+            label = Database._field_label(self.table_name, field_name)
+            for index in np.flatnonzero(bad).tolist():
+                report.add("date", f"“{label}”格式无效，当前值为“{values[index]}”", int(row_numbers[index]), position)
+        report.record_rows.extend((row_numbers if keep is None else row_numbers[keep]).tolist())
+        return self._records(output, keep)
+
+    def _convert_columns(self, columns: List[np.ndarray]) -> tuple:
+        """逐列转换，返回 (字段到整列值的映射, 各日期字段的 (列位置, 无效掩码, 原值), 保留行掩码)。
+
+        保留行掩码只用于明细表（至少一个业务列非空的行），人员基本信息为 None。
+        """
+        output = {}
+        invalid = {}
+        for field_name, position, kind in self.fields:
+            values = columns[position]
+            values = np.where(pd.isna(values), '', values)
+            if kind == "sequence":
+                output[field_name] = _map_distinct(values, Database._sequence_value_for_storage)
+            elif kind == "date":
+                normalized = _map_distinct(values, Database._normalize_month_value)
+                bad = pd.isna(normalized) & ~_map_distinct(values, Database._is_blank_import_value).astype(bool)
+                if bad.any():
+                    invalid[field_name] = (position, bad, values)
+                output[field_name] = normalized
+                if field_name in self.display_columns:
+                    output[self.display_columns[field_name]] = _map_distinct(values, Database._date_display_value)
+            else:
+                output[field_name] = values
+        if self.table_name not in RELATED_TABLES:
+            return output, invalid, None
+
+        # 明细表只保留至少一个业务列非空的行
+        keep = np.zeros(len(columns[0]), dtype=bool)
+        for column in self.business_columns:
+            keep |= ~_map_distinct(output[column], Database._is_blank_import_value).astype(bool)
+        return output, invalid, keep
+
+    @staticmethod
+    def _records(output: Dict[str, np.ndarray], keep: Optional[np.ndarray]) -> List[Dict[str, Any]]:
+        fields = list(output)
+        records = (dict(zip(fields, values)) for values in zip(*output.values()))
+        if keep is None:
+            return list(records)
+        return [record for record, kept in zip(records, keep) if kept]
+
+    @property
+    def key_positions(self) -> List[int]:
+        """序号、姓名所在的列位置。"""
+        return [position for field_name, position, _kind in self.fields if field_name in ("sequence", "name")]
+
+
+def _check_import_file(file_path: str) -> Optional[str]:
+    """检查导入文件是否存在、格式是否支持且可读取，返回错误信息或 None。"""
+    # 检查文件是否存在
+    if not os.path.exists(file_path):
+        return f"文件不存在: {file_path}"
+
+    # 检查文件格式
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext not in IMPORT_FILE_EXTENSIONS:
+        return f"不支持的文件格式: {file_ext}，请使用.xlsx、.xls、.csv或.parquet格式"
+
+    # 尝试打开文件
+    try:
+        with open(file_path, 'rb') as test_file:
+            test_file.read(100)  # 读取文件头部验证文件可访问性
+    except IOError as e:
+        return f"无法打开文件: {str(e)}"
+    return None
+
+
+def _merged_cells_message(file_path: str, merge_error: Exception) -> str:
+    file_ext = os.path.splitext(file_path)[1].lower()
+    logger.error(f"处理{file_ext}合并单元格时出错: {str(merge_error)}", exc_info=True)
+    return (
+        f"无法读取合并单元格信息，导入已终止。\n"
+        f"原因: {str(merge_error)}\n"
+        f"请关闭正在打开此文件的程序后重试。"
+    )
+
+
 def _prepare_import_records_with_metadata(
         file_path: str,
         db: Database,
         table_name: str,
-        persist_assessment_years: bool = False
+        persist_assessment_years: bool = False,
+        progress: Optional[ImportProgress] = None,
+        report: Optional[ImportValidationReport] = None
 ) -> tuple:
-    """读取并转换 Excel 记录，必要时保存年度考核配置。"""
+    """读取并转换 Excel 第一个工作表或 CSV/Parquet 文件的记录，必要时保存年度考核配置。
+
+    progress 按批报告已解析和已校验的行数；用户取消时抛出 ImportCancelled。
+    传入 report 时收集全部问题，见 _read_sheet_records。
+    """
     if table_name not in TABLE_LABELS:
         return False, f"无效的表名: {table_name}", [], []
 
     try:
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            return False, f"文件不存在: {file_path}", [], []
-
-        # 检查文件格式
-        file_ext = os.path.splitext(file_path)[1].lower()
-        if file_ext not in ['.xlsx', '.xls']:
-            return False, f"不支持的文件格式: {file_ext}，请使用.xlsx或.xls格式", [], []
+        file_error = _check_import_file(file_path)
+        if file_error:
+            return False, file_error, [], []
 
-        # 尝试打开文件
+        # 单次流式读取第一个工作表；奖惩信息和家庭成员信息表在读取时填充合并单元格。
+        # CSV 和 Parquet 没有合并单元格，直接分块读取
+        fill_merged = table_name in MERGED_CELL_TABLES
         try:
-            with open(file_path, 'rb') as test_file:
-                test_file.read(100)  # 读取文件头部验证文件可访问性
-        except IOError as e:
-            return False, f"无法打开文件: {str(e)}", [], []
-
-        # 读取Excel文件（只读取第一个工作表）
-        df = pd.read_excel(file_path, sheet_name=0, dtype=str)
-        if df.empty:
-            return False, "Excel文件为空或未包含数据", [], []
-
-        # 特殊处理：对奖惩信息和家庭成员信息表处理合并单元格
-        if table_name in ['rewards', 'family']:
-            logger.info(f"开始处理 {TABLE_LABELS[table_name]} 表的合并单元格...")
-
-            if file_ext == '.xlsx':
-                # 处理.xlsx格式文件
-                try:
-                    # 使用openpyxl获取合并单元格信息
-                    wb = load_workbook(file_path, data_only=True)  # 添加data_only=True
-                    sheet = wb.active
-                    merged_ranges = list(sheet.merged_cells.ranges)  # 转换为列表避免修改时的异常
-
-                    logger.info(f"找到 {len(merged_ranges)} 个合并单元格")
-
-                    # 填充合并单元格的值
-                    for merged_range in merged_ranges:
-                        min_row, min_col, max_row, max_col = (
-                            merged_range.min_row,
-                            merged_range.min_col,
-                            merged_range.max_row,
-                            merged_range.max_col
-                        )
+            reader = open_flat_file_reader(file_path)
+            if reader is None:
+                if fill_merged:
+                    logger.info(f"开始处理 {TABLE_LABELS[table_name]} 表的合并单元格...")
+                reader = ExcelSheetReader(file_path, fill_merged=fill_merged)
+        except MergedCellsError as merge_error:
+            return False, _merged_cells_message(file_path, merge_error), [], []
+        except ImportError as e:
+            return False, str(e), [], []
+
+        return _read_sheet_records(reader, db, table_name, persist_assessment_years, progress, report)
+
+    except ImportCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"导入{table_name}失败: {e}", exc_info=True)
+        return False, f"导入{TABLE_LABELS[table_name]}失败: {e}", [], []
 
-                        # 跳过标题行（第一行）
-                        if min_row == 1:
-                            continue
-
-                        # 获取合并区域的左上角单元格值
-                        value = sheet.cell(row=min_row, column=min_col).value
-
-                        # 填充到合并区域的所有单元格
-                        for r in range(min_row, max_row + 1):
-                            for c in range(min_col, max_col + 1):
-                                # 转换Excel索引到DataFrame索引
-                                df_row = r - 2  # 行索引：标题行占1行，所以减2
-                                df_col = c - 1  # 列索引：0-based
-
-                                if df_row >= 0 and df_row < len(df) and df_col < len(df.columns):
-                                    # 直接赋值，不再检查列名
-                                    df.iat[df_row, df_col] = str(value) if value is not None else ""
-
-                    logger.info(f"成功处理 {len(merged_ranges)} 个合并单元格（.xlsx格式）")
-                except Exception as merge_error:
-                    logger.error(f"处理.xlsx合并单元格时出错: {str(merge_error)}", exc_info=True)
-                    return False, (
-                        f"无法读取合并单元格信息，导入已终止。\n"
-                        f"原因: {str(merge_error)}\n"
-                        f"请关闭正在打开此文件的程序后重试。"
-                    ), [], []
-
-            elif file_ext == '.xls':
-                if xlrd is None:
-                    return False, "缺少xlrd依赖，无法处理.xls文件，请安装xlrd或使用.xlsx格式", [], []
-
-                # 处理.xls格式文件
-                try:
-                    # 使用xlrd打开文件
-                    book = xlrd.open_workbook(file_path)
-                    sheet = book.sheet_by_index(0)
-
-                    # 获取合并单元格信息
-                    merged_cells = sheet.merged_cells
-
-                    logger.info(f"找到 {len(merged_cells)} 个合并单元格")
-
-                    # 填充合并单元格的值
-                    for (min_row, max_row, min_col, max_col) in merged_cells:
-                        # 跳过标题行（第一行）
-                        if min_row == 0:
-                            continue
-
-                        # 获取合并区域的左上角单元格值
-                        value = sheet.cell_value(min_row, min_col)
-
-                        # 填充到合并区域的所有单元格
-                        for r in range(min_row, max_row):
-                            for c in range(min_col, max_col):
-                                # 转换索引（xlrd的行列索引都是0-based）
-                                if r >= 1:  # 跳过标题行
-                                    df_row = r - 1  # 标题行占1行，所以减1
-                                    df_col = c
-                                    if df_row < len(df) and df_col < len(df.columns):
-                                        # 直接赋值，不再检查列名
-                                        df.iat[df_row, df_col] = str(value) if value is not None else ""
-
-                    logger.info(f"成功处理 {len(merged_cells)} 个合并单元格（.xls格式）")
-                except Exception as merge_error:
-                    logger.error(f"处理.xls合并单元格时出错: {str(merge_error)}", exc_info=True)
-                    return False, (
-                        f"无法读取合并单元格信息，导入已终止。\n"
-                        f"原因: {str(merge_error)}\n"
-                        f"请关闭正在打开此文件的程序后重试。"
-                    ), [], []
 
+def _read_sheet_records(
+        reader: ExcelSheetReader,
+        db: Database,
+        table_name: str,
+        persist_assessment_years: bool = False,
+        progress: Optional[ImportProgress] = None,
+        report: Optional[ImportValidationReport] = None
+) -> tuple:
+    """从已打开的工作表读取并转换记录，返回 (是否成功, 信息, 记录, 年度考核年份)。
 
+    传入 report 时不在第一个问题处停止：无效日期和年度考核字段问题按工作表坐标
+    记入 report 并继续读取，导出错误清单时由 report 重新读取该工作表，由调用方检查 report。
+    """
+    progress = progress or ImportProgress()
+    with reader:
         # 清理列名
-        df.columns = [clean_column_name(c) for c in df.columns]
+        columns = [clean_column_name(c) for c in reader.columns]
+        if not columns:
+            return False, "Excel文件为空或未包含数据", [], []
 
         # 记录处理后的列名
-        logger.info(f"处理后的列名: {list(df.columns)}")
-
-        # 删除全空行
-        df = df.dropna(how='all')
-        if df.empty:
-            return False, "删除空行后数据为空", [], []
-
-        # 记录导入后的数据样本
-        logger.debug(f"导入后数据样本: \n{df.head(5).to_string()}")
+        logger.info(f"处理后的列名: {list(columns)}")
+        if report is not None:
+            report.columns = list(reader.columns)
+            report.header_row = reader.header_row
+            report.source = reader.reopen
 
         # ==== 新增：处理base_info表的年度考核字段 ====
         year_to_index = {}  # 年份到通用标记的映射
@@ -201,79 +414,189 @@ def _prepare_import_records_with_metadata(
 
         if table_name == 'base_info':
             # 1. 识别年度考核字段
-            for col in df.columns:
-                match = re.search(r'(\d{4})年年度考核结果', col)
+            assessment_positions = []
+            for position, col in enumerate(columns):
+                match = ASSESSMENT_COLUMN_PATTERN.search(col)
                 if match:
                     year = int(match.group(1))
                     assessment_years.append(year)
+                    assessment_positions.append(position)
 
-            # 2. 验证是否为连续五年
+            # 2. 验证是否为连续五年，3. 检查年份配置是否已存在
             if assessment_years:
                 assessment_years.sort()
-                if len(assessment_years) != 5:
-                    return False, "必须包含连续的五个年度考核字段", [], assessment_years
-
-                for i in range(1, 5):
-                    if assessment_years[i] - assessment_years[i - 1] != 1:
-                        return False, "年度考核字段必须为连续五年", [], assessment_years
-
-                # 3. 检查年份配置是否已存在
                 existing_years = db.get_assessment_years()
-                if persist_assessment_years and existing_years and existing_years != assessment_years:
-                    return False, f"年度考核区间不匹配（已配置: {existing_years}，当前: {assessment_years}），请先清空数据库", [], assessment_years
+                error_message = _assessment_years_error(
+                    assessment_years,
+                    existing_years if persist_assessment_years or report is not None else None,
+                )
+                if error_message and report is None:
+                    return False, error_message, [], assessment_years
+                if error_message:
+                    for position in assessment_positions:
+                        report.add("assessment", error_message, reader.header_row, position)
+                else:
+                    # 4. 存储年份配置
+                    if persist_assessment_years and not existing_years:
+                        if not db.set_assessment_years(assessment_years):
+                            return False, "保存年度考核配置失败", [], assessment_years
+
+                    # 5. 创建年份到通用标记的映射
+                    year_to_index = {year: f"assessment_{idx}" for idx, year in enumerate(assessment_years)}
+
+        # 列映射只解析一次，之后逐批按列转换，不在内存中保留整张工作表
+        plan = ImportColumnPlan(db, table_name, columns, year_to_index)
+        if report is not None:
+            report.key_columns = plan.key_positions
+        records: List[Dict[str, Any]] = []
+        row_count = 0
+        progress.start("parsed", reader.row_estimate)
+        for row_numbers, batch in reader.iter_numbered_batches():
+            progress.check_cancelled()
+            batch_size = len(batch[0])
+            progress.advance("parsed", batch_size)
+            if report is None:
+                records.extend(plan.convert(batch, row_offset=row_count))
+            else:
+                records.extend(plan.validate(batch, row_numbers, report))
+            row_count += batch_size
+            progress.advance("validated", batch_size)
+
+        if not reader.rows_read:
+            return False, "Excel文件为空或未包含数据", [], []
+        if not row_count:
+            return False, "删除空行后数据为空", [], []
 
-                # 4. 存储年份配置
-                if persist_assessment_years and not existing_years:
-                    if not db.set_assessment_years(assessment_years):
-                        return False, "保存年度考核配置失败", [], assessment_years
+    if table_name in RELATED_TABLES:
+        if not records:
+            return False, f"{TABLE_LABELS[table_name]}中未找到有效明细记录", [], assessment_years
 
-                # 5. 创建年份到通用标记的映射
-                year_to_index = {year: f"assessment_{idx}" for idx, year in enumerate(assessment_years)}
+    return True, f"成功读取{TABLE_LABELS[table_name]} {len(records)} 条记录", records, assessment_years
 
-        # 转换为字典列表
-        records: List[Dict[str, Any]] = []
-        for _, row in df.iterrows():
-            record = {}
-            for col_name, value in row.items():
-                # 清理列名
-                cleaned_name = clean_column_name(col_name)
-
-                # 年度考核字段特殊处理
-                match = re.search(r'(\d{4})年年度考核结果', col_name)
-                if match and table_name == 'base_info':
-                    year = int(match.group(1))
-                    if year in year_to_index:
-                        record[year_to_index[year]] = convert_excel_date(value)
-                        continue  # 跳过常规处理
 
-                # 常规字段处理
-                record[cleaned_name] = convert_excel_date(value)
+def _assessment_years_error(assessment_years: List[int], existing_years=None) -> Optional[str]:
+    """检查已排序的年度考核年份；传入 existing_years 时同时检查与已有配置是否一致。"""
+    if len(assessment_years) != 5:
+        return "必须包含连续的五个年度考核字段"
+    for i in range(1, 5):
+        if assessment_years[i] - assessment_years[i - 1] != 1:
+            return "年度考核字段必须为连续五年"
+    if existing_years and existing_years != assessment_years:
+        return f"年度考核区间不匹配（已配置: {existing_years}，当前: {assessment_years}），请先清空数据库"
+    return None
 
-            records.append(record)
 
-        records = db._normalize_import_rows(table_name, records)
+def _person_label(sequence, name) -> str:
+    return f"序号={sequence or '空'} 姓名={name or '空'}"
 
-        if table_name in RELATED_TABLES:
-            if not records:
-                return False, f"{TABLE_LABELS[table_name]}中未找到有效明细记录", [], assessment_years
 
-        return True, f"成功读取{TABLE_LABELS[table_name]} {len(records)} 条记录", records, assessment_years
+def plan_import_session(
+        db: Database,
+        table_name: str,
+        records: List[Dict[str, Any]],
+        assessment_years=None,
+        report: Optional[ImportValidationReport] = None
+) -> tuple:
+    """对已规范化的记录关联人员并判重，返回 (ImportSession, 重复人员键, 错误信息)。
 
-    except Exception as e:
-        logger.error(f"导入{table_name}失败: {e}", exc_info=True)
-        return False, f"导入{TABLE_LABELS[table_name]}失败: {e}", [], []
+    传入 report 时，全部文件内重复人员和无法关联的明细都按工作表行号记入 report，
+    report 中有任何问题（包括读取时记录的）时错误信息为 report.summary()。
+    """
+    session = ImportSession(
+        table_name,
+        records,
+        assessment_years=assessment_years or [],
+        snapshot=db.import_snapshot(table_name),
+    )
+    if table_name == "base_info":
+        session.person_ids, session.content_hashes, session.keep, duplicate_samples = db.plan_base_info_import(records)
+        if report is not None:
+            for first_index, duplicate_index, (sequence, name) in duplicate_samples:
+                first_row = report.record_rows[first_index - 1]
+                report.add_record_issue(
+                    "duplicate", duplicate_index, f"与第 {first_row} 行重复 {_person_label(sequence, name)}"
+                )
+            if report:
+                return session, [], report.summary()
+        if duplicate_samples:
+            return session, [], db._format_duplicate_base_person_message(duplicate_samples)
+        duplicate_keys = [
+            db._extract_person_key(record)
+            for record, person_id in zip(records, session.person_ids)
+            if person_id
+        ]
+        return session, duplicate_keys, None
+
+    unresolved, session.person_ids, session.content_hashes, session.keep = db.plan_related_import(
+        table_name,
+        records,
+    )
+    if report is not None:
+        for index, sequence, name, message in unresolved:
+            report.add_record_issue("unresolved", index, f"{_person_label(sequence, name)}: {message}")
+        if report:
+            return session, [], report.summary()
+    if unresolved:
+        sample = "; ".join(
+            f"第 {index} 行 {_person_label(sequence, name)}: {message}"
+            for index, sequence, name, message in unresolved[:5]
+        )
+        extra = f" 等 {len(unresolved)} 条" if len(unresolved) > 5 else ""
+        return session, [], f"{TABLE_LABELS[table_name]}中存在无法关联到人员基本信息的记录{extra}: {sample}"
+    duplicate_keys = [
+        key
+        for key in (
+            db._extract_person_key(record)
+            for record, person_id, keep in zip(records, session.person_ids, session.keep)
+            if person_id is not None and not keep
+        )
+        if key
+    ]
+    return session, duplicate_keys, None
 
 
-def prepare_import_preview(file_path: str, db_path: str, table_name: str) -> dict:
-    """后台预读 Excel，并返回重复记录信息。"""
-    db = Database(db_path)
+def prepare_import_preview(
+        file_path: str,
+        db_path: str,
+        table_name: str,
+        report_progress: Optional[Callable[[dict], None]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None
+) -> dict:
+    """后台预读 Excel，并返回重复记录信息、变化统计和可直接提交的 ImportSession。
+
+    文件内容与该表上次成功导入的文件相同且数据库此后未变化时，不解析文件，
+    直接返回 unchanged_file=True。
+    一次读取即校验全部数据：有问题时返回 success=False，message 为问题汇总，
+    validation 为 ImportValidationReport，可导出标注了全部问题的错误工作簿。
+    """
+    db = Database(db_path, open_existing=True)
     try:
-        success, message, records, assessment_years = _prepare_import_records_with_metadata(
-            file_path,
-            db,
-            table_name,
-            persist_assessment_years=False
-        )
+        file_hash = None
+        if os.path.isfile(file_path):
+            file_hash = file_content_hash(file_path)
+            if file_hash == db.get_import_file_hash(table_name):
+                logger.info(f"{TABLE_LABELS[table_name]}导入文件与上次成功导入的相同，跳过解析")
+                return {
+                    "success": True,
+                    "unchanged_file": True,
+                    "message": f"文件内容与上次成功导入的{TABLE_LABELS[table_name]}相同，数据库中已是最新数据",
+                    "records": [],
+                    "duplicate_keys": [],
+                    "assessment_years": [],
+                }
+
+        report = ImportValidationReport(table_name)
+        try:
+            success, message, records, assessment_years = _prepare_import_records_with_metadata(
+                file_path,
+                db,
+                table_name,
+                persist_assessment_years=False,
+                progress=ImportProgress(report_progress, is_cancelled),
+                report=report,
+            )
+        except ImportCancelled:
+            return _cancelled_result("已取消读取 Excel 文件")
         if not success:
             return {
                 "success": False,
@@ -283,118 +606,374 @@ def prepare_import_preview(file_path: str, db_path: str, table_name: str) -> dic
                 "assessment_years": assessment_years,
             }
 
-        if table_name == "base_info":
-            duplicate_keys, duplicate_samples = db._find_duplicate_base_person_keys_in_records(records)
-            if duplicate_keys:
-                return {
-                    "success": False,
-                    "message": db._format_duplicate_base_person_message(duplicate_samples),
-                    "records": [],
-                    "duplicate_keys": [],
-                    "assessment_years": assessment_years,
-                }
-
-        unresolved = []
-        if table_name in {"rewards", "family", "resume"}:
-            for index, record in enumerate(records, start=1):
-                normalized_record = {
-                    db.normalize_column_name(column_name): value
-                    for column_name, value in record.items()
-                }
-                try:
-                    db._resolve_person_id(normalized_record)
-                except ValueError as e:
-                    key = db._extract_person_key(normalized_record)
-                    sequence, name = key if key else ("", "")
-                    unresolved.append((index, sequence, name, str(e)))
-
-        if unresolved:
-            sample = "; ".join(
-                f"第 {index} 行 序号={sequence or '空'} 姓名={name or '空'}: {message}"
-                for index, sequence, name, message in unresolved[:5]
-            )
-            extra = f" 等 {len(unresolved)} 条" if len(unresolved) > 5 else ""
+        session, duplicate_keys, error_message = plan_import_session(
+            db, table_name, records, assessment_years, report
+        )
+        if error_message:
             return {
                 "success": False,
-                "message": f"{TABLE_LABELS[table_name]}中存在无法关联到人员基本信息的记录{extra}: {sample}",
-                "records": records,
+                "message": error_message,
+                # 无法关联的明细仍返回记录，便于界面展示；人员重复时不返回
+                "records": [] if table_name == "base_info" else records,
                 "duplicate_keys": [],
                 "assessment_years": assessment_years,
+                "validation": report,
             }
+        report.release_data()
+        session.file_hash = file_hash
 
-        duplicate_keys = db.find_duplicate_person_keys(table_name, records)
         return {
             "success": True,
             "message": message,
             "records": records,
             "duplicate_keys": duplicate_keys,
             "assessment_years": assessment_years,
+            "diff": session.diff(),
+            "session": session,
         }
     finally:
         db.close()
 
 
+def _related_import_result(table_name: str, inserted_count: int, skipped_count: int) -> dict:
+    if not inserted_count:
+        if skipped_count == 0:
+            return {
+                "success": False,
+                "message": f"{TABLE_LABELS[table_name]}中未找到有效明细记录",
+            }
+        return {
+            "success": True,
+            "message": f"未新增记录，已跳过 {skipped_count} 条重复明细",
+        }
+    if skipped_count:
+        message = (
+            f"成功导入{TABLE_LABELS[table_name]} {inserted_count} 条记录，"
+            f"已跳过 {skipped_count} 条重复明细"
+        )
+    else:
+        message = f"成功导入{TABLE_LABELS[table_name]} {inserted_count} 条记录"
+    return {
+        "success": True,
+        "message": message,
+    }
+
+
+def _base_info_import_result(session: ImportSession, record_count: int) -> dict:
+    diff = session.diff()
+    if not diff["unchanged"]:
+        message = f"成功导入{TABLE_LABELS['base_info']} {record_count} 条记录"
+    elif not diff["new"] and not diff["changed"]:
+        message = f"{TABLE_LABELS['base_info']}均未变化，已跳过 {diff['unchanged']} 条记录"
+    else:
+        message = (
+            f"成功导入{TABLE_LABELS['base_info']} {diff['new'] + diff['changed']} 条记录"
+            f"（新增 {diff['new']} 条，更新 {diff['changed']} 条），{diff['unchanged']} 条未变化已跳过"
+        )
+    return {"success": True, "message": message}
+
+
+def _session_is_current(db: Database, table_name: str, session: Optional[ImportSession]) -> bool:
+    if session is None or session.table_name != table_name:
+        return False
+    if db.import_snapshot(table_name) != session.snapshot:
+        logger.info(f"预览后{TABLE_LABELS[table_name]}相关数据已变化，重新解析导入记录")
+        return False
+    return True
+
+
+def write_import_session(
+        db: Database,
+        session: ImportSession,
+        progress: Optional[ImportProgress] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE
+) -> int:
+    """按批写入 ImportSession，返回写入行数。
+
+    每批在一个 SAVEPOINT 内完成并随即提交，写锁只在批内持有，读者可在批间读取。
+    取消时回滚当前批次并抛出 ImportCancelled，其他错误回滚当前批次并抛出 ImportWriteError，
+    两者都带有已提交的行数，已提交的批次保留；
+    再次导入同一文件时，明细按内容去重、人员信息按键更新，不会重复写入。
+    """
+    progress = progress or ImportProgress()
+    rows = session.rows
+    progress.start("written", len(rows))
+    written = 0
+    try:
+        for start in range(0, len(rows), chunk_size):
+            stop = start + chunk_size
+            with db.savepoint("import_chunk"):
+                if session.table_name == "base_info":
+                    count = db.write_base_info_rows(
+                        rows[start:stop],
+                        session.person_ids[start:stop],
+                        session.content_hashes[start:stop],
+                        session.keep[start:stop],
+                        commit=False,
+                    )
+                else:
+                    count = db.write_related_rows(
+                        session.table_name,
+                        rows[start:stop],
+                        session.person_ids[start:stop],
+                        session.content_hashes[start:stop],
+                        session.keep[start:stop],
+                        commit=False,
+                    )
+                # 在释放 SAVEPOINT 前检查，取消时本批随异常回滚
+                progress.check_cancelled(written)
+            written += count
+            progress.advance("written", len(rows[start:stop]))
+    except ImportCancelled:
+        raise
+    except Exception as e:
+        raise ImportWriteError(written, e) from e
+    return written
+
+
+def _apply_assessment_years(db: Database, assessment_years) -> Optional[str]:
+    """首次导入时保存年度考核区间，与已有配置不一致时返回错误信息。"""
+    if not assessment_years:
+        return None
+    existing_years = db.get_assessment_years()
+    if existing_years and existing_years != assessment_years:
+        return _assessment_years_error(assessment_years, existing_years)
+    if not existing_years and not db.set_assessment_years(assessment_years):
+        return "保存年度考核配置失败"
+    return None
+
+
+def _cancelled_result(message: str) -> dict:
+    return {"success": False, "cancelled": True, "message": message}
+
+
 def import_prepared_records(
         db_path: str,
         table_name: str,
         records: List[Dict[str, Any]],
-        assessment_years=None
+        assessment_years=None,
+        session: Optional[ImportSession] = None,
+        report_progress: Optional[Callable[[dict], None]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE
 ) -> dict:
-    """将已解析的记录写入数据库，供后台线程调用。"""
-    db = Database(db_path)
+    """将已解析的记录写入数据库，供后台线程调用。
+
+    传入预览得到的 session 且数据库未变化时，直接按预览结果写入；
+    否则重新关联人员并判重。写入按批提交，可通过 is_cancelled 中途取消。
+    """
+    progress = ImportProgress(report_progress, is_cancelled)
+    db = Database(db_path, open_existing=True)
     try:
-        skipped_duplicate_related_rows = 0
+        if table_name in RELATED_TABLES and not records:
+            return {"success": False, "message": f"{TABLE_LABELS[table_name]}中未找到有效明细记录"}
 
-        if table_name in RELATED_TABLES:
-            if not records:
-                return {"success": False, "message": f"{TABLE_LABELS[table_name]}中未找到有效明细记录"}
+        file_hash = session.file_hash if session is not None else None
+        if not _session_is_current(db, table_name, session):
+            rows = db._normalize_import_rows(table_name, records)
+            session, _, error_message = plan_import_session(db, table_name, rows, assessment_years)
+            if error_message:
+                return {"success": False, "message": error_message}
 
-            records, skipped_duplicate_related_rows = db._filter_duplicate_related_import_rows(
-                table_name,
-                records,
-                skip_existing=True,
+        if table_name == 'base_info':
+            error_message = _apply_assessment_years(db, assessment_years)
+            if error_message:
+                return {"success": False, "message": error_message}
+
+        try:
+            written = write_import_session(db, session, progress, chunk_size)
+        except ImportCancelled as e:
+            logger.info(f"用户取消导入{TABLE_LABELS[table_name]}，已写入 {e.written} 条")
+            return _cancelled_result(
+                f"导入已取消：已写入{TABLE_LABELS[table_name]} {e.written} 条记录，当前批次已回滚"
             )
-            if not records:
-                if skipped_duplicate_related_rows == 0:
-                    return {
-                        "success": False,
-                        "message": f"{TABLE_LABELS[table_name]}中未找到有效明细记录",
-                    }
-                return {
-                    "success": True,
-                    "message": f"未新增记录，已跳过 {skipped_duplicate_related_rows} 条重复明细",
-                }
+        except ImportWriteError as e:
+            logger.error(f"导入{table_name}失败，已提交 {e.written} 条: {e.error}", exc_info=e.error)
+            return {
+                "success": False,
+                "written": e.written,
+                "message": (
+                    f"导入{TABLE_LABELS[table_name]}失败: {e.error}\n"
+                    f"出错前已写入 {e.written} 条记录，这些记录已保存，出错批次已回滚"
+                ),
+            }
 
-        if table_name == 'base_info':
-            duplicate_keys, duplicate_samples = db._find_duplicate_base_person_keys_in_records(records)
-            if duplicate_keys:
-                return {
-                    "success": False,
-                    "message": db._format_duplicate_base_person_message(duplicate_samples),
-                }
+        if file_hash:
+            db.set_import_file_hash(table_name, file_hash)
+        if table_name in RELATED_TABLES:
+            return _related_import_result(table_name, written, session.skipped_count)
+        return _base_info_import_result(session, len(records))
+    except Exception as e:
+        logger.error(f"导入{table_name}失败: {e}", exc_info=True)
+        return {"success": False, "message": f"导入{TABLE_LABELS[table_name]}失败: {e}"}
+    finally:
+        db.close()
 
-        if table_name == 'base_info' and assessment_years:
-            existing_years = db.get_assessment_years()
-            if existing_years and existing_years != assessment_years:
+
+def match_workbook_sheets(sheet_names: List[str], sheet_labels: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """按工作表名称识别数据表，返回 {表名: 工作表名}，顺序与 TABLE_LABELS 一致。
+
+    工作表名可以是表名（如 family）、中文名称（如 人员家庭成员信息）或去掉“人员”前缀的名称。
+    """
+    sheet_labels = sheet_labels or TABLE_LABELS
+    aliases = {}
+    for table_name, label in sheet_labels.items():
+        for alias in (table_name, label, label.removeprefix("人员")):
+            aliases.setdefault(alias.strip().lower(), table_name)
+    matched = {}
+    for sheet_name in sheet_names:
+        table_name = aliases.get(sheet_name.strip().lower())
+        if table_name and table_name not in matched:
+            matched[table_name] = sheet_name
+    return {table_name: matched[table_name] for table_name in TABLE_LABELS if table_name in matched}
+
+
+def import_workbook(
+        file_path: str,
+        db_path: str,
+        report_progress: Optional[Callable[[dict], None]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+        tables=None,
+        sheet_labels: Optional[Dict[str, str]] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE
+) -> dict:
+    """在一个后台任务中导入整本工作簿：按工作表名称对应各表，只打开一次文件和数据库。
+
+    先读取并校验全部工作表，任一工作表有误时不写入任何数据；随后先写入人员基本信息，
+    再按刚写入的人员关联各明细表。明细表无法关联时跳过该表并在结果中说明，
+    已写入的数据保留，修正后重新导入即可（重复明细按内容跳过）。
+    tables 限定可导入的表（如按用户权限），其余工作表忽略。
+    返回的 results 按表名给出各表的导入结果；校验发现问题时 validation 按表名
+    给出各工作表的 ImportValidationReport，用于导出错误清单。
+    """
+    progress = ImportProgress(report_progress, is_cancelled)
+    file_error = _check_import_file(file_path)
+    if file_error:
+        return {"success": False, "message": file_error, "results": {}}
+
+    db = Database(db_path, open_existing=True)
+    try:
+        try:
+            workbook = ExcelWorkbook(file_path, merged_cells=True)
+        except MergedCellsError as merge_error:
+            return {"success": False, "message": _merged_cells_message(file_path, merge_error), "results": {}}
+        except ImportError as e:
+            return {"success": False, "message": str(e), "results": {}}
+
+        with workbook:
+            sheets = match_workbook_sheets(workbook.sheet_names, sheet_labels)
+            if tables is not None:
+                sheets = {table_name: sheet for table_name, sheet in sheets.items() if table_name in tables}
+            if not sheets:
+                expected = "、".join((sheet_labels or TABLE_LABELS).values())
                 return {
                     "success": False,
-                    "message": f"年度考核区间不匹配（已配置: {existing_years}，当前: {assessment_years}），请先清空数据库",
+                    "message": f"工作簿中未找到可导入的工作表，工作表应命名为：{expected}",
+                    "results": {},
                 }
-            if not existing_years and not db.set_assessment_years(assessment_years):
-                return {"success": False, "message": "保存年度考核配置失败"}
+            logger.info(f"整本导入工作表对应关系: {sheets}")
 
-        db.import_excel_data(table_name, records)
+            readers = {
+                table_name: workbook.sheet(sheet_name, fill_merged=table_name in MERGED_CELL_TABLES)
+                for table_name, sheet_name in sheets.items()
+            }
+            estimates = [reader.row_estimate for reader in readers.values()]
+            progress.start("parsed", sum(estimates) if all(estimates) else None)
+            parsed = {}
+            reports = {
+                table_name: ImportValidationReport(table_name, sheet_name=sheet_name)
+                for table_name, sheet_name in sheets.items()
+            }
+            try:
+                for table_name, reader in readers.items():
+                    try:
+                        success, message, records, assessment_years = _read_sheet_records(
+                            reader, db, table_name, False, progress, reports[table_name]
+                        )
+                    except ImportCancelled:
+                        raise
+                    except Exception as e:
+                        logger.error(f"读取工作表 {sheets[table_name]} 失败: {e}", exc_info=True)
+                        success, message = False, f"读取{TABLE_LABELS[table_name]}失败: {e}"
+                    if not success:
+                        return {
+                            "success": False,
+                            "message": f"工作表“{sheets[table_name]}”：{message}",
+                            "results": {},
+                        }
+                    parsed[table_name] = (records, assessment_years)
+            finally:
+                for reader in readers.values():
+                    reader.close()
+
+        # 人员基本信息不依赖其他表，写入前即可完成判重；明细表的关联要等人员写入后检查
+        sessions = {}
+        if "base_info" in parsed:
+            records, assessment_years = parsed["base_info"]
+            sessions["base_info"], _, _ = plan_import_session(
+                db, "base_info", records, assessment_years, reports["base_info"]
+            )
+        invalid = {table_name: report for table_name, report in reports.items() if report}
+        if invalid:
+            lines = [f"工作表“{sheets[table_name]}”：{report.summary()}" for table_name, report in invalid.items()]
+            return {"success": False, "message": "\n".join(lines), "results": {}, "validation": invalid}
+
+        results = {}
+        # 已提交的行数只计实际写入的行，不含跳过的未变化或重复的行
+        committed = 0
+        progress.start("written", sum(len(records) for records, _ in parsed.values()))
+        try:
+            for table_name, (records, assessment_years) in parsed.items():
+                progress.check_cancelled()
+                # 明细表在人员基本信息写入后才规划，关联到本次新建的人员
+                if table_name in sessions:
+                    session, error_message = sessions[table_name], None
+                else:
+                    session, _, error_message = plan_import_session(
+                        db, table_name, records, assessment_years, reports[table_name]
+                    )
+                if not error_message and table_name == "base_info":
+                    error_message = _apply_assessment_years(db, assessment_years)
+                if error_message:
+                    results[table_name] = {"success": False, "message": error_message}
+                    if reports[table_name]:
+                        results[table_name]["validation"] = reports[table_name]
+                    if table_name == "base_info":
+                        break
+                    continue
+                reports[table_name].release_data()
+                written = write_import_session(db, session, progress, chunk_size)
+                committed += written
+                if table_name in RELATED_TABLES:
+                    results[table_name] = _related_import_result(table_name, written, session.skipped_count)
+                else:
+                    results[table_name] = _base_info_import_result(session, len(records))
+        except ImportCancelled as e:
+            committed += e.written
+            logger.info(f"用户取消整本导入，已提交 {committed} 行")
+            result = _cancelled_result(f"导入已取消：已提交 {committed} 行，当前批次已回滚")
+            result["results"] = results
+            return result
+        except ImportWriteError as e:
+            committed += e.written
+            logger.error(f"整本导入工作簿失败，已提交 {committed} 行: {e.error}", exc_info=e.error)
+            return {
+                "success": False,
+                "written": committed,
+                "message": f"导入工作簿失败: {e.error}\n出错前已提交 {committed} 行，这些记录已保存，出错批次已回滚",
+                "results": results,
+            }
 
-        if table_name in RELATED_TABLES and skipped_duplicate_related_rows:
-            message = f"成功导入{TABLE_LABELS[table_name]} {len(records)} 条记录，已跳过 {skipped_duplicate_related_rows} 条重复明细"
-        else:
-            message = f"成功导入{TABLE_LABELS[table_name]} {len(records)} 条记录"
+        lines = [f"{TABLE_LABELS[table_name]}：{result['message']}" for table_name, result in results.items()]
         return {
-            "success": True,
-            "message": message,
+            "success": all(result["success"] for result in results.values()),
+            "message": "\n".join(lines),
+            "results": results,
         }
+    except ImportCancelled:
+        return {**_cancelled_result("已取消读取 Excel 文件"), "results": {}}
     except Exception as e:
-        logger.error(f"导入{table_name}失败: {e}", exc_info=True)
-        return {"success": False, "message": f"导入{TABLE_LABELS[table_name]}失败: {e}"}
+        logger.error(f"整本导入工作簿失败: {e}", exc_info=True)
+        return {"success": False, "message": f"导入工作簿失败: {e}", "results": {}}
     finally:
         db.close()
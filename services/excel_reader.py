@@ -0,0 +1,429 @@
+"""单次打开并流式读取导入工作簿中的工作表。
+
+.xlsx 通过 openpyxl 只读模式逐行读取，合并区域从工作表 XML 中扫描得到；
+.xls 通过 xlrd 打开一次，同时取得单元格和合并区域。两种格式都在流式读取时
+填充合并单元格，并按 ``pd.read_excel(sheet_name=0, dtype=str)`` 的规则把
+单元格转换为字符串，空值为 None。
+"""
+
+import datetime
+import logging
+import os
+import posixpath
+import re
+import zipfile
+from collections import defaultdict
+from typing import Iterator, List, Optional
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+logger = logging.getLogger('ExcelReader')
+
+READ_BATCH_SIZE = 5000
+# 与 pandas.read_excel 默认 na_values 一致，另加 Excel 错误值（pandas 读取时为 NaN）
+NA_TEXT_VALUES = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "n/a", "nan", "null",
+    "#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!",
+})
+MERGE_CELL_PATTERN = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+
+class MergedCellsError(Exception):
+    """读取合并单元格信息失败。"""
+
+
+def cell_text(value) -> Optional[str]:
+    """按 pandas dtype=str 的规则转换单元格值，空值返回 None。"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return None if value in NA_TEXT_VALUES else value
+    if isinstance(value, float):
+        if value != value:
+            return None
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value)
+
+
+def _column_index(letters: bytes) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + letter - 64
+    return index
+
+
+def _header_names(values: List[Optional[str]]) -> List[str]:
+    """生成与 pandas 一致的列名：空标题为 Unnamed: N，重复标题追加 .1、.2。"""
+    while values and values[-1] is None:
+        values = values[:-1]
+    names = []
+    counts = defaultdict(int)
+    for index, value in enumerate(values):
+        name = f"Unnamed: {index}" if value is None else value
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts[name]
+        counts[name] += 1
+        names.append(name)
+    return names
+
+
+class ExcelWorkbook:
+    """打开一次工作簿，按名称或位置逐个流式读取其中的工作表。
+
+    ``merged_cells`` 为真时 .xls 以 formatting_info 打开，以便读取合并区域；
+    .xlsx 的合并区域在读取对应工作表时从其 XML 中扫描。
+    """
+
+    def __init__(self, file_path: str, merged_cells: bool = False):
+        self.file_path = file_path
+        self.merged_cells = merged_cells
+        self._is_xls = os.path.splitext(file_path)[1].lower() == '.xls'
+        self._worksheet_paths = None
+        if self._is_xls:
+            if xlrd is None:
+                raise ImportError("缺少xlrd依赖，无法处理.xls文件，请安装xlrd或使用.xlsx格式")
+            try:
+                book = xlrd.open_workbook(file_path, formatting_info=merged_cells, on_demand=True)
+            except Exception as e:
+                if merged_cells:
+                    raise MergedCellsError(str(e)) from e
+                raise
+            self._book = book
+            self._close = book.release_resources
+            self.sheet_names = list(book.sheet_names())
+        else:
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            self._book = workbook
+            self._close = workbook.close
+            self.sheet_names = [sheet.title for sheet in workbook.worksheets]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def sheet(self, sheet=0, fill_merged: bool = False) -> "ExcelSheetReader":
+        """返回指定工作表（名称或从 0 开始的位置）的读取器，由本工作簿负责关闭。"""
+        return ExcelSheetReader(self.file_path, fill_merged, sheet=sheet, workbook=self)
+
+    def _sheet_name(self, sheet) -> str:
+        if isinstance(sheet, int):
+            if not 0 <= sheet < len(self.sheet_names):
+                raise ValueError("工作簿中没有工作表")
+            return self.sheet_names[sheet]
+        if sheet not in self.sheet_names:
+            raise ValueError(f"工作簿中没有工作表: {sheet}")
+        return sheet
+
+    def _open_sheet(self, sheet, fill_merged: bool) -> tuple:
+        """返回 (逐行迭代器, 合并区域, 声明的行数)。"""
+        name = self._sheet_name(sheet)
+        if self._is_xls:
+            return self._open_xls_sheet(name)
+        merged_ranges = []
+        if fill_merged:
+            try:
+                merged_ranges = self._scan_xlsx_merged_ranges(name)
+            except Exception as e:
+                raise MergedCellsError(str(e)) from e
+        worksheet = self._book[name]
+        # 声明的尺寸可能缺失或不准确，只用于估算进度；读取时按实际行数
+        declared_rows = worksheet.max_row if (worksheet.max_row or 0) > 1 else None
+        worksheet.reset_dimensions()
+        rows = ([cell_text(value) for value in values] for values in worksheet.iter_rows(values_only=True))
+        return rows, merged_ranges, declared_rows
+
+    def _scan_xlsx_merged_ranges(self, sheet_name: str) -> list:
+        """按块扫描工作表 XML 中的 mergeCell，不解析单元格数据。"""
+        ranges = []
+        with zipfile.ZipFile(self.file_path) as archive:
+            if self._worksheet_paths is None:
+                self._worksheet_paths = _worksheet_paths(archive)
+            with archive.open(self._worksheet_paths[sheet_name]) as stream:
+                tail = b""
+                while True:
+                    chunk = stream.read(1 << 20)
+                    data = tail + chunk
+                    # 最后一个 '<' 之后可能是被截断的元素，留到下一块
+                    cut = data.rfind(b"<") if chunk else len(data)
+                    if cut < 0:
+                        cut = len(data)
+                    for match in MERGE_CELL_PATTERN.finditer(data, 0, cut):
+                        start_col, start_row, end_col, end_row = match.groups()
+                        if end_col is not None:
+                            ranges.append((
+                                int(start_row), _column_index(start_col), int(end_row), _column_index(end_col)
+                            ))
+                    if not chunk:
+                        break
+                    tail = data[cut:]
+        return ranges
+
+    def _open_xls_sheet(self, name: str) -> tuple:
+        book = self._book
+        sheet = book.sheet_by_index(self.sheet_names.index(name))
+        merged_ranges = [
+            (row_low + 1, col_low + 1, row_high, col_high)
+            for row_low, row_high, col_low, col_high in sheet.merged_cells
+        ]
+        rows = (
+            [_xls_cell_text(cell, book.datemode) for cell in sheet.row(row_index)]
+            for row_index in range(sheet.nrows)
+        )
+        return rows, merged_ranges, sheet.nrows
+
+
+class ExcelSheetReader:
+    """流式读取工作簿中的一个工作表，默认为第一个。
+
+    打开后 ``columns`` 为标题行列名，``header_row`` 为标题行的行号，``row_estimate`` 为按工作表声明尺寸估算的
+    数据行数（可能为 None），``iter_batches()`` 逐批返回数据，全空行已跳过。
+    ``fill_merged`` 为真时，标题行以下的合并区域用左上角单元格的值填充。
+    传入 ``workbook`` 时复用已打开的工作簿，关闭读取器不会关闭工作簿。
+    """
+
+    def __init__(self, file_path: str, fill_merged: bool = False, sheet=0,
+                 workbook: Optional[ExcelWorkbook] = None):
+        self.file_path = file_path
+        self.fill_merged = fill_merged
+        self.sheet = sheet
+        self.rows_read = 0
+        self.row_estimate = None
+        self._close = None
+        if workbook is None:
+            workbook = ExcelWorkbook(file_path, merged_cells=fill_merged)
+            self._close = workbook.close
+        try:
+            self._rows, self.merged_ranges, declared_rows = workbook._open_sheet(sheet, fill_merged)
+        except BaseException:
+            self.close()
+            raise
+        # 与 pandas 一致，标题行是第一个非空行；行号保持工作表中的绝对行号
+        self.header_row = 0
+        header = []
+        for self.header_row, values in enumerate(self._rows, start=1):
+            if any(value is not None for value in values):
+                header = values
+                break
+        self.columns = _header_names(header)
+        if declared_rows:
+            self.row_estimate = max(declared_rows - self.header_row, 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def reopen(self) -> "ExcelSheetReader":
+        """单独重新打开同一工作表，从头读取。"""
+        return ExcelSheetReader(self.file_path, self.fill_merged, sheet=self.sheet)
+
+    def iter_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[List[np.ndarray]]:
+        """逐批返回数据，每批为按列排列的对象数组列表；批内已填充合并单元格并去掉全空行。"""
+        for _row_numbers, columns in self.iter_numbered_batches(batch_size):
+            yield columns
+
+    def iter_numbered_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[tuple]:
+        """与 iter_batches 相同，另外返回每行在工作表中的行号数组：(行号, 按列排列的数据)。"""
+        width = len(self.columns)
+        if not width:
+            return
+        merged_fill = MergedRangeFill(self.merged_ranges, self.header_row, width)
+        first_row = self.header_row + 1
+        chunk = []
+        for values in self._rows:
+            self.rows_read += 1
+            if len(values) < width:
+                values.extend([None] * (width - len(values)))
+            elif len(values) > width:
+                del values[width:]
+            chunk.append(values)
+            if len(chunk) >= batch_size:
+                batch = self._finish_chunk(chunk, first_row, merged_fill)
+                first_row += len(chunk)
+                chunk = []
+                if batch is not None:
+                    yield batch
+        if chunk:
+            batch = self._finish_chunk(chunk, first_row, merged_fill)
+            if batch is not None:
+                yield batch
+
+    @staticmethod
+    def _finish_chunk(chunk: List[list], first_row: int, merged_fill: "MergedRangeFill"):
+        columns = columns_from_rows(chunk)
+        merged_fill.fill(columns, first_row)
+        return _drop_blank_rows(np.arange(first_row, first_row + len(chunk)), columns)
+
+
+class MergedRangeFill:
+    """按列把合并区域左上角的值填充到整个区域，可跨批次。
+
+    合并区域保存为整数数组。每批数据对每一列只做一次向量化计算：横向合并
+    从左侧列复制起始行，纵向合并用差分数组标出区域内部的行，再以
+    maximum.accumulate 得到每行的来源行下标。代价随列数增长，与单元格数无关。
+    """
+
+    def __init__(self, ranges, header_row: int, width: int):
+        bounds = np.array(ranges, dtype=np.int64).reshape(-1, 4)
+        # 跳过涉及标题行及以上的合并区域；列转为 0 起始并截断到表头宽度
+        bounds = bounds[(bounds[:, 0] > header_row) & (bounds[:, 1] <= width)]
+        self.min_row = bounds[:, 0]
+        self.min_col = bounds[:, 1] - 1
+        self.max_row = bounds[:, 2]
+        self.max_col = np.minimum(bounds[:, 3], width) - 1
+        self._carry = [None] * width
+        if len(bounds):
+            logger.info(f"找到 {len(bounds)} 个合并单元格")
+
+    def fill(self, columns: List[np.ndarray], first_row: int):
+        """就地填充一批按列排列的数据；first_row 为该批第一行在工作表中的行号。"""
+        if not columns:
+            return
+        count = len(columns[0])
+        last_row = first_row + count - 1
+        active = (self.min_row <= last_row) & (self.max_row >= first_row)
+        if active.any():
+            # 扩展坐标：第 0 行是上一批最后一行（已填充），第 i 行是本批第 i 行
+            origin = first_row - 1
+            top = np.maximum(self.min_row[active], origin) - origin
+            bottom = np.minimum(self.max_row[active], last_row) - origin
+            min_col = self.min_col[active]
+            max_col = self.max_col[active]
+            starts_here = self.min_row[active] >= first_row
+            positions = np.arange(count + 1)
+            extended = {}
+            for column_index in np.unique(np.concatenate([
+                np.arange(start, stop + 1) for start, stop in set(zip(min_col.tolist(), max_col.tolist()))
+            ])):
+                covers = (min_col <= column_index) & (max_col >= column_index)
+                values = np.empty(count + 1, dtype=object)
+                values[0] = self._carry[column_index]
+                values[1:] = columns[column_index]
+
+                across = covers & starts_here & (min_col < column_index)
+                if across.any():
+                    rows = top[across]
+                    values[rows] = extended[column_index - 1][rows]
+
+                down = covers & (bottom > top)
+                if down.any():
+                    depth = np.zeros(count + 2, dtype=np.int64)
+                    np.add.at(depth, top[down] + 1, 1)
+                    np.add.at(depth, bottom[down] + 1, -1)
+                    inside = np.cumsum(depth[:count + 1]) > 0
+                    source = np.where(inside, 0, positions)
+                    np.maximum.accumulate(source, out=source)
+                    values = values[source]
+
+                extended[column_index] = values
+                columns[column_index] = values[1:]
+        self._carry = [column[-1] for column in columns]
+
+
+def _drop_blank_rows(row_numbers: np.ndarray, columns: List[np.ndarray]) -> Optional[tuple]:
+    """去掉全空行，返回 (行号, 按列排列的数据)；整批为空时返回 None。"""
+    if not columns or not len(row_numbers):
+        return None
+    blank = np.ones(len(row_numbers), dtype=bool)
+    for column in columns:
+        blank &= pd.isna(column)
+    if blank.all():
+        return None
+    if blank.any():
+        keep = ~blank
+        row_numbers = row_numbers[keep]
+        columns = [column[keep] for column in columns]
+    return row_numbers, columns
+
+
+def columns_from_rows(rows: List[list]) -> List[np.ndarray]:
+    """把等长的行列表转为按列排列的对象数组列表。"""
+    if not rows:
+        return []
+    table = np.empty((len(rows), len(rows[0])), dtype=object)
+    table[:] = rows
+    return [table[:, index].copy() for index in range(table.shape[1])]
+
+
+def _xls_cell_text(cell, datemode: int) -> Optional[str]:
+    ctype = cell.ctype
+    if ctype == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate_as_datetime(cell.value, datemode)
+        except Exception:
+            return cell_text(cell.value)
+        if value.date() in (datetime.date(1899, 12, 31), datetime.date(1904, 1, 1)):
+            return str(value.time())
+        return str(value)
+    if ctype == xlrd.XL_CELL_BOOLEAN:
+        return str(bool(cell.value))
+    if ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    return cell_text(cell.value)
+
+
+def _read_relationships(archive: zipfile.ZipFile, path: str) -> dict:
+    if path not in archive.namelist():
+        return {}
+    root = ElementTree.fromstring(archive.read(path))
+    return {
+        element.get("Id"): (element.get("Type", ""), element.get("Target", ""))
+        for element in root
+        if element.tag.endswith("Relationship")
+    }
+
+
+def _resolve_part(base_path: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_path), target))
+
+
+def _worksheet_paths(archive: zipfile.ZipFile) -> dict:
+    """按工作簿中的顺序返回工作表名称到 XML 路径的映射（跳过图表页）。"""
+    workbook_path = "xl/workbook.xml"
+    for rel_type, target in _read_relationships(archive, "_rels/.rels").values():
+        if rel_type.endswith("/officeDocument"):
+            workbook_path = _resolve_part("", target)
+            break
+    rels_path = posixpath.join(
+        posixpath.dirname(workbook_path), "_rels", posixpath.basename(workbook_path) + ".rels"
+    )
+    relationships = _read_relationships(archive, rels_path)
+    workbook = ElementTree.fromstring(archive.read(workbook_path))
+    paths = {}
+    for element in workbook.iter():
+        if not element.tag.endswith("}sheet"):
+            continue
+        rel_id = next((value for key, value in element.attrib.items() if key.endswith("}id")), None)
+        rel_type, target = relationships.get(rel_id, ("", ""))
+        if rel_type.endswith("/worksheet"):
+            paths[element.get("name")] = _resolve_part(workbook_path, target)
+    if not paths:
+        raise ValueError("工作簿中没有工作表")
+    return paths
@@ -0,0 +1,248 @@
+"""流式读取 CSV 和 Parquet 导入文件。
+
+其他人事系统导出的明细通常是 CSV 或 Parquet，没有合并单元格，也不需要经过
+openpyxl。这里的读取器与 ``ExcelSheetReader`` 接口一致：``columns`` 为标题行
+列名，``iter_batches()`` 逐批返回按列排列的对象数组，空值为 None，全空行已
+跳过，因此后续的列映射、日期规范化和重复处理完全复用 Excel 导入的流程。
+"""
+
+import codecs
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from services.excel_reader import NA_TEXT_VALUES, READ_BATCH_SIZE, _drop_blank_rows, cell_text
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger('FlatFileReader')
+
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet',)
+CSV_DELIMITERS = (",", "\t", ";", "|")
+# 编码和分隔符按文件开头的样本判断，行数按样本的平均行长估算
+SAMPLE_SIZE = 1 << 16
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_text_encoding(sample: bytes) -> str:
+    """按 BOM 和 UTF-8 严格解码判断编码；不是 UTF-8 时按 GB18030（兼容 GBK）读取。"""
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # 样本末尾可能截断了一个多字节字符，按增量方式解码
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "gb18030"
+    return "utf-8"
+
+
+def _detect_delimiter(first_line: str) -> str:
+    counts = {delimiter: first_line.count(delimiter) for delimiter in CSV_DELIMITERS}
+    delimiter = max(CSV_DELIMITERS, key=lambda candidate: counts[candidate])
+    return delimiter if counts[delimiter] else ","
+
+
+class _FlatFileReader(ABC):
+    """CSV 和 Parquet 读取器的公共部分：没有合并区域，逐批去掉全空行。"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.merged_ranges: List[tuple] = []
+        self.columns: List[str] = []
+        self.rows_read = 0
+        self.row_estimate = None
+        self.header_row = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def reopen(self) -> "_FlatFileReader":
+        """重新打开同一文件，从头读取。"""
+        return type(self)(self.file_path)
+
+    def iter_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[List[np.ndarray]]:
+        for _row_numbers, columns in self.iter_numbered_batches(batch_size):
+            yield columns
+
+    @abstractmethod
+    def iter_numbered_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[tuple]:
+        """逐批返回 (行号, 按列排列的数据)，每批最多 batch_size 行，全空行已去掉。"""
+
+
+class CsvSheetReader(_FlatFileReader):
+    """用 pandas 的 C 解析器分块读取 CSV，自动识别 UTF-8/GBK 编码和分隔符。
+
+    所有单元格按字符串读取，空值规则与 ``pd.read_excel(dtype=str)`` 相同。
+    """
+
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        with open(file_path, "rb") as stream:
+            sample = stream.read(SAMPLE_SIZE)
+        self.encoding = detect_text_encoding(sample)
+        text = codecs.getincrementaldecoder(self.encoding)(errors="replace").decode(sample)
+        lines = text.split("\n")
+        # 标题行是第一个非空行；保留空行，使行号与文件中的行一致
+        self.header_row = next((index for index, line in enumerate(lines, start=1) if line.strip()), None)
+        self.delimiter = _detect_delimiter(lines[self.header_row - 1]) if self.header_row else ","
+        if self.header_row:
+            sample_rows = text.count("\n") or 1
+            estimate = os.path.getsize(file_path) * sample_rows // max(len(sample), 1)
+            self.row_estimate = max(estimate - 1, 0)
+        logger.info(f"CSV 文件编码 {self.encoding}，分隔符 {self.delimiter!r}")
+        self._chunks = self._first = None
+        # 已经从 pandas 取出的数据行数，改换编码重读时跳过这些行
+        self._consumed = 0
+        if self.header_row:
+            self._chunks = self._read_chunks()
+            self._first = self._next_chunk()
+            if self._first is not None:
+                self.columns = [str(column) for column in self._first.columns]
+
+    def _read_chunks(self):
+        return pd.read_csv(
+            self.file_path,
+            sep=self.delimiter,
+            encoding=self.encoding,
+            dtype=str,
+            header=self.header_row - 1,
+            index_col=False,
+            na_values=list(NA_TEXT_VALUES),
+            keep_default_na=False,
+            skip_blank_lines=False,
+            chunksize=READ_BATCH_SIZE,
+        )
+
+    def _next_chunk(self):
+        """读取下一块。编码只按开头的样本判断，按 UTF-8 读到样本之后的非 UTF-8 内容时，
+        改按 GB18030 从头重读并跳过已经取出的行。"""
+        try:
+            frame = next(self._chunks, None)
+        except UnicodeDecodeError:
+            if self.encoding != "utf-8":
+                raise
+            logger.info(f"CSV 文件第 {self._consumed + self.header_row} 行之后不是 UTF-8 编码，改按 gb18030 读取")
+            self._chunks.close()
+            self.encoding = "gb18030"
+            self._chunks = self._read_chunks()
+            frame = next(self._chunks, None)
+            while frame is not None and frame.index[-1] < self._consumed:
+                frame = next(self._chunks, None)
+            if frame is not None:
+                frame = frame[frame.index >= self._consumed]
+        if frame is not None and len(frame):
+            self._consumed = int(frame.index[-1]) + 1
+        return frame
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.close()
+            self._chunks = None
+
+    def iter_numbered_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[tuple]:
+        """逐批返回 (行号, 按列排列的数据)；pandas 按打开时的分块读取，这里再按 batch_size 重新分批。"""
+        if self._chunks is None or self._first is None:
+            return
+        frame, self._first = self._first, None
+        pending_numbers, pending_values, pending = [], [], 0
+        while frame is not None:
+            self.rows_read += len(frame)
+            values = frame.to_numpy(dtype=object)
+            values[frame.isna().to_numpy()] = None
+            # 行号按记录计算，与在 Excel 中打开该文件时的行号一致
+            pending_numbers.append(frame.index.to_numpy(dtype=np.int64) + self.header_row + 1)
+            pending_values.append(values)
+            pending += len(frame)
+            frame = self._next_chunk()
+            if pending < batch_size and frame is not None:
+                continue
+            row_numbers = np.concatenate(pending_numbers)
+            values = np.concatenate(pending_values)
+            # 不足一批的尾部留到下一块，读完时一并返回
+            full = pending if frame is None else pending - pending % batch_size
+            for start in range(0, full, batch_size):
+                batch = _drop_blank_rows(
+                    row_numbers[start:start + batch_size],
+                    [values[start:start + batch_size, index] for index in range(values.shape[1])],
+                )
+                if batch is not None:
+                    yield batch
+            pending_numbers, pending_values = [row_numbers[full:]], [values[full:]]
+            pending -= full
+
+
+class ParquetSheetReader(_FlatFileReader):
+    """按行组分批读取 Parquet 文件，需要可选依赖 pyarrow。
+
+    字符串列直接转为对象数组；数值、日期等列逐个按 ``cell_text`` 转为字符串，
+    与从 Excel 读取同样的值结果一致。
+    """
+
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        if pq is None:
+            raise ImportError("缺少pyarrow依赖，无法处理.parquet文件，请安装pyarrow或使用.xlsx/.csv格式")
+        self._file = pq.ParquetFile(file_path)
+        self.columns = list(self._file.schema_arrow.names)
+        self.row_estimate = self._file.metadata.num_rows
+
+    def close(self):
+        if self._file is not None:
+            close = getattr(self._file, "close", None)
+            if close is not None:
+                close()
+            self._file = None
+
+    def iter_numbered_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[tuple]:
+        """逐批返回 (行号, 按列排列的数据)；行号按第 1 行为标题计算。"""
+        if self._file is None or not self.columns:
+            return
+        for record_batch in self._file.iter_batches(batch_size=batch_size):
+            row_numbers = np.arange(record_batch.num_rows, dtype=np.int64) + self.rows_read + 2
+            self.rows_read += record_batch.num_rows
+            batch = _drop_blank_rows(row_numbers, [_arrow_column_text(column) for column in record_batch.columns])
+            if batch is not None:
+                yield batch
+
+
+def _arrow_column_text(array) -> np.ndarray:
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        values = array.to_numpy(zero_copy_only=False).astype(object)
+        blank = pd.isna(values) | pd.Series(values).isin(list(NA_TEXT_VALUES)).to_numpy()
+        values[blank] = None
+        return values
+    values = np.empty(len(array), dtype=object)
+    values[:] = [cell_text(value) for value in array.to_pylist()]
+    return values
+
+
+def open_flat_file_reader(file_path: str):
+    """按扩展名返回 CSV 或 Parquet 读取器，其他格式返回 None。"""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext in CSV_EXTENSIONS:
+        return CsvSheetReader(file_path)
+    if file_ext in PARQUET_EXTENSIONS:
+        return ParquetSheetReader(file_path)
+    return None
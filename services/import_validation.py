@@ -0,0 +1,173 @@
+"""导入校验报告：一次解析收集全部问题，并可导出标注后的错误工作簿。
+
+校验时逐批按列检查日期，整表检查文件内重复人员、无法关联的明细和年度考核
+字段，每处问题记录工作表中的行号和列位置。报告不在内存中保留原始数据，
+导出错误工作簿时重新读取源文件，错误工作簿包含全部数据行，问题单元格标红，行末附“错误说明”和“原行号”，
+修正后可直接重新导入（多出的两列不会对应到任何字段）。
+"""
+
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from metadata.constants import TABLE_LABELS
+
+logger = logging.getLogger('ImportValidation')
+
+ISSUE_LABELS = {
+    "date": "日期格式无效",
+    "assessment": "年度考核字段有误",
+    "duplicate": "文件内重复人员",
+    "unresolved": "无法关联到人员基本信息",
+}
+DATE_HINT = "日期请填写类似 1990-01、1990.01、1990/01、1990年1月 的年月，或直接留空。"
+SUMMARY_LIMIT = 20
+ERROR_FILL = PatternFill(fill_type="solid", start_color="FFF4CCCC", end_color="FFF4CCCC")
+ERROR_FONT = Font(color="FFC00000")
+
+
+def _text_cell(sheet, value) -> WriteOnlyCell:
+    """原样写回单元格文本并强制为文本类型：以 = 等开头的内容不会成为公式，
+    也不加转义前缀，修正后重新导入时读到的仍是原值。"""
+    cell = WriteOnlyCell(sheet, value=value)
+    if isinstance(value, str):
+        cell.data_type = "s"
+    return cell
+
+
+@dataclass
+class ImportIssue:
+    """一处导入问题。row 为工作表中的行号，column 为从 0 开始的列位置，整行问题时为 None。"""
+
+    kind: str
+    message: str
+    row: Optional[int] = None
+    column: Optional[int] = None
+
+    @property
+    def location(self) -> str:
+        if self.row is None:
+            return "表头"
+        if self.column is None:
+            return f"第 {self.row} 行"
+        return f"第 {self.row} 行 {get_column_letter(self.column + 1)} 列"
+
+
+class ImportValidationReport:
+    """一个工作表（或 CSV/Parquet 文件）的校验结果。
+
+    record_rows 与转换后的记录一一对应，保存每条记录在工作表中的行号，
+    用于把按记录发现的问题（重复、无法关联）换算回工作表坐标。
+    source 为重新打开源工作表的函数，导出错误工作簿时从头读取其中的数据行。
+    """
+
+    def __init__(self, table_name: str, columns: Iterable[str] = (), header_row: int = 1,
+                 sheet_name: Optional[str] = None):
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.header_row = header_row
+        self.sheet_name = sheet_name or TABLE_LABELS.get(table_name, table_name)
+        self.issues: List[ImportIssue] = []
+        self.record_rows: List[int] = []
+        # 序号、姓名所在的列位置，整行问题（重复、无法关联）标红这两列
+        self.key_columns: List[int] = []
+        self.source: Optional[Callable] = None
+
+    def __bool__(self):
+        return bool(self.issues)
+
+    def add(self, kind: str, message: str, row: Optional[int] = None, column: Optional[int] = None):
+        self.issues.append(ImportIssue(kind, message, row, column))
+
+    def add_record_issue(self, kind: str, record_index: int, message: str, column: Optional[int] = None):
+        """按记录下标（从 1 开始）登记问题，行号换算为工作表行号。"""
+        row = self.record_rows[record_index - 1] if 0 < record_index <= len(self.record_rows) else None
+        self.add(kind, message, row, column)
+
+    def release_data(self):
+        """校验通过后不再需要导出错误工作簿，丢弃源工作表的引用。"""
+        self.source = None
+
+    def sorted_issues(self) -> List[ImportIssue]:
+        return sorted(
+            self.issues,
+            key=lambda issue: (issue.row or 0, -1 if issue.column is None else issue.column),
+        )
+
+    def counts(self) -> Dict[str, int]:
+        counts = Counter(issue.kind for issue in self.issues)
+        return {kind: counts[kind] for kind in ISSUE_LABELS if counts[kind]}
+
+    def summary(self, limit: int = SUMMARY_LIMIT) -> str:
+        """汇总问题：首行为按类别的计数，其后按行列顺序列出前 limit 处问题。"""
+        counts = "，".join(f"{ISSUE_LABELS[kind]} {count} 处" for kind, count in self.counts().items())
+        lines = [f"{TABLE_LABELS.get(self.table_name, self.table_name)}校验发现 {len(self.issues)} 处问题：{counts}"]
+        issues = self.sorted_issues()
+        lines.extend(f"{issue.location}：{issue.message}" for issue in issues[:limit])
+        if len(issues) > limit:
+            lines.append(f"另有 {len(issues) - limit} 处问题未列出，请导出错误清单查看")
+        if "date" in self.counts():
+            lines.append(DATE_HINT)
+        return "\n".join(lines)
+
+    def _write_sheet(self, workbook: Workbook):
+        sheet = workbook.create_sheet(self.sheet_name[:31])
+        width = len(self.columns)
+        by_row: Dict[Optional[int], List[ImportIssue]] = {}
+        for issue in self.sorted_issues():
+            by_row.setdefault(issue.row, []).append(issue)
+
+        header_issues = {issue.column for issue in by_row.get(self.header_row, []) if issue.kind == "assessment"}
+        header = []
+        for position, name in enumerate(self.columns):
+            cell = _text_cell(sheet, name)
+            cell.font = Font(bold=True)
+            if position in header_issues:
+                cell.fill = ERROR_FILL
+            header.append(cell)
+        header.append(WriteOnlyCell(sheet, value="错误说明"))
+        header.append(WriteOnlyCell(sheet, value="原行号"))
+        sheet.append(header)
+
+        if self.source is None:
+            return
+        with self.source() as reader:
+            for row_numbers, columns in reader.iter_numbered_batches():
+                for index, row_number in enumerate(row_numbers.tolist()):
+                    issues = by_row.get(row_number, ())
+                    marked = set()
+                    for issue in issues:
+                        if issue.column is not None:
+                            marked.add(issue.column)
+                        else:
+                            marked.update(self.key_columns)
+                    cells = []
+                    for position in range(width):
+                        cell = _text_cell(sheet, columns[position][index])
+                        if position in marked:
+                            cell.fill = ERROR_FILL
+                        cells.append(cell)
+                    note = WriteOnlyCell(sheet, value="；".join(issue.message for issue in issues) or None)
+                    if issues:
+                        note.font = ERROR_FONT
+                    cells.append(note)
+                    cells.append(WriteOnlyCell(sheet, value=row_number))
+                    sheet.append(cells)
+
+    def write_workbook(self, file_path: str):
+        write_validation_workbook(file_path, [self])
+
+
+def write_validation_workbook(file_path: str, reports: List[ImportValidationReport]):
+    """把一个或多个校验报告写成错误工作簿，每个报告一个工作表。"""
+    workbook = Workbook(write_only=True)
+    for report in reports:
+        report._write_sheet(workbook)
+    workbook.save(file_path)
+    logger.info(f"已导出错误清单: {file_path}，共 {sum(len(report.issues) for report in reports)} 处问题")
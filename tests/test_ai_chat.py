@@ -1110,18 +1110,14 @@ class TestAIChatDialogBehavior(unittest.TestCase):
             def get_assessment_years(self):
                 return []
 
-            def search_personnel(self, **kwargs):
+            def iter_search_personnel(self, **kwargs):
                 self.search_calls.append(dict(kwargs))
-                table_name = kwargs["table_name"]
-                return {
-                    table_name: [
-                        {
-                            "sequence": len(self.search_calls),
-                            "name": "P",
-                        }
-                    ],
-                    "total_count": 1,
-                }
+                yield [
+                    {
+                        "sequence": len(self.search_calls),
+                        "name": "P",
+                    }
+                ]
 
             def close(self):
                 self.closed_count += 1
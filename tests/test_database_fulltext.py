@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from core.database import Database
+
+
+class DatabaseFulltextSearchTests(unittest.TestCase):
+    def make_db_path(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def open_db(self):
+        db = Database(self.make_db_path())
+        self.addCleanup(db.close)
+        if not db._fulltext_enabled():
+            self.skipTest("SQLite 不支持 FTS5 trigram")
+        return db
+
+    def seed(self, db):
+        db.import_excel_data(
+            "base_info",
+            [
+                {"sequence": 1, "name": "欧阳明月", "fulltime_school": "西南政法大学", "remarks": "公诉骨干"},
+                {"sequence": 2, "name": "张三", "fulltime_school": "华东政法大学"},
+                {"sequence": 3, "name": "李四", "current_position": "第一检察部主任"},
+            ],
+        )
+        db.import_excel_data(
+            "resume",
+            [
+                {"sequence": 2, "name": "张三", "resume_text": "2010.09-2014.07 华东政法大学法学专业学习"},
+                {"sequence": 3, "name": "李四", "resume_text": "2015.01- 某区人民检察院未成年人检察科科长"},
+            ],
+        )
+
+    def search_names(self, db, **kwargs):
+        return [row["name"] for row in db.search_personnel(table_name="base_info", limit=50, **kwargs)["base_info"]]
+
+    def test_keyword_matches_base_text_and_resume_through_fts(self):
+        db = self.open_db()
+        self.seed(db)
+
+        self.assertEqual(["欧阳明月", "张三"], self.search_names(db, keyword="政法大学"))
+        self.assertEqual(["李四"], self.search_names(db, keyword="未成年人检察"))
+        self.assertEqual(["李四"], self.search_names(db, keyword="检察部 主任"))
+        self.assertEqual([], self.search_names(db, keyword="不存在的内容"))
+
+        plan = db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM resume_fts WHERE resume_fts MATCH ?",
+            ('"未成年人"',),
+        ).fetchall()
+        self.assertIn("VIRTUAL TABLE INDEX", " ".join(row["detail"] for row in plan))
+
+    def test_name_filter_uses_fts_for_long_names_and_like_for_short(self):
+        db = self.open_db()
+        self.seed(db)
+
+        self.assertEqual(["欧阳明月"], self.search_names(db, name="欧阳明"))
+        self.assertEqual(["张三"], self.search_names(db, name="张"))
+        clause, _ = db._build_personnel_search_clause(name="欧阳明")
+        self.assertIn("base_info_fts", clause[0])
+        clause, _ = db._build_personnel_search_clause(name="张三")
+        self.assertEqual("b.name LIKE ?", clause[0])
+
+    def test_fulltext_index_follows_updates_and_deletes(self):
+        db = self.open_db()
+        self.seed(db)
+
+        db.import_excel_data("base_info", [{"sequence": 2, "name": "张三", "fulltime_school": "中国人民大学"}])
+        self.assertEqual(["欧阳明月"], self.search_names(db, keyword="西南政法"))
+        self.assertEqual(["张三"], self.search_names(db, keyword="人民大学"))
+
+        db.clear_business_data()
+        self.assertEqual([], self.search_names(db, keyword="人民大学"))
+        self.assertEqual(
+            0,
+            db.conn.execute("SELECT COUNT(*) FROM resume_fts WHERE resume_fts MATCH '\"检察院\"'").fetchone()[0],
+        )
+
+    def test_like_fallback_returns_same_results_without_fts(self):
+        db = self.open_db()
+        self.seed(db)
+        expected = {
+            keyword: self.search_names(db, keyword=keyword)
+            for keyword in ("政法大学", "未成年人检察", "骨干")
+        }
+
+        with patch.object(Database, "_fulltext_enabled", return_value=False):
+            for keyword, names in expected.items():
+                self.assertEqual(names, self.search_names(db, keyword=keyword), keyword)
+
+    def test_keyword_filters_related_tables(self):
+        db = self.open_db()
+        self.seed(db)
+
+        results = db.search_personnel(table_name="resume", keyword="华东政法")
+
+        self.assertEqual(["张三"], [row["name"] for row in results["resume"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
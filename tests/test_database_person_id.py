@@ -1,13 +1,18 @@
+import codecs
+import json
 import os
 import sqlite3
 import tempfile
 import unittest
+from unittest.mock import patch
 
 import openpyxl
 import pandas as pd
 
 from core.database import Database
-from services.excel_export import export_table_data
+from core.result_set import ResultSet
+from services import excel_export
+from services.excel_export import export_all_tables, export_table_batches, export_table_data
 
 
 class DatabasePersonIdTests(unittest.TestCase):
@@ -167,6 +172,150 @@ class DatabasePersonIdTests(unittest.TestCase):
         self.assertEqual("mother", results["family"][0]["relation"])
         self.assertEqual("P1", results["family"][0]["name"])
 
+    def test_count_search_personnel_shares_the_page_query_count_cache(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "P1"}, {"sequence": 2, "name": "P2"}])
+        db.import_excel_data("family", [{"sequence": 1, "name": "P1", "relation": "father", "family_name": "F1"}])
+
+        self.assertEqual(1, db.count_search_personnel("family", name="P1"))
+        with patch.object(db, "_count_search_rows", side_effect=AssertionError("count re-run")):
+            results = db.search_personnel(name="P1", table_name="family", limit=10, offset=0)
+
+        self.assertEqual(1, results["total_count"])
+        self.assertEqual(2, db.count_search_personnel())
+
+    def test_iter_search_personnel_streams_batches_matching_search(self):
+        db = self.open_db()
+        db.import_excel_data(
+            "base_info",
+            [{"sequence": index, "name": f"P{index}", "current_grade": "一级" if index % 2 else "二级"} for index in range(1, 12)],
+        )
+        db.import_excel_data(
+            "family",
+            [{"sequence": index, "name": f"P{index}", "relation": "father", "family_name": f"F{index}"} for index in range(1, 12)],
+        )
+
+        for table_name in ("base_info", "family"):
+            batches = list(db.iter_search_personnel(table_name, batch_size=4, grades=["一级"]))
+            expected = db.search_personnel(table_name=table_name, grades=["一级"])[table_name]
+
+            self.assertEqual([4, 2], [len(batch) for batch in batches])
+            self.assertTrue(all(isinstance(batch, ResultSet) for batch in batches))
+            self.assertEqual(expected, [row for batch in batches for row in batch])
+
+        all_rows = [row for batch in db.iter_all_data("family", batch_size=5) for row in batch]
+        self.assertEqual(db.get_all_data("family"), all_rows)
+        self.assertEqual(11, len(all_rows))
+
+    def test_unpaginated_search_reads_related_rows_for_large_rosters(self):
+        db = self.open_db()
+        person_count = 1200
+        db.import_excel_data("base_info", [{"sequence": index, "name": f"P{index}"} for index in range(1, person_count + 1)])
+        db.import_excel_data(
+            "rewards",
+            [{"sequence": index, "name": f"P{index}", "reward_name": "优秀"} for index in range(1, person_count + 1)],
+        )
+
+        results = db.search_personnel()
+
+        self.assertEqual(person_count, results["total_count"])
+        self.assertEqual(person_count, len(results["rewards"]))
+        self.assertEqual([], results["family"])
+
+    def test_search_personnel_offset_pages_match_keyset_pages(self):
+        db = self.open_db()
+        db.import_excel_data(
+            "base_info",
+            [{"sequence": index, "name": f"P{index}", "current_grade": "一级" if index % 3 else "二级"} for index in range(1, 24)],
+        )
+        db.import_excel_data(
+            "family",
+            [
+                {"sequence": index, "name": f"P{index}", "relation": f"R{member}"}
+                for index in range(23, 0, -1)
+                for member in range(2)
+            ],
+        )
+
+        for table_name, key_of in (
+            ("base_info", lambda row: row["id"]),
+            ("family", lambda row: (row["person_id"], row["id"])),
+        ):
+            expected = db.search_personnel(table_name=table_name, grades=["一级"])[table_name]
+            offset_pages = []
+            keyset_pages = []
+            after_key = None
+            for page in range(8):
+                offset_pages.extend(
+                    db.search_personnel(table_name=table_name, grades=["一级"], limit=5, offset=page * 5)[table_name]
+                )
+                rows = db.search_personnel(table_name=table_name, grades=["一级"], limit=5, after_key=after_key)[table_name]
+                keyset_pages.extend(rows)
+                if rows:
+                    after_key = key_of(rows[-1])
+
+            self.assertEqual(expected, offset_pages, table_name)
+            self.assertEqual(expected, keyset_pages, table_name)
+            fresh_db = Database(db.conn.execute("PRAGMA database_list").fetchone()["file"], open_existing=True)
+            try:
+                for page in (5, 4, 2, 3, 1, 6, 5):
+                    self.assertEqual(
+                        expected[(page - 1) * 5:page * 5],
+                        fresh_db.search_personnel(
+                            table_name=table_name,
+                            grades=["一级"],
+                            limit=5,
+                            offset=(page - 1) * 5,
+                        )[table_name],
+                        (table_name, page),
+                    )
+            finally:
+                fresh_db.close()
+            self.assertEqual(
+                expected[7:12],
+                db.search_personnel(table_name=table_name, grades=["一级"], limit=5, offset=7)[table_name],
+            )
+            self.assertEqual([], db.search_personnel(table_name=table_name, limit=5, offset=500)[table_name])
+
+    def test_search_page_past_the_end_scans_once_and_keeps_columns(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": index, "name": f"P{index}"} for index in range(1, 8)])
+        columns = db.search_personnel(table_name="base_info", limit=5)["base_info"].columns
+        statements = []
+        db.conn.set_trace_callback(statements.append)
+
+        rows = db.search_personnel(table_name="base_info", limit=5, offset=500)["base_info"]
+
+        db.conn.set_trace_callback(None)
+        self.assertEqual([], list(rows))
+        self.assertEqual(columns, rows.columns)
+        self.assertEqual(1, sum("OFFSET" in statement for statement in statements))
+
+    def test_search_personnel_caches_count_until_data_changes(self):
+        path = self.make_db_path()
+        db = Database(path)
+        self.addCleanup(db.close)
+        db.import_excel_data("base_info", [{"sequence": index, "name": f"P{index}"} for index in range(1, 8)])
+
+        with patch.object(Database, "_count_search_rows", wraps=db._count_search_rows) as count_rows:
+            self.assertEqual(7, db.search_personnel(table_name="base_info", limit=2, offset=0)["total_count"])
+            db.search_personnel(table_name="base_info", limit=2, offset=4)
+            self.assertEqual(1, count_rows.call_count)
+
+            db.import_excel_data("base_info", [{"sequence": 8, "name": "P8"}])
+            self.assertEqual(8, db.search_personnel(table_name="base_info", limit=2)["total_count"])
+            self.assertEqual(2, count_rows.call_count)
+
+            other = Database(path, open_existing=True)
+            try:
+                other.import_excel_data("base_info", [{"sequence": 9, "name": "P9"}])
+            finally:
+                other.close()
+            results = db.search_personnel(table_name="base_info", limit=2, offset=8)
+            self.assertEqual(9, results["total_count"])
+            self.assertEqual(["P9"], [row["name"] for row in results["base_info"]])
+            self.assertEqual(3, count_rows.call_count)
+
     def test_base_info_import_normalizes_birth_date_month(self):
         db = self.open_db()
         db.import_excel_data(
@@ -223,6 +372,130 @@ class DatabasePersonIdTests(unittest.TestCase):
 
         self.assertEqual([], db.get_all_data("family"))
 
+    def test_related_import_reports_every_unresolved_row_in_order(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+
+        rows = [
+            {"sequence": 1, "name": "张三", "relation": "父亲"},
+            {"sequence": 2, "name": "张三", "relation": "母亲"},
+            {"person_id": "abc", "relation": "配偶"},
+            {"person_id": 999, "relation": "子女"},
+            {"sequence": 3, "name": "", "relation": "兄弟"},
+        ]
+        with self.assertRaises(ValueError) as context:
+            db.import_excel_data("family", rows)
+
+        self.assertEqual(
+            "family 导入失败，存在无法关联到 base_info 的人员: "
+            "第 2 行 序号=2 姓名=张三: 未找到匹配人员: 序号=2, 姓名=张三; "
+            "第 3 行 序号=空 姓名=空: person_id 无效: abc; "
+            "第 4 行 序号=空 姓名=空: person_id 不存在: 999; "
+            "第 5 行 序号=空 姓名=空: 缺少姓名",
+            str(context.exception),
+        )
+        self.assertEqual([], db.get_all_data("family"))
+        self.assertFalse(db.conn.in_transaction)
+        self.assertIsNone(
+            db.conn.execute("SELECT name FROM sqlite_temp_master WHERE name='related_import_stage'").fetchone()
+        )
+
+    def test_related_staging_keeps_callers_open_transaction(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+
+        db.conn.execute("UPDATE base_info SET current_grade='未提交' WHERE name='张三'")
+        with db.savepoint("outer"):
+            db.conn.execute("INSERT INTO base_info (sequence, name) VALUES ('2', '李四')")
+            unresolved, person_ids, _, keep = db.plan_related_import(
+                "family", [{"sequence": 1, "name": "张三", "relation": "父亲"}]
+            )
+            self.assertTrue(db.conn.in_transaction)
+        self.assertTrue(db.conn.in_transaction)
+        db.conn.commit()
+
+        self.assertEqual([], unresolved)
+        self.assertEqual([True], keep)
+        rows = {row["name"]: row["current_grade"] for row in db.get_all_data("base_info")}
+        self.assertEqual({"张三": "未提交", "李四": None}, rows)
+        self.assertIsNone(
+            db.conn.execute("SELECT name FROM sqlite_temp_master WHERE name='related_import_stage'").fetchone()
+        )
+
+    def test_import_related_rows_skips_batch_and_existing_duplicates(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"}])
+
+        inserted, skipped = db.import_related_rows(
+            "family",
+            [
+                {"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"},
+                {"sequence": 2, "name": "李四", "relation": "父亲", "family_name": "张父"},
+                {"sequence": "2.0", "name": "李四", "relation": "父亲", "family_name": "张父"},
+                {"sequence": 1, "name": "张三", "relation": "母亲", "family_name": "张母"},
+            ],
+        )
+
+        self.assertEqual((2, 2), (inserted, skipped))
+        rows = [(row["name"], row["relation"]) for row in db.get_all_data("family")]
+        self.assertEqual([("张三", "父亲"), ("李四", "父亲"), ("张三", "母亲")], rows)
+
+    def test_related_import_stores_content_hash_with_lookup_index(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+        db.import_excel_data(
+            "family",
+            [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父", "content_hash": "x"}],
+        )
+
+        stored_hash = db.conn.execute("SELECT content_hash FROM family").fetchone()[0]
+        self.assertEqual(
+            Database._related_content_hash("family", {"relation": "父亲", "family_name": "张父", "work_unit": None}),
+            stored_hash,
+        )
+        self.assertNotIn("content_hash", db.get_all_data("family")[0])
+        plan = db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT 1 FROM family WHERE person_id=? AND content_hash=?",
+            (1, stored_hash),
+        ).fetchall()
+        self.assertIn("idx_family_person_content", " ".join(row["detail"] for row in plan))
+
+    def test_migration_backfills_related_content_hash(self):
+        path = self.make_db_path()
+        db = Database(path)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+        db.conn.execute("INSERT INTO rewards(person_id, reward_name) VALUES (1, '优秀')")
+        db.conn.execute("PRAGMA user_version = 2")
+        db.conn.commit()
+        db.close()
+
+        db = Database(path)
+        self.addCleanup(db.close)
+
+        self.assertEqual(
+            Database._related_content_hash("rewards", {"reward_name": "优秀"}),
+            db.conn.execute("SELECT content_hash FROM rewards").fetchone()[0],
+        )
+        self.assertEqual((0, 1), db.import_related_rows("rewards", [{"sequence": 1, "name": "张三", "reward_name": "优秀"}]))
+
+    def test_find_duplicate_person_keys_for_related_rows(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.import_excel_data("rewards", [{"sequence": 2, "name": "李四", "reward_name": "优秀"}])
+
+        duplicates = db.find_duplicate_person_keys(
+            "rewards",
+            [
+                {"序号": 1, "姓名": "张三", "奖励名称": "嘉奖"},
+                {"序号": 2, "姓名": "李四", "奖励名称": "优秀"},
+                {"序号": 1, "姓名": "张三", "奖励名称": "嘉奖"},
+                {"序号": 9, "姓名": "不存在", "奖励名称": "嘉奖"},
+            ],
+        )
+
+        self.assertEqual([("2", "李四"), ("1", "张三")], duplicates)
+
     def test_related_import_skips_rows_without_business_fields(self):
         db = self.open_db()
         db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
@@ -347,6 +620,174 @@ class DatabasePersonIdTests(unittest.TestCase):
         self.assertEqual("二级", base_row["current_grade"])
         self.assertEqual(original_id, db.search_personnel()["rewards"][0]["person_id"])
 
+    def test_base_info_bulk_upsert_updates_existing_and_inserts_new_in_order(self):
+        db = self.open_db()
+        db.import_excel_data(
+            "base_info",
+            [
+                {"sequence": 1, "name": "张三", "current_grade": "一级"},
+                {"sequence": "2.0", "name": "李四", "current_grade": "一级"},
+            ],
+        )
+        ids = {row["name"]: row["id"] for row in db.get_all_data("base_info")}
+
+        db.import_excel_data(
+            "base_info",
+            [
+                {"sequence": "3", "name": "王五", "current_grade": "三级"},
+                {"sequence": 2, "name": " 李四 ", "current_grade": "二级"},
+                {"sequence": 4, "name": "赵六"},
+                {"sequence": "1", "name": "张三", "gender": "男"},
+            ],
+        )
+
+        rows = db.get_all_data("base_info")
+        self.assertEqual(["张三", "李四", "王五", "赵六"], [row["name"] for row in rows])
+        self.assertEqual(ids["张三"], rows[0]["id"])
+        self.assertEqual(ids["李四"], rows[1]["id"])
+        self.assertEqual("一级", rows[0]["current_grade"])
+        self.assertEqual("男", rows[0]["gender"])
+        self.assertEqual("二级", rows[1]["current_grade"])
+        self.assertLess(rows[2]["id"], rows[3]["id"])
+
+    def test_base_info_reimport_writes_only_new_and_changed_fingerprints(self):
+        db = self.open_db()
+        rows = [
+            {"sequence": 1, "name": "张三", "current_grade": "一级"},
+            {"sequence": 2, "name": "李四", "current_grade": "一级"},
+        ]
+        db.import_excel_data("base_info", rows)
+        fingerprints = [row[0] for row in db.conn.execute("SELECT content_hash FROM base_info ORDER BY id")]
+        self.assertTrue(all(fingerprints))
+
+        normalized = db._normalize_import_rows(
+            "base_info",
+            [
+                {"sequence": 1, "name": "张三", "current_grade": "一级"},
+                {"sequence": 2, "name": "李四", "current_grade": "二级"},
+                {"sequence": 3, "name": "王五"},
+            ],
+        )
+        person_ids, _fingerprints, keep, duplicate_samples = db.plan_base_info_import(normalized)
+
+        self.assertEqual([], duplicate_samples)
+        self.assertEqual([False, True, True], keep)
+        self.assertIsNone(person_ids[2])
+        version = db.get_change_version()
+        self.assertEqual(2, db.write_base_info_rows(normalized, person_ids, _fingerprints, keep))
+        # 指纹未变化的张三不产生任何写入
+        self.assertEqual(
+            [(person_ids[1], "update"), (person_ids[1] + 1, "insert")],
+            [(change["row_id"], change["op"]) for change in db.changes_since(version)],
+        )
+        grades = {row["name"]: row["current_grade"] for row in db.get_all_data("base_info")}
+        self.assertEqual({"张三": "一级", "李四": "二级", "王五": None}, grades)
+        self.assertEqual(
+            fingerprints[0],
+            db.conn.execute("SELECT content_hash FROM base_info WHERE name='张三'").fetchone()[0],
+        )
+
+    def test_base_info_import_maintains_unique_person_key(self):
+        db = self.open_db()
+        db.import_excel_data(
+            "base_info",
+            [
+                {"sequence": "1.0", "name": " 张三 ", "person_key": "forged"},
+                {"sequence": None, "name": "李四"},
+            ],
+        )
+
+        keys = [row[0] for row in db.conn.execute("SELECT person_key FROM base_info ORDER BY id")]
+        self.assertEqual(["1\x1f张三", "\x1f李四"], keys)
+        index_rows = db.conn.execute("PRAGMA index_list(base_info)").fetchall()
+        person_key_index = [row for row in index_rows if row["name"] == "idx_base_info_person_key"]
+        self.assertEqual(1, person_key_index[0]["unique"])
+        with self.assertRaises(sqlite3.IntegrityError):
+            db.conn.execute("INSERT INTO base_info(name, person_key) VALUES ('张三', '1\x1f张三')")
+
+    def test_person_lookup_uses_person_key_index(self):
+        db = self.open_db()
+        plan = db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM base_info WHERE person_key=?",
+            ("1\x1f张三",),
+        ).fetchall()
+
+        self.assertIn("idx_base_info_person_key", " ".join(row["detail"] for row in plan))
+
+    def test_migration_backfills_person_key_for_legacy_base_info(self):
+        path = self.make_db_path()
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE base_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT NOT NULL
+            );
+            INSERT INTO base_info(sequence, name) VALUES ('2.0', ' 李四');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        self.addCleanup(db.close)
+
+        self.assertEqual("2\x1f李四", db.conn.execute("SELECT person_key FROM base_info").fetchone()[0])
+        db.import_excel_data("rewards", [{"sequence": 2, "name": "李四", "reward_name": "优秀"}])
+        self.assertEqual(1, len(db.get_all_data("rewards")))
+
+    def test_migration_opens_legacy_database_with_duplicate_person_keys(self):
+        path = self.make_db_path()
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE base_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT NOT NULL
+            );
+            INSERT INTO base_info(sequence, name) VALUES (1, '张三');
+            INSERT INTO base_info(sequence, name) VALUES (2, '李四');
+            INSERT INTO base_info(sequence, name) VALUES ('1.0', '张三 ');
+            CREATE TABLE rewards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT,
+                reward_name TEXT
+            );
+            INSERT INTO rewards(sequence, name, reward_name) VALUES (1, '张三', '优秀');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        with self.assertLogs("Database", level="WARNING") as logs:
+            db = Database(path)
+        self.addCleanup(db.close)
+
+        self.assertIn("ids=1,3", "\n".join(logs.output))
+        keys = db.conn.execute("SELECT id, person_key FROM base_info ORDER BY id").fetchall()
+        self.assertEqual([(1, "1\x1f张三"), (2, "2\x1f李四"), (3, None)], [tuple(row) for row in keys])
+        self.assertEqual([1], [row[0] for row in db.conn.execute("SELECT person_id FROM rewards")])
+        db.close()
+
+        reopened = Database(path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(3, len(reopened.get_all_data("base_info")))
+
+    def test_find_duplicate_person_keys_uses_key_map_without_full_table_read(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+
+        with patch.object(Database, "get_all_data", side_effect=AssertionError("full table read")):
+            duplicates = db.find_duplicate_person_keys(
+                "base_info",
+                [{"序号": "1.0", "姓名": "张三"}, {"序号": 2, "姓名": "李四"}],
+            )
+
+        self.assertEqual([("1", "张三")], duplicates)
+
     def test_export_hides_internal_person_id(self):
         path = self.make_db_path() + ".xlsx"
         self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
@@ -362,6 +803,312 @@ class DatabasePersonIdTests(unittest.TestCase):
         self.assertNotIn("person_id", columns)
         self.assertEqual(["序号", "姓名", "奖励名称"], columns)
 
+    def test_export_accepts_result_set_from_search(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三", "birth_date": "1990.01"}])
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        rows = db.search_personnel(table_name="base_info")["base_info"]
+        self.assertIsInstance(rows, ResultSet)
+        self.assertEqual(1, export_table_data(rows, path, "base_info"))
+
+        exported = pd.read_excel(path, dtype=str)
+        self.assertEqual("张三", exported.iloc[0]["姓名"])
+        self.assertEqual("1990.01", exported.iloc[0]["出生年月"])
+        self.assertNotIn("person_key", exported.columns)
+
+    def test_export_streams_search_batches_into_one_sheet(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": index, "name": f"人员{index}"} for index in range(1, 6)])
+        db.import_excel_data(
+            "family",
+            [
+                {"sequence": index, "name": f"人员{index}", "relation": "父亲", "birth_date": "1950.3"}
+                for index in range(1, 6)
+            ],
+        )
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        count = export_table_batches(db.iter_search_personnel("family", batch_size=2), path, "family")
+
+        self.assertEqual(5, count)
+        exported = pd.read_excel(path, dtype=str)
+        self.assertEqual(["序号", "姓名", "称谓", "家庭成员姓名", "出生日期"], list(exported.columns[:5]))
+        self.assertEqual([f"人员{index}" for index in range(1, 6)], list(exported["姓名"]))
+        self.assertEqual(["1950.3"] * 5, list(exported["出生日期"]))
+        with self.assertRaisesRegex(ValueError, "没有可导出的数据"):
+            export_table_batches(iter([[]]), path, "family")
+
+    def test_xlsx_export_writes_bold_header_and_plain_text_cells(self):
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        rows = [
+            {"sequence": 1, "name": "控制\x01字符", "relation": "=1+1", "family_name": "A&B<1>"},
+            {"sequence": 2, "name": "李四", "relation": "母亲", "family_name": None},
+        ]
+
+        self.assertEqual(2, export_table_batches([rows[:1], rows[1:]], path, "family"))
+
+        sheet = openpyxl.load_workbook(path)["人员家庭成员信息"]
+        self.assertTrue(sheet["A1"].font.b)
+        self.assertFalse(sheet["A2"].font.b)
+        self.assertEqual([1, "控制字符", "'=1+1", "A&B<1>"], [cell.value for cell in sheet[2]][:4])
+        self.assertEqual(3, sheet.max_row)
+
+    def test_export_all_tables_writes_one_snapshot_per_sheet(self):
+        db_path = self.make_db_path()
+        db = Database(db_path)
+        self.addCleanup(db.close)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.import_excel_data(
+            "family",
+            [{"sequence": 1, "name": "张三", "relation": "父亲"}, {"sequence": 2, "name": "李四", "relation": "母亲"}],
+        )
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        writer = Database(db_path)
+        self.addCleanup(writer.close)
+        progress = []
+
+        def report_progress(info):
+            progress.append((info["table"], info["index"], info["total"]))
+            if info["table"] == "family" and info["rows"] == 0:
+                # 导出进行中另一连接提交的数据不出现在本次导出中
+                writer.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "配偶"}])
+
+        counts = export_all_tables(db, path, ["base_info", "family", "resume"], report_progress, name="张三")
+
+        self.assertEqual({"base_info": 1, "family": 1, "resume": 0}, counts)
+        self.assertEqual(
+            [("base_info", 1, 3), ("family", 2, 3), ("resume", 3, 3)],
+            list(dict.fromkeys(progress)),
+        )
+        sheets = pd.read_excel(path, sheet_name=None, dtype=str)
+        self.assertEqual(["人员基本信息", "人员家庭成员信息", "人员简历信息"], list(sheets))
+        self.assertEqual(["父亲"], list(sheets["人员家庭成员信息"]["称谓"]))
+        self.assertTrue(sheets["人员简历信息"].empty)
+        self.assertIn("姓名", sheets["人员简历信息"].columns)
+        self.assertEqual(3, len(writer.get_all_data("family")))
+
+    def test_change_log_keeps_last_change_per_row_with_increasing_versions(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲"}])
+        start = db.get_change_version()
+        person_ids = {row["name"]: row["id"] for row in db.get_all_data("base_info")}
+
+        # 长度不变的修改也会推进版本号
+        db.conn.execute("UPDATE base_info SET current_grade='一级' WHERE name='张三'")
+        db.conn.execute("UPDATE base_info SET current_grade='二级' WHERE name='张三'")
+        db.conn.execute("DELETE FROM base_info WHERE name='李四'")
+        db.conn.commit()
+
+        changes = db.changes_since(start)
+        self.assertEqual(
+            [("base_info", person_ids["张三"], "update"), ("base_info", person_ids["李四"], "delete")],
+            [(change["table_name"], change["row_id"], change["op"]) for change in changes],
+        )
+        versions = [change["version"] for change in changes]
+        self.assertEqual(sorted(versions), versions)
+        self.assertGreater(versions[0], start)
+        self.assertEqual(versions[-1], db.get_change_version())
+        self.assertEqual(1, len(db.changes_since(0, "family")))
+        self.assertEqual([], list(db.changes_since(db.get_change_version())))
+
+    def test_change_log_migration_records_existing_rows(self):
+        path = self.make_db_path()
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE base_info (id INTEGER PRIMARY KEY AUTOINCREMENT, sequence INTEGER, name TEXT NOT NULL);
+            INSERT INTO base_info(sequence, name) VALUES (1, 'A');
+            INSERT INTO base_info(sequence, name) VALUES (2, 'B');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        self.addCleanup(db.close)
+
+        self.assertEqual(
+            [("base_info", 1, "insert"), ("base_info", 2, "insert")],
+            [(change["table_name"], change["row_id"], change["op"]) for change in db.changes_since(0, "base_info")],
+        )
+
+    def test_rerunning_migrations_writes_no_change_log_rows(self):
+        db_path = self.make_db_path()
+        db = Database(db_path)
+        db.import_excel_data(
+            "base_info",
+            [
+                {"sequence": 1, "name": "张三", "current_grade": "一级高级检察官", "birth_date": "1980.01",
+                 "fulltime_education": "大学本科 法学学士", "current_position": "副检察长"},
+                {"sequence": 2, "name": "李四"},
+            ],
+        )
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲", "birth_date": "1950.02"}])
+        version = db.get_change_version()
+        db.conn.execute("PRAGMA user_version = 6")
+        db.conn.commit()
+        db.close()
+
+        db = Database(db_path)
+        self.addCleanup(db.close)
+
+        self.assertTrue(db.schema_is_current())
+        self.assertEqual([], list(db.changes_since(version)))
+
+    def test_import_snapshot_detects_updates_that_keep_row_count_and_ids(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三", "current_grade": "原始"}])
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲"}])
+        db.set_import_file_hash("family", "hash")
+        snapshot = db.import_snapshot("family")
+        self.assertEqual("hash", db.get_import_file_hash("family"))
+
+        db.conn.execute("UPDATE base_info SET current_grade='修改' WHERE name='张三'")
+        db.conn.commit()
+
+        self.assertNotEqual(snapshot, db.import_snapshot("family"))
+        self.assertIsNone(db.get_import_file_hash("family"))
+
+        db.set_import_file_hash("family", "hash")
+        snapshot = db.import_snapshot("base_info")
+        db.conn.execute("UPDATE family SET relation='母亲'")
+        db.conn.commit()
+
+        self.assertEqual(snapshot, db.import_snapshot("base_info"))
+        self.assertIsNone(db.get_import_file_hash("family"))
+
+    def test_export_changed_tables_writes_only_rows_changed_since_last_delta(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.import_excel_data(
+            "family",
+            [{"sequence": 1, "name": "张三", "relation": "父亲"}, {"sequence": 2, "name": "李四", "relation": "母亲"}],
+        )
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        self.assertEqual({"base_info": 2, "family": 2}, excel_export.export_changed_tables(db, path, ["base_info", "family"]))
+        with self.assertRaisesRegex(ValueError, "没有变化"):
+            excel_export.export_changed_tables(db, path, ["base_info", "family"])
+
+        db.import_excel_data("base_info", [{"sequence": 2, "name": "李四", "current_grade": "一级"}])
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "配偶"}])
+        counts = excel_export.export_changed_tables(db, path, ["base_info", "family"])
+
+        self.assertEqual({"base_info": 1, "family": 1}, counts)
+        sheets = pd.read_excel(path, sheet_name=None, dtype=str)
+        self.assertEqual(["李四"], list(sheets["人员基本信息"]["姓名"]))
+        self.assertEqual(["配偶"], list(sheets["人员家庭成员信息"]["称谓"]))
+        self.assertEqual(db.get_change_version(), db.get_delta_export_version("family"))
+        self.assertEqual(0, db.get_delta_export_version("resume"))
+
+    def test_delta_export_of_some_tables_keeps_other_tables_pending(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲"}])
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        # 只有基本信息权限的用户导出后，家庭成员的变化仍留给下一次包含该表的增量导出
+        self.assertEqual({"base_info": 1}, excel_export.export_changed_tables(db, path, ["base_info"]))
+        counts = excel_export.export_changed_tables(db, path, ["base_info", "family"])
+
+        self.assertEqual({"base_info": 0, "family": 1}, counts)
+
+        # 只有无权导出的表变化时，仍提示没有变化
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "母亲"}])
+        with self.assertRaisesRegex(ValueError, "没有变化"):
+            excel_export.export_changed_tables(db, path, ["base_info"])
+        self.assertEqual(db.get_change_version(), db.get_table_change_version("family"))
+
+    def test_delta_export_after_deletions_only_moves_the_start_version(self):
+        db = self.open_db()
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}])
+        db.import_excel_data(
+            "family",
+            [{"sequence": 1, "name": "张三", "relation": "父亲"}, {"sequence": 1, "name": "张三", "relation": "母亲"}],
+        )
+        path = self.make_db_path() + ".xlsx"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        excel_export.export_changed_tables(db, path, ["base_info", "family"])
+
+        db.conn.execute("DELETE FROM family WHERE relation='父亲'")
+        db.conn.commit()
+        with self.assertRaisesRegex(ValueError, "只有记录被删除"):
+            excel_export.export_changed_tables(db, path, ["base_info", "family"])
+        self.assertEqual(db.get_change_version(), db.get_delta_export_version("family"))
+        with self.assertRaisesRegex(ValueError, "没有变化"):
+            excel_export.export_changed_tables(db, path, ["base_info", "family"])
+
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "配偶"}])
+        self.assertEqual({"base_info": 0, "family": 1}, excel_export.export_changed_tables(db, path, ["base_info", "family"]))
+
+    def export_rows_for_formats(self):
+        return [
+            {"id": 1, "sequence": 1, "name": "=张三", "reward_date": "2024-01", "reward_date_display": "2024.01"},
+            {"id": 2, "sequence": 2, "name": "李四", "reward_date": "2023-05", "reward_date_display": None},
+        ]
+
+    def test_export_csv_and_json_lines_share_xlsx_columns(self):
+        rows = self.export_rows_for_formats()
+        csv_path = self.make_db_path() + ".csv"
+        jsonl_path = self.make_db_path() + ".jsonl"
+        for path in (csv_path, jsonl_path):
+            self.addCleanup(lambda path=path: os.path.exists(path) and os.remove(path))
+
+        self.assertEqual(2, export_table_batches([rows[:1], rows[1:]], csv_path, "rewards"))
+        self.assertEqual(2, export_table_batches([rows], jsonl_path, "rewards"))
+
+        with open(csv_path, "rb") as stream:
+            self.assertTrue(stream.read().startswith(codecs.BOM_UTF8))
+        exported = pd.read_csv(csv_path, encoding="utf-8-sig", dtype=str)
+        self.assertEqual(["序号", "姓名", "奖励批准日期"], list(exported.columns))
+        self.assertEqual(["'=张三", "李四"], list(exported["姓名"]))
+        self.assertEqual(["2024.01", "2023-05"], list(exported["奖励批准日期"]))
+        with open(jsonl_path, encoding="utf-8") as stream:
+            records = [json.loads(line) for line in stream]
+        self.assertEqual(
+            [
+                {"序号": 1, "姓名": "=张三", "奖励批准日期": "2024.01"},
+                {"序号": 2, "姓名": "李四", "奖励批准日期": "2023-05"},
+            ],
+            records,
+        )
+
+    def test_export_flat_formats_remove_partial_file_without_rows(self):
+        path = self.make_db_path() + ".csv"
+
+        with self.assertRaisesRegex(ValueError, "没有可导出的数据"):
+            export_table_batches(iter([[]]), path, "rewards")
+
+        self.assertFalse(os.path.exists(path))
+
+    @unittest.skipIf(excel_export.pq is not None, "已安装 pyarrow")
+    def test_export_parquet_without_pyarrow_reports_missing_dependency(self):
+        path = self.make_db_path() + ".parquet"
+
+        with self.assertRaisesRegex(ImportError, "pyarrow"):
+            export_table_batches([self.export_rows_for_formats()], path, "rewards")
+
+        self.assertFalse(os.path.exists(path))
+
+    @unittest.skipIf(excel_export.pq is None, "未安装 pyarrow")
+    def test_export_parquet_writes_text_columns(self):
+        path = self.make_db_path() + ".parquet"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        export_table_batches([self.export_rows_for_formats()], path, "rewards")
+
+        exported = pd.read_parquet(path)
+        self.assertEqual(["序号", "姓名", "奖励批准日期"], list(exported.columns))
+        self.assertEqual(["1", "=张三", "2024.01"], list(exported.iloc[0]))
+
     def test_export_uses_date_display_and_hides_display_columns(self):
         path = self.make_db_path() + ".xlsx"
         self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
@@ -455,6 +1202,44 @@ class DatabasePersonIdTests(unittest.TestCase):
         self.assertIn("'=already_text", values)
         self.assertTrue(all(data_type != "f" for data_type in data_types))
 
+    def test_column_escaping_matches_cell_escaping(self):
+        texts = ["=1", " =1", "\t+2", "　-3", "'=x", "@a", "a=b", "", " ", "\x00=b", "a\x00=b", "\x1c@", "普通文本"]
+        columns = [
+            texts + [None],
+            texts + [None, 0, 1.5, float("nan"), True],
+            [None, None],
+            [1, 2, None],
+            [],
+        ]
+
+        for column in columns:
+            with self.subTest(column=column):
+                expected = [excel_export.escape_excel_formula(value) for value in column]
+                escaped = excel_export.escape_excel_formula_column(tuple(column))
+                self.assertEqual([type(value) for value in expected], [type(value) for value in escaped])
+                self.assertEqual(repr(expected), repr(escaped))
+
+        df = pd.DataFrame({"text": ["=1", None, "x"], "number": [1, 2, 3], "category": pd.Categorical(["-1", "a", "-1"])})
+        pd.testing.assert_frame_equal(
+            df.apply(lambda column: column.map(excel_export.escape_excel_formula)),
+            excel_export.escape_excel_formulas(df),
+        )
+
+    def test_export_rows_lay_display_values_over_date_fields(self):
+        rows = [
+            ("1980-01", "1980.01", "=x"),
+            ("1981-02", "", "y"),
+            ("1982-03", None, None),
+            (None, "1983.04", "-1"),
+        ]
+
+        exported = excel_export._export_rows(rows, [0, 2], [(0, 1)])
+
+        self.assertEqual(
+            [("1980.01", "'=x"), ("1981-02", "y"), ("1982-03", None), ("1983.04", "'-1")],
+            exported,
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from core.database import SCHEMA_VERSION, Database
+
+
+class DatabaseSchemaVersionTests(unittest.TestCase):
+    def make_db_path(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def test_new_database_records_schema_version(self):
+        db = Database(self.make_db_path())
+        self.addCleanup(db.close)
+
+        self.assertEqual(SCHEMA_VERSION, db.get_schema_version())
+        self.assertTrue(db.schema_is_current())
+
+    def test_reopening_current_schema_skips_migrations(self):
+        path = self.make_db_path()
+        Database(path).close()
+
+        with patch.object(Database, "_migrate_date_display_columns") as migrate_dates, \
+                patch.object(Database, "_migrate_related_tables") as migrate_related, \
+                patch.object(Database, "_create_indexes") as create_indexes:
+            db = Database(path)
+            db.close()
+
+        migrate_dates.assert_not_called()
+        migrate_related.assert_not_called()
+        create_indexes.assert_not_called()
+
+    def test_open_existing_skips_ddl_when_schema_is_current(self):
+        path = self.make_db_path()
+        Database(path).close()
+
+        with patch.object(Database, "create_tables") as create_tables:
+            db = Database(path, open_existing=True)
+            self.addCleanup(db.close)
+
+        create_tables.assert_not_called()
+        self.assertEqual(SCHEMA_VERSION, db.get_schema_version())
+
+    def test_open_existing_migrates_outdated_schema_once(self):
+        path = self.make_db_path()
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE base_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT NOT NULL,
+                birth_date TEXT
+            );
+            INSERT INTO base_info(sequence, name, birth_date) VALUES (1, 'A', '1990.01');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(path, open_existing=True)
+        self.addCleanup(db.close)
+
+        self.assertEqual(SCHEMA_VERSION, db.get_schema_version())
+        row = db.get_all_data("base_info")[0]
+        self.assertEqual("1990-01", row["birth_date"])
+        self.assertEqual("1990.01", row["birth_date_display"])
+
+    def test_failed_migration_keeps_old_schema_version(self):
+        path = self.make_db_path()
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE base_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT NOT NULL
+            );
+            CREATE TABLE rewards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT NOT NULL,
+                reward_name TEXT
+            );
+            INSERT INTO rewards(sequence, name, reward_name) VALUES (2, '李四', '优秀');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            Database(path)
+
+        conn = sqlite3.connect(path)
+        try:
+            self.assertEqual(0, conn.execute("PRAGMA user_version").fetchone()[0])
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
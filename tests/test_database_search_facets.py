@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from core.database import FACET_MAPPING_HASH, FACET_MAPPING_HASH_KEY, Database
+from metadata.query_options import EDUCATION_KEYWORDS, GRADE_OPTIONS, POSITION_GROUPS, POSITION_MAPPING
+
+
+class DatabaseSearchFacetTests(unittest.TestCase):
+    def make_db_path(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def seed(self, db):
+        rows = [
+            {"sequence": 1, "name": "甲", "current_grade": "一级检察官", "current_position": "检察长",
+             "fulltime_education": "研究生 法学硕士", "parttime_education": "大专"},
+            {"sequence": 2, "name": "乙", "current_grade": "一级检察官助理", "current_position": "第一检察部主任",
+             "fulltime_education": "大学本科 法学学士"},
+            {"sequence": 3, "name": "丙", "current_grade": "一级检察官（2020年）", "current_position": "科员",
+             "fulltime_education": "博士研究生"},
+            {"sequence": 4, "name": "丁", "current_grade": "二级科员", "current_position": "某临时岗位",
+             "fulltime_education": "大专"},
+            {"sequence": 5, "name": "戊"},
+        ]
+        db.import_excel_data("base_info", rows)
+        return rows
+
+    def search_names(self, db, **kwargs):
+        return [row["name"] for row in db.search_personnel(table_name="base_info", limit=50, **kwargs)["base_info"]]
+
+    def test_facets_are_computed_on_import_and_update(self):
+        db = Database(self.make_db_path())
+        self.addCleanup(db.close)
+        self.seed(db)
+
+        row = db.conn.execute(
+            "SELECT grade_code, position_level, education_mask, parttime_education_mask FROM base_info WHERE name='甲'"
+        ).fetchone()
+        self.assertIsNotNone(row["grade_code"])
+        self.assertEqual("副厅", row["position_level"])
+        self.assertEqual(db._base_info_facets({"fulltime_education": "硕士"})["education_mask"], row["education_mask"])
+        self.assertNotEqual(0, row["parttime_education_mask"])
+
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "甲", "current_position": "科员"}])
+        row = db.conn.execute("SELECT position_level, education_mask FROM base_info WHERE name='甲'").fetchone()
+        self.assertEqual("其他", row["position_level"])
+        self.assertNotEqual(0, row["education_mask"])
+
+    def test_facet_filters_match_like_semantics(self):
+        db = Database(self.make_db_path())
+        self.addCleanup(db.close)
+        rows = self.seed(db)
+
+        def like_names(column, keywords):
+            return [
+                row["name"] for row in rows
+                if row.get(column) and any(keyword in row[column] for keyword in keywords)
+            ]
+
+        for grades in (["一级检察官"], ["一级检察官助理", "二级科员"], ["自定义职级"]):
+            self.assertEqual(like_names("current_grade", grades), self.search_names(db, grades=grades), grades)
+
+        for level in EDUCATION_KEYWORDS:
+            keywords = EDUCATION_KEYWORDS[level]
+            self.assertEqual(like_names("fulltime_education", keywords), self.search_names(db, education=keywords))
+            self.assertEqual(
+                like_names("parttime_education", keywords),
+                self.search_names(db, parttime_education=keywords),
+            )
+
+        for level in ("副厅", "正科", "其他"):
+            titles = POSITION_MAPPING[level]
+            self.assertEqual(
+                [row["name"] for row in rows if row.get("current_position") in titles],
+                self.search_names(db, position=titles),
+            )
+        titles = [title for level in POSITION_GROUPS["副科级以上"] for title in POSITION_MAPPING[level]]
+        self.assertEqual(["甲", "乙"], self.search_names(db, position=titles))
+        self.assertEqual(["乙", "丁"], self.search_names(db, position=["第一检察部主任", "某临时岗位"]))
+
+    def test_combined_filters_use_facet_indexes(self):
+        db = Database(self.make_db_path())
+        self.addCleanup(db.close)
+        self.seed(db)
+
+        conditions, params = db._build_personnel_search_clause(
+            grades=["一级检察官"],
+            position=POSITION_MAPPING["副厅"],
+            education=EDUCATION_KEYWORDS["硕士"],
+        )
+        sql = " AND ".join(conditions)
+        self.assertIn("b.position_level IN", sql)
+        self.assertIn("(b.education_mask & ?) != 0", sql)
+        self.assertNotIn("fulltime_education LIKE", sql)
+
+        plan = " ".join(
+            row["detail"]
+            for row in db.conn.execute(f"EXPLAIN QUERY PLAN SELECT b.id FROM base_info b WHERE {sql}", params)
+        )
+        self.assertIn("USING INDEX idx_base_info_", plan)
+        self.assertEqual(["甲"], self.search_names(
+            db,
+            grades=["一级检察官"],
+            position=POSITION_MAPPING["副厅"],
+            education=EDUCATION_KEYWORDS["硕士"],
+        ))
+
+    def test_migration_backfills_facets_for_existing_rows(self):
+        path = self.make_db_path()
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE base_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sequence INTEGER,
+                name TEXT NOT NULL,
+                current_position TEXT,
+                current_grade TEXT,
+                fulltime_education TEXT
+            );
+            INSERT INTO base_info(sequence, name, current_position, current_grade, fulltime_education)
+            VALUES (1, '甲', '副检察长', '三级高级检察官', '大学本科');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        self.addCleanup(db.close)
+
+        row = db.conn.execute("SELECT position_level, grade_code, education_mask FROM base_info").fetchone()
+        self.assertEqual("副县", row["position_level"])
+        self.assertIsNotNone(row["grade_code"])
+        self.assertNotEqual(0, row["education_mask"])
+        self.assertEqual(["甲"], self.search_names(db, education=EDUCATION_KEYWORDS["本科及以上"]))
+
+    def test_reopen_recomputes_facets_when_mapping_hash_changes(self):
+        path = self.make_db_path()
+        db = Database(path)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "甲", "current_grade": "一级检察官"}])
+        db.conn.execute("UPDATE base_info SET grade_code=NULL")
+        db.conn.commit()
+        db.close()
+
+        db = Database(path)
+        self.assertIsNone(db.conn.execute("SELECT grade_code FROM base_info").fetchone()[0])
+        db.conn.execute("UPDATE system_config SET config_value='stale' WHERE config_key=?", (FACET_MAPPING_HASH_KEY,))
+        db.conn.commit()
+        db.close()
+
+        db = Database(path)
+        self.addCleanup(db.close)
+
+        self.assertEqual(GRADE_OPTIONS.index("一级检察官"), db.conn.execute("SELECT grade_code FROM base_info").fetchone()[0])
+        self.assertEqual(FACET_MAPPING_HASH, db._get_facet_mapping_hash())
+
+
+if __name__ == "__main__":
+    unittest.main()
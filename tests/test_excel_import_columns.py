@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from core.database import Database
+from services.excel_import import ImportColumnPlan, _map_distinct, convert_excel_date
+from services.excel_reader import columns_from_rows
+
+
+class ImportColumnPlanTests(unittest.TestCase):
+    def open_db(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        db = Database(path)
+        self.addCleanup(db.close)
+        return db
+
+    def row_wise(self, db, table_name, columns, rows):
+        records = [
+            {column: convert_excel_date(value) for column, value in zip(columns, row)}
+            for row in rows
+        ]
+        return db._normalize_import_rows(table_name, records)
+
+    def test_base_info_conversion_matches_row_wise_normalization(self):
+        db = self.open_db()
+        columns = ["序号", "姓名", "出生年月", "参加工作时间", "职级/等级", "未知列", "2020年年度考核结果"]
+        rows = [
+            ["1.0", "张三", "1990年1月", "2012.07", "一级", "x", "优秀"],
+            [" 2 ", "李四", "1991/2/3", None, None, None, None],
+            ["A3", "王五", "1990-01-01 00:00:00", "n/a", "二级", "y", "称职"],
+        ]
+
+        plan = ImportColumnPlan(db, "base_info", columns, {2020: "assessment_0"})
+        expected = self.row_wise(db, "base_info", columns[:-1] + ["assessment_0"], rows)
+        records = plan.convert(columns_from_rows(rows))
+
+        self.assertEqual(expected, records)
+        self.assertEqual([1, 2, "A3"], [record["sequence"] for record in records])
+        self.assertEqual(("1990-01", "1990年1月"), (records[0]["birth_date"], records[0]["birth_date_display"]))
+        self.assertEqual(("一级", "优秀"), (records[0]["current_grade"], records[0]["assessment_0"]))
+        self.assertIsNone(records[2]["work_start_date"])
+
+    def test_distinct_mapping_keeps_strings_with_embedded_nul_apart(self):
+        values = columns_from_rows([["\x00=b"], [""], ["x\x00y"], [None], ["x"]])[0]
+
+        self.assertEqual(["\x00=b", "", "x\x00y", None, "x"], _map_distinct(values, lambda value: value).tolist())
+
+        db = self.open_db()
+        columns = ["序号", "姓名", "出生年月"]
+        rows = [["\x001", "张三", "1990.01"], ["1\x002", "李四", "1990.02"], ["1", "王五", "1990.01"]]
+        plan = ImportColumnPlan(db, "base_info", columns)
+        self.assertEqual(self.row_wise(db, "base_info", columns, rows), plan.convert(columns_from_rows(rows)))
+
+    def test_invalid_date_reports_earliest_row_with_batch_offset(self):
+        db = self.open_db()
+        plan = ImportColumnPlan(db, "base_info", ["序号", "姓名", "出生年月", "参加工作时间"])
+        rows = [
+            ["1", "张三", "1990.01", "2012.07"],
+            ["2", "李四", "1990.02", "不详"],
+            ["3", "王五", "未知", "2012.09"],
+        ]
+
+        with self.assertRaises(ValueError) as context:
+            plan.convert(columns_from_rows(rows), row_offset=100)
+
+        self.assertIn("第 102 行“参加工作时间”", str(context.exception))
+        self.assertIn("不详", str(context.exception))
+
+    def test_related_rows_without_business_content_are_dropped(self):
+        db = self.open_db()
+        columns = ["序号", "姓名", "称谓", "家庭成员姓名", "出生日期"]
+        rows = [
+            ["1", "张三", None, None, None],
+            ["1", "张三", "父亲", "张父", "1960.05"],
+            ["1", "张三", None, None, "无"],
+        ]
+
+        plan = ImportColumnPlan(db, "family", columns)
+
+        self.assertEqual(self.row_wise(db, "family", columns, rows), plan.convert(columns_from_rows(rows)))
+        self.assertEqual(["父亲"], [record["relation"] for record in plan.convert(columns_from_rows(rows))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
 import os
+import sqlite3
 import tempfile
 import unittest
+from unittest.mock import patch
 
+import openpyxl
 import pandas as pd
 
 from core.database import Database
@@ -59,8 +62,8 @@ class ExcelImportRelatedRowsTests(unittest.TestCase):
 
         self.assertFalse(result["success"])
         self.assertIn("重复人员", result["message"])
-        self.assertIn("第 1 行", result["message"])
-        self.assertIn("第 2 行", result["message"])
+        # 行号为工作表中的行号，第 1 行是标题
+        self.assertIn("第 3 行：与第 2 行重复", result["message"])
         self.assertEqual([], result["records"])
 
     def test_preview_rejects_related_file_with_only_empty_detail_rows(self):
@@ -93,6 +96,50 @@ class ExcelImportRelatedRowsTests(unittest.TestCase):
         self.assertEqual("父亲", result["records"][0]["relation"])
         self.assertEqual("张父", result["records"][0]["family_name"])
 
+    def test_preview_fills_merged_sequence_and_name_cells(self):
+        db_path = self.make_temp_path(".db")
+        db = Database(db_path)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.close()
+        excel_path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["序号", "姓名", "称谓", "家庭成员姓名"])
+        sheet.append([1, "张三", "父亲", "张父"])
+        sheet.append([None, None, "母亲", "张母"])
+        sheet.append([2, "李四", "配偶", "李妻"])
+        sheet.merge_cells("A2:A3")
+        sheet.merge_cells("B2:B3")
+        workbook.save(excel_path)
+
+        result = prepare_import_preview(excel_path, db_path, "family")
+
+        self.assertTrue(result["success"], result["message"])
+        self.assertEqual(
+            [(1, "张三", "父亲"), (1, "张三", "母亲"), (2, "李四", "配偶")],
+            [(row["sequence"], row["name"], row["relation"]) for row in result["records"]],
+        )
+
+    def test_preview_reports_unresolved_related_rows(self):
+        db_path = self.create_db_with_person()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"},
+                {"sequence": 9, "name": "不存在", "relation": "母亲", "family_name": "某母"},
+            ],
+            ["sequence", "name", "relation", "family_name"],
+        )
+
+        result = prepare_import_preview(excel_path, db_path, "family")
+
+        self.assertFalse(result["success"])
+        self.assertEqual(
+            "人员家庭成员信息校验发现 1 处问题：无法关联到人员基本信息 1 处\n"
+            "第 3 行：序号=9 姓名=不存在: 未找到匹配人员: 序号=9, 姓名=不存在",
+            result["message"],
+        )
+        self.assertEqual(2, len(result["records"]))
+
     def test_import_prepared_records_rejects_empty_related_rows_without_changes(self):
         db_path = self.create_db_with_person()
         db = Database(db_path)
@@ -258,6 +305,246 @@ class ExcelImportRelatedRowsTests(unittest.TestCase):
         finally:
             db.close()
 
+    def test_session_commit_writes_preview_results_without_reresolving(self):
+        db_path = self.create_db_with_person()
+        db = Database(db_path)
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"}])
+        db.close()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"},
+                {"sequence": 1, "name": "张三", "relation": "母亲", "family_name": "张母"},
+                {"sequence": "1.0", "name": "张三", "relation": "母亲", "family_name": "张母"},
+            ],
+            ["sequence", "name", "relation", "family_name"],
+        )
+
+        preview = prepare_import_preview(excel_path, db_path, "family")
+        self.assertTrue(preview["success"], preview["message"])
+        self.assertEqual([("1", "张三"), ("1", "张三")], preview["duplicate_keys"])
+
+        with (
+            patch.object(Database, "_normalize_import_rows", side_effect=AssertionError("normalized again")),
+            patch.object(Database, "_staged_related_import", side_effect=AssertionError("resolved again")),
+        ):
+            result = import_prepared_records(
+                db_path, "family", preview["records"], preview["assessment_years"], preview["session"]
+            )
+
+        self.assertTrue(result["success"], result["message"])
+        self.assertIn("成功导入人员家庭成员信息 1 条记录", result["message"])
+        self.assertIn("已跳过 2 条重复明细", result["message"])
+        db = Database(db_path)
+        try:
+            rows = sorted((row["relation"], row["family_name"]) for row in db.get_all_data("family"))
+            self.assertEqual([("母亲", "张母"), ("父亲", "张父")], rows)
+        finally:
+            db.close()
+
+    def test_base_info_session_commit_updates_and_adds_without_renormalizing(self):
+        db_path = self.make_temp_path(".db")
+        db = Database(db_path)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三", "current_grade": "原始"}])
+        db.close()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "current_grade": "更新"},
+                {"sequence": 2, "name": "李四", "current_grade": "新增"},
+            ],
+            ["sequence", "name", "current_grade"],
+        )
+
+        preview = prepare_import_preview(excel_path, db_path, "base_info")
+        self.assertEqual([("1", "张三")], preview["duplicate_keys"])
+
+        with (
+            patch.object(Database, "_normalize_import_rows", side_effect=AssertionError("normalized again")),
+            patch.object(Database, "_load_base_person_key_map", side_effect=AssertionError("resolved again")),
+        ):
+            result = import_prepared_records(
+                db_path, "base_info", preview["records"], preview["assessment_years"], preview["session"]
+            )
+
+        self.assertTrue(result["success"], result["message"])
+        db = Database(db_path)
+        try:
+            rows = {row["name"]: row["current_grade"] for row in db.get_all_data("base_info")}
+            self.assertEqual({"张三": "更新", "李四": "新增"}, rows)
+        finally:
+            db.close()
+
+    def test_stale_session_falls_back_to_full_import(self):
+        db_path = self.create_db_with_person()
+        excel_path = self.write_excel(
+            [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"}],
+            ["sequence", "name", "relation", "family_name"],
+        )
+        preview = prepare_import_preview(excel_path, db_path, "family")
+        self.assertEqual([], preview["duplicate_keys"])
+
+        db = Database(db_path)
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"}])
+        db.close()
+
+        result = import_prepared_records(
+            db_path, "family", preview["records"], preview["assessment_years"], preview["session"]
+        )
+
+        self.assertTrue(result["success"], result["message"])
+        self.assertIn("未新增记录，已跳过 1 条重复明细", result["message"])
+
+    def test_chunked_commit_reports_progress_and_keeps_committed_chunks_on_cancel(self):
+        db_path = self.create_db_with_person()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "relation": f"关系{index}", "family_name": f"成员{index}"}
+                for index in range(5)
+            ],
+            ["sequence", "name", "relation", "family_name"],
+        )
+        preview_events = []
+        preview = prepare_import_preview(excel_path, db_path, "family", preview_events.append)
+        self.assertEqual(["parsed", "validated"], [event["stage"] for event in preview_events])
+        self.assertEqual(5, preview_events[-1]["validated"])
+
+        events = []
+
+        def cancel_after_first_chunk():
+            return bool(events)
+
+        result = import_prepared_records(
+            db_path,
+            "family",
+            preview["records"],
+            preview["assessment_years"],
+            preview["session"],
+            events.append,
+            cancel_after_first_chunk,
+            chunk_size=2,
+        )
+
+        self.assertFalse(result["success"])
+        self.assertTrue(result["cancelled"])
+        self.assertIn("已写入人员家庭成员信息 2 条记录", result["message"])
+        self.assertEqual([("written", 2, 5)], [(e["stage"], e["written"], e["total"]) for e in events])
+        db = Database(db_path)
+        try:
+            self.assertEqual(2, len(db.get_all_data("family")))
+            self.assertFalse(db.conn.in_transaction)
+        finally:
+            db.close()
+
+        # 重新导入同一文件时已写入的明细按内容跳过，只补齐剩余行
+        result = import_prepared_records(db_path, "family", preview["records"], chunk_size=2)
+        self.assertTrue(result["success"], result["message"])
+        self.assertEqual("成功导入人员家庭成员信息 3 条记录，已跳过 2 条重复明细", result["message"])
+
+    def test_chunk_failure_reports_rows_already_committed(self):
+        db_path = self.create_db_with_person()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "relation": f"关系{index}", "family_name": f"成员{index}"}
+                for index in range(5)
+            ],
+            ["sequence", "name", "relation", "family_name"],
+        )
+        preview = prepare_import_preview(excel_path, db_path, "family")
+        write_related_rows = Database.write_related_rows
+        calls = []
+
+        def fail_on_second_chunk(db, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise sqlite3.OperationalError("disk I/O error")
+            return write_related_rows(db, *args, **kwargs)
+
+        with patch.object(Database, "write_related_rows", fail_on_second_chunk):
+            result = import_prepared_records(
+                db_path, "family", preview["records"], preview["assessment_years"], preview["session"],
+                chunk_size=2,
+            )
+
+        self.assertFalse(result["success"])
+        self.assertEqual(2, result["written"])
+        self.assertIn("disk I/O error", result["message"])
+        self.assertIn("出错前已写入 2 条记录", result["message"])
+        db = Database(db_path)
+        try:
+            self.assertEqual(2, len(db.get_all_data("family")))
+            self.assertFalse(db.conn.in_transaction)
+        finally:
+            db.close()
+
+    def test_preview_cancel_stops_before_reading_batches(self):
+        db_path = self.create_db_with_person()
+        excel_path = self.write_excel(
+            [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"}],
+            ["sequence", "name", "relation", "family_name"],
+        )
+
+        result = prepare_import_preview(excel_path, db_path, "family", None, lambda: True)
+
+        self.assertFalse(result["success"])
+        self.assertTrue(result["cancelled"])
+
+
+    def test_base_info_preview_reports_diff_and_skips_unchanged_file(self):
+        db_path = self.make_temp_path(".db")
+        Database(db_path).close()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "current_grade": "一级"},
+                {"sequence": 2, "name": "李四", "current_grade": "一级"},
+            ],
+            ["sequence", "name", "current_grade"],
+        )
+        preview = prepare_import_preview(excel_path, db_path, "base_info")
+        self.assertEqual({"new": 2, "changed": 0, "unchanged": 0}, preview["diff"])
+        result = import_prepared_records(db_path, "base_info", preview["records"], None, preview["session"])
+        self.assertEqual("成功导入人员基本信息 2 条记录", result["message"])
+
+        preview = prepare_import_preview(excel_path, db_path, "base_info")
+        self.assertTrue(preview["success"])
+        self.assertTrue(preview["unchanged_file"])
+        self.assertEqual([], preview["records"])
+
+        changed_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "current_grade": "一级"},
+                {"sequence": 2, "name": "李四", "current_grade": "二级"},
+                {"sequence": 3, "name": "王五", "current_grade": "一级"},
+            ],
+            ["sequence", "name", "current_grade"],
+        )
+        preview = prepare_import_preview(changed_path, db_path, "base_info")
+        self.assertEqual({"new": 1, "changed": 1, "unchanged": 1}, preview["diff"])
+        result = import_prepared_records(db_path, "base_info", preview["records"], None, preview["session"])
+        self.assertEqual(
+            "成功导入人员基本信息 2 条记录（新增 1 条，更新 1 条），1 条未变化已跳过",
+            result["message"],
+        )
+
+        # 另一个文件写入后，原文件不再被视为与数据库一致
+        preview = prepare_import_preview(excel_path, db_path, "base_info")
+        self.assertNotIn("unchanged_file", preview)
+        self.assertEqual({"new": 0, "changed": 1, "unchanged": 1}, preview["diff"])
+
+    def test_related_preview_diff_counts_duplicate_details_as_unchanged(self):
+        db_path = self.create_db_with_person()
+        db = Database(db_path)
+        db.import_excel_data("family", [{"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"}])
+        db.close()
+        excel_path = self.write_excel(
+            [
+                {"sequence": 1, "name": "张三", "relation": "父亲", "family_name": "张父"},
+                {"sequence": 1, "name": "张三", "relation": "母亲", "family_name": "张母"},
+            ],
+            ["sequence", "name", "relation", "family_name"],
+        )
+
+        preview = prepare_import_preview(excel_path, db_path, "family")
+
+        self.assertEqual({"new": 1, "changed": 0, "unchanged": 1}, preview["diff"])
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import openpyxl
+
+from core.database import Database
+from services import excel_reader
+from services.excel_import import import_workbook, match_workbook_sheets
+
+
+class ExcelImportWorkbookTests(unittest.TestCase):
+    def make_temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def make_db(self):
+        db_path = self.make_temp_path(".db")
+        db = Database(db_path)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三", "current_grade": "原始"}])
+        db.close()
+        return db_path
+
+    def write_workbook(self, sheets):
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        workbook.remove(workbook.active)
+        for title, rows, merges in sheets:
+            sheet = workbook.create_sheet(title)
+            for row in rows:
+                sheet.append(row)
+            for cell_range in merges:
+                sheet.merge_cells(cell_range)
+        workbook.save(path)
+        return path
+
+    def read_table(self, db_path, table_name):
+        db = Database(db_path)
+        try:
+            return db.get_all_data(table_name)
+        finally:
+            db.close()
+
+    def test_match_workbook_sheets_accepts_table_names_and_labels(self):
+        matched = match_workbook_sheets(["家庭成员信息", " Base_Info ", "说明", "人员简历信息", "family"])
+
+        self.assertEqual(
+            {"base_info": " Base_Info ", "family": "家庭成员信息", "resume": "人员简历信息"},
+            matched,
+        )
+        self.assertEqual(["base_info", "family", "resume"], list(matched))
+
+    def test_imports_base_info_first_and_links_related_sheets_to_new_people(self):
+        db_path = self.make_db()
+        path = self.write_workbook([
+            ("人员家庭成员信息", [
+                ["序号", "姓名", "称谓", "家庭成员姓名"],
+                [2, "李四", "父亲", "李父"],
+                [None, None, "母亲", "李母"],
+            ], ["A2:A3", "B2:B3"]),
+            ("人员基本信息", [
+                ["序号", "姓名", "职级/等级"],
+                [1, "张三", "更新"],
+                [2, "李四", "新增"],
+            ], []),
+            ("说明", [["本工作表不导入"]], []),
+        ])
+        events = []
+
+        with patch.object(excel_reader, "load_workbook", wraps=excel_reader.load_workbook) as load:
+            result = import_workbook(path, db_path, events.append)
+
+        self.assertTrue(result["success"], result["message"])
+        load.assert_called_once()
+        self.assertEqual(["base_info", "family"], list(result["results"]))
+        self.assertEqual(
+            "人员基本信息：成功导入人员基本信息 2 条记录\n人员家庭成员信息：成功导入人员家庭成员信息 2 条记录",
+            result["message"],
+        )
+        grades = {row["name"]: row["current_grade"] for row in self.read_table(db_path, "base_info")}
+        self.assertEqual({"张三": "更新", "李四": "新增"}, grades)
+        self.assertEqual(
+            [("李母", "母亲"), ("李父", "父亲")],
+            sorted((row["family_name"], row["relation"]) for row in self.read_table(db_path, "family")),
+        )
+        self.assertEqual((4, 4), (events[-1]["written"], events[-1]["total"]))
+        self.assertEqual(4, events[-1]["validated"])
+
+    def test_write_failure_reports_only_rows_actually_committed(self):
+        db_path = self.make_db()
+        path = self.write_workbook([
+            ("base_info", [["序号", "姓名", "职级/等级"], [1, "张三", "原始"], [2, "李四", "新增"]], []),
+            ("family", [["序号", "姓名", "称谓", "家庭成员姓名"], [2, "李四", "父亲", "李父"]], []),
+        ])
+
+        with patch.object(Database, "write_related_rows", side_effect=sqlite3.OperationalError("disk I/O error")):
+            result = import_workbook(path, db_path)
+
+        # 未变化的张三已跳过，不计入已提交的行数
+        self.assertFalse(result["success"])
+        self.assertEqual(1, result["written"])
+        self.assertIn("出错前已提交 1 行", result["message"])
+        self.assertEqual(["张三", "李四"], [row["name"] for row in self.read_table(db_path, "base_info")])
+
+    def test_invalid_sheet_stops_before_any_write(self):
+        db_path = self.make_db()
+        path = self.write_workbook([
+            ("base_info", [["序号", "姓名", "职级/等级"], [2, "李四", "新增"]], []),
+            ("family", [["序号", "姓名", "称谓", "出生日期"], [2, "李四", "父亲", "不是日期"]], []),
+        ])
+
+        result = import_workbook(path, db_path)
+
+        self.assertFalse(result["success"])
+        self.assertTrue(result["message"].startswith("工作表“family”："), result["message"])
+        self.assertEqual(["张三"], [row["name"] for row in self.read_table(db_path, "base_info")])
+
+    def test_unresolved_related_sheet_is_reported_and_other_sheets_kept(self):
+        db_path = self.make_db()
+        path = self.write_workbook([
+            ("base_info", [["序号", "姓名"], [2, "李四"]], []),
+            ("rewards", [["序号", "姓名", "奖励名称"], [9, "不存在", "优秀"]], []),
+            ("resume", [["序号", "姓名", "简历"], [2, "李四", "2010-2014 大学"]], []),
+        ])
+
+        result = import_workbook(path, db_path, tables=["base_info", "rewards", "resume"])
+
+        self.assertFalse(result["success"])
+        self.assertTrue(result["results"]["base_info"]["success"])
+        self.assertFalse(result["results"]["rewards"]["success"])
+        self.assertIn("无法关联到人员基本信息", result["results"]["rewards"]["message"])
+        self.assertTrue(result["results"]["resume"]["success"])
+        self.assertEqual(["张三", "李四"], [row["name"] for row in self.read_table(db_path, "base_info")])
+        self.assertEqual([], self.read_table(db_path, "rewards"))
+
+    def test_tables_filter_skips_sheets_without_permission(self):
+        db_path = self.make_db()
+        path = self.write_workbook([
+            ("base_info", [["序号", "姓名"], [2, "李四"]], []),
+            ("resume", [["序号", "姓名", "简历"], [1, "张三", "简历"]], []),
+        ])
+
+        result = import_workbook(path, db_path, tables=["resume"])
+
+        self.assertTrue(result["success"], result["message"])
+        self.assertEqual(["resume"], list(result["results"]))
+        self.assertEqual(["张三"], [row["name"] for row in self.read_table(db_path, "base_info")])
+
+    def test_workbook_without_known_sheets_is_rejected(self):
+        db_path = self.make_db()
+        path = self.write_workbook([("Sheet1", [["序号", "姓名"], [2, "李四"]], [])])
+
+        result = import_workbook(path, db_path)
+
+        self.assertFalse(result["success"])
+        self.assertIn("未找到可导入的工作表", result["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
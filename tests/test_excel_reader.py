@@ -0,0 +1,188 @@
+import datetime
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import openpyxl
+import pandas as pd
+
+from services import excel_reader
+from services.excel_reader import (
+    ExcelSheetReader,
+    ExcelWorkbook,
+    MergedCellsError,
+    MergedRangeFill,
+    columns_from_rows,
+)
+
+
+class FakeXlsSheet:
+    def __init__(self, rows, merged_cells):
+        self.rows = rows
+        self.nrows = len(rows)
+        self.merged_cells = merged_cells
+
+    def row(self, index):
+        return self.rows[index]
+
+
+class FakeXlsBook:
+    datemode = 0
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.released = False
+
+    def sheet_names(self):
+        return ["Sheet1"]
+
+    def sheet_by_index(self, index):
+        return self.sheet
+
+    def release_resources(self):
+        self.released = True
+
+
+class ExcelSheetReaderTests(unittest.TestCase):
+    def make_temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def read_all(self, path, fill_merged=False, batch_size=1000):
+        with ExcelSheetReader(path, fill_merged=fill_merged) as reader:
+            return reader.columns, [list(row) for batch in reader.iter_batches(batch_size) for row in zip(*batch)]
+
+    def test_cell_text_matches_pandas_read_excel_dtype_str(self):
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["序号", "姓名", "姓名", None, "日期", "数值", "备注"])
+        sheet.append([1, "张三", "NA", None, datetime.datetime(2020, 1, 5), 1.5, "  a\nb "])
+        sheet.append([None] * 7)
+        sheet.append([2.0, "李四", True, None, datetime.time(12, 30), 3, None])
+        workbook.save(path)
+
+        columns, rows = self.read_all(path)
+
+        df = pd.read_excel(path, sheet_name=0, dtype=str).dropna(how="all")
+        self.assertEqual(list(df.columns), columns)
+        expected = [[None if pd.isna(value) else value for value in row] for row in df.values.tolist()]
+        self.assertEqual(expected, rows)
+
+    def test_merged_ranges_are_filled_below_header_while_streaming(self):
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["基本信息", None, "关系", "姓名"])
+        for row in ([1, "张三", "父亲", "张父"], [None, None, "母亲", "张母"], [2, "李四", "配偶", "李妻"]):
+            sheet.append(row)
+        sheet.merge_cells("A1:B1")
+        sheet.merge_cells("A2:A3")
+        sheet.merge_cells("B2:B3")
+        workbook.save(path)
+
+        columns, rows = self.read_all(path, fill_merged=True, batch_size=2)
+
+        self.assertEqual(["基本信息", "Unnamed: 1", "关系", "姓名"], columns)
+        self.assertEqual(
+            [["1", "张三", "父亲", "张父"], ["1", "张三", "母亲", "张母"], ["2", "李四", "配偶", "李妻"]],
+            rows,
+        )
+        self.assertEqual([["1", "张三", "父亲", "张父"], [None, None, "母亲", "张母"]], self.read_all(path)[1][:2])
+
+    def test_merged_range_fill_matches_cell_by_cell_fill_across_batches(self):
+        generator = random.Random(7)
+        width, height = 5, 40
+        grid = [[f"{row}-{col}" if generator.random() < 0.7 else None for col in range(width)] for row in range(height)]
+        ranges, used = [], set()
+        for _ in range(30):
+            min_row, min_col = generator.randrange(2, height + 1), generator.randrange(1, width + 1)
+            max_row = min(height + 1, min_row + generator.randrange(0, 9))
+            max_col = min(width + 2, min_col + generator.randrange(0, 3))
+            cells = {(row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)}
+            if cells & used:
+                continue
+            used |= cells
+            ranges.append((min_row, min_col, max_row, max_col))
+
+        expected = [list(row) for row in grid]
+        for min_row, min_col, max_row, max_col in ranges:
+            value = expected[min_row - 2][min_col - 1]
+            for row in range(min_row, min(max_row, height + 1) + 1):
+                for col in range(min_col, min(max_col, width) + 1):
+                    expected[row - 2][col - 1] = value
+
+        for batch_size in (1, 3, 7, height):
+            merged_fill = MergedRangeFill(ranges, 1, width)
+            actual = []
+            for start in range(0, height, batch_size):
+                columns = columns_from_rows([list(row) for row in grid[start:start + batch_size]])
+                merged_fill.fill(columns, start + 2)
+                actual.extend(list(row) for row in zip(*columns))
+            self.assertEqual(expected, actual, batch_size)
+
+    def test_workbook_reads_each_sheet_by_name_from_one_open(self):
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        workbook.active.title = "人员基本信息"
+        workbook.active.append(["序号", "姓名"])
+        workbook.active.append([1, "张三"])
+        family = workbook.create_sheet("人员家庭成员信息")
+        family.append(["序号", "姓名", "称谓"])
+        family.append([1, "张三", "父亲"])
+        family.append([None, None, "母亲"])
+        family.merge_cells("A2:A3")
+        family.merge_cells("B2:B3")
+        workbook.save(path)
+
+        with patch.object(excel_reader, "load_workbook", wraps=excel_reader.load_workbook) as load:
+            with ExcelWorkbook(path, merged_cells=True) as book:
+                self.assertEqual(["人员基本信息", "人员家庭成员信息"], book.sheet_names)
+                with book.sheet("人员家庭成员信息", fill_merged=True) as reader:
+                    family_rows = [list(row) for batch in reader.iter_batches() for row in zip(*batch)]
+                with book.sheet("人员基本信息") as reader:
+                    base_rows = [list(row) for batch in reader.iter_batches() for row in zip(*batch)]
+
+        load.assert_called_once()
+        self.assertEqual([["1", "张三", "父亲"], ["1", "张三", "母亲"]], family_rows)
+        self.assertEqual([["1", "张三"]], base_rows)
+
+    def test_merge_scan_failure_raises_merged_cells_error(self):
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["序号"])
+        workbook.save(path)
+
+        with patch.object(excel_reader, "_worksheet_paths", side_effect=KeyError("sheet1.xml")):
+            with self.assertRaises(MergedCellsError):
+                ExcelSheetReader(path, fill_merged=True)
+
+    @unittest.skipIf(excel_reader.xlrd is None, "未安装 xlrd")
+    def test_xls_rows_share_merged_fill_and_conversion(self):
+        xlrd = excel_reader.xlrd
+        cell = xlrd.sheet.Cell
+        date_value = xlrd.xldate.xldate_from_date_tuple((2020, 1, 5), 0)
+        rows = [
+            [cell(xlrd.XL_CELL_TEXT, "序号"), cell(xlrd.XL_CELL_TEXT, "姓名"), cell(xlrd.XL_CELL_TEXT, "出生日期")],
+            [cell(xlrd.XL_CELL_NUMBER, 1.0), cell(xlrd.XL_CELL_TEXT, "张三"), cell(xlrd.XL_CELL_DATE, date_value)],
+            [cell(xlrd.XL_CELL_EMPTY, ""), cell(xlrd.XL_CELL_EMPTY, ""), cell(xlrd.XL_CELL_ERROR, 42)],
+            [cell(xlrd.XL_CELL_BLANK, ""), cell(xlrd.XL_CELL_BLANK, ""), cell(xlrd.XL_CELL_BLANK, "")],
+        ]
+        book = FakeXlsBook(FakeXlsSheet(rows, [(1, 3, 0, 1), (1, 3, 1, 2)]))
+        path = self.make_temp_path(".xls")
+
+        with patch.object(xlrd, "open_workbook", return_value=book) as open_workbook:
+            columns, data = self.read_all(path, fill_merged=True)
+
+        open_workbook.assert_called_once_with(path, formatting_info=True, on_demand=True)
+        self.assertTrue(book.released)
+        self.assertEqual(["序号", "姓名", "出生日期"], columns)
+        self.assertEqual([["1", "张三", "2020-01-05 00:00:00"], ["1", "张三", None]], data)
+
+
+if __name__ == "__main__":
+    unittest.main()
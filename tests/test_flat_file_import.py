@@ -0,0 +1,173 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from core.database import Database
+from services import flat_file_reader
+from services.excel_import import import_prepared_records, prepare_import_preview
+from services.flat_file_reader import CsvSheetReader, ParquetSheetReader, detect_text_encoding
+
+
+class FlatFileImportTests(unittest.TestCase):
+    def make_temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def write_text(self, text, encoding, suffix=".csv"):
+        path = self.make_temp_path(suffix)
+        with open(path, "w", encoding=encoding, newline="") as stream:
+            stream.write(text)
+        return path
+
+    def create_db_with_people(self):
+        db_path = self.make_temp_path(".db")
+        db = Database(db_path)
+        db.import_excel_data("base_info", [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}])
+        db.close()
+        return db_path
+
+    def read_all(self, reader):
+        with reader:
+            return reader.columns, [list(row) for batch in reader.iter_batches() for row in zip(*batch)]
+
+    def test_detects_utf8_gbk_and_bom_encodings(self):
+        text = "序号,姓名\n1,张三\n"
+        self.assertEqual("utf-8", detect_text_encoding(text.encode("utf-8")))
+        self.assertEqual("gb18030", detect_text_encoding(text.encode("gbk")))
+        self.assertEqual("utf-8-sig", detect_text_encoding(text.encode("utf-8-sig")))
+        # 样本在多字节字符中间截断时仍判断为 UTF-8
+        self.assertEqual("utf-8", detect_text_encoding(text.encode("utf-8")[:-4]))
+
+    def test_gbk_text_after_ascii_sample_switches_encoding(self):
+        ascii_rows = [f"{index},name{index:06d}" for index in range(1, 6001)]
+        path = self.make_temp_path(".csv")
+        with open(path, "wb") as stream:
+            stream.write(("sequence,name\n" + "\n".join(ascii_rows) + "\n").encode("ascii"))
+            stream.write("6001,张三\n".encode("gbk"))
+        self.assertGreater(os.path.getsize(path), flat_file_reader.SAMPLE_SIZE)
+
+        for chunk_size in (1000, 5000, 10000):
+            with patch.object(flat_file_reader, "READ_BATCH_SIZE", chunk_size):
+                reader = CsvSheetReader(path)
+                columns, rows = self.read_all(reader)
+            self.assertEqual("gb18030", reader.encoding, chunk_size)
+            self.assertEqual(["sequence", "name"], columns)
+            self.assertEqual(6001, len(rows))
+            self.assertEqual(["1", "name000001"], rows[0])
+            self.assertEqual(["6001", "张三"], rows[-1])
+
+    def test_csv_reader_matches_excel_text_rules(self):
+        path = self.write_text(
+            "序号\t姓名\t姓名\t备注\n1\t张三\tNA\t 保留空格 \n\t\t\t\n2\t李四\t\t#N/A\n",
+            "utf-8-sig",
+        )
+
+        columns, rows = self.read_all(CsvSheetReader(path))
+
+        self.assertEqual(["序号", "姓名", "姓名.1", "备注"], columns)
+        self.assertEqual([["1", "张三", None, " 保留空格 "], ["2", "李四", None, None]], rows)
+
+    def test_csv_reader_splits_and_merges_chunks_to_batch_size(self):
+        lines = ["序号,姓名"] + [f"{index},人员{index}" if index != 4 else "," for index in range(1, 12)]
+        path = self.write_text("\n".join(lines) + "\n", "utf-8")
+
+        for batch_size, chunk_size, sizes in ((3, 5, [3, 2, 3, 2]), (4, 3, [3, 4, 3]), (20, 3, [10])):
+            with patch.object(flat_file_reader, "READ_BATCH_SIZE", chunk_size), CsvSheetReader(path) as reader:
+                batches = list(reader.iter_numbered_batches(batch_size))
+                self.assertEqual(11, reader.rows_read)
+            self.assertEqual(sizes, [len(row_numbers) for row_numbers, _ in batches], batch_size)
+            self.assertEqual(
+                [index + 1 for index in range(1, 12) if index != 4],
+                [int(number) for row_numbers, _ in batches for number in row_numbers],
+            )
+            self.assertEqual(["1", "人员1"], [column[0] for column in batches[0][1]])
+
+    def test_flat_file_readers_must_implement_numbered_batches(self):
+        with self.assertRaises(TypeError):
+            flat_file_reader._FlatFileReader("file.csv")
+
+    def test_gbk_family_csv_imports_through_preview_session(self):
+        db_path = self.create_db_with_people()
+        path = self.write_text(
+            "序号,姓名,称谓,家庭成员姓名,出生日期\n"
+            "1,张三,父亲,张父,1950.03\n"
+            "2,李四,母亲,李母,1955-7\n"
+            "2,李四,母亲,李母,1955-7\n",
+            "gbk",
+        )
+
+        preview = prepare_import_preview(path, db_path, "family")
+
+        self.assertTrue(preview["success"], preview["message"])
+        self.assertEqual(["1950-03", "1955-07"], [record["birth_date"] for record in preview["records"][:2]])
+        result = import_prepared_records(
+            db_path, "family", preview["records"], preview["assessment_years"], preview["session"]
+        )
+        self.assertTrue(result["success"], result["message"])
+        db = Database(db_path)
+        try:
+            rows = db.get_all_data("family")
+        finally:
+            db.close()
+        self.assertEqual(
+            [("张三", "张父"), ("李四", "李母")],
+            sorted((row["name"], row["family_name"]) for row in rows),
+        )
+
+    def test_csv_date_errors_report_file_line_numbers(self):
+        db_path = self.make_temp_path(".db")
+        Database(db_path).close()
+        path = self.write_text("序号,姓名,出生年月\n1,张三,1980.01\n\n2,李四,不是日期\n", "utf-8")
+
+        result = prepare_import_preview(path, db_path, "base_info")
+
+        self.assertFalse(result["success"])
+        # 空行保留在行号中，与在 Excel 中打开该文件时一致
+        self.assertIn("第 4 行 C 列", result["message"])
+        self.assertIn("出生年月", result["message"])
+
+    def test_unsupported_extension_lists_flat_formats(self):
+        db_path = self.make_temp_path(".db")
+        Database(db_path).close()
+        path = self.write_text("序号,姓名\n1,张三\n", "utf-8", suffix=".txt")
+
+        result = prepare_import_preview(path, db_path, "base_info")
+
+        self.assertFalse(result["success"])
+        self.assertIn(".csv", result["message"])
+        self.assertIn(".parquet", result["message"])
+
+    @unittest.skipIf(flat_file_reader.pq is not None, "已安装 pyarrow")
+    def test_parquet_without_pyarrow_reports_missing_dependency(self):
+        db_path = self.make_temp_path(".db")
+        Database(db_path).close()
+        path = self.write_text("", "utf-8", suffix=".parquet")
+
+        result = prepare_import_preview(path, db_path, "base_info")
+
+        self.assertFalse(result["success"])
+        self.assertIn("pyarrow", result["message"])
+
+    @unittest.skipIf(flat_file_reader.pq is None, "未安装 pyarrow")
+    def test_parquet_reader_converts_typed_columns_to_text(self):
+        path = self.make_temp_path(".parquet")
+        pd.DataFrame({
+            "序号": [1, 2, None],
+            "姓名": ["张三", "NA", None],
+            "出生日期": pd.to_datetime(["1980-01-05", None, None]),
+            "分数": [1.5, 2.0, None],
+        }).to_parquet(path, index=False)
+
+        columns, rows = self.read_all(ParquetSheetReader(path))
+
+        self.assertEqual(["序号", "姓名", "出生日期", "分数"], columns)
+        self.assertEqual([["1", "张三", "1980-01-05 00:00:00", "1.5"], ["2", None, None, "2"]], rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import os
+import tempfile
+import unittest
+
+import openpyxl
+
+from core.database import Database
+from services.excel_import import import_workbook, prepare_import_preview
+from services.import_validation import ERROR_FILL, write_validation_workbook
+
+
+class ImportValidationTests(unittest.TestCase):
+    def make_temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def make_db(self, assessment_years=None):
+        db_path = self.make_temp_path(".db")
+        db = Database(db_path)
+        if assessment_years:
+            db.set_assessment_years(assessment_years)
+        db.close()
+        return db_path
+
+    def write_sheet(self, rows, title="Sheet"):
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        workbook.active.title = title
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        return path
+
+    def write_base_info_with_issues(self):
+        return self.write_sheet([
+            ["序号", "姓名", "出生年月", "参加工作时间"],
+            [1, "张三", "1980.01", "不是日期"],
+            [2, "李四", "1980年13月", "2000.01"],
+            [],
+            [1, "张三", "1981.01", "2001.01"],
+        ])
+
+    def test_preview_collects_every_issue_with_sheet_coordinates(self):
+        db_path = self.make_db()
+        path = self.write_base_info_with_issues()
+
+        result = prepare_import_preview(path, db_path, "base_info")
+
+        self.assertFalse(result["success"])
+        self.assertEqual([], result["records"])
+        report = result["validation"]
+        self.assertEqual(
+            [
+                ("date", "第 2 行 D 列"),
+                ("date", "第 3 行 C 列"),
+                ("duplicate", "第 5 行"),
+            ],
+            [(issue.kind, issue.location) for issue in report.sorted_issues()],
+        )
+        lines = result["message"].splitlines()
+        self.assertEqual("人员基本信息校验发现 3 处问题：日期格式无效 2 处，文件内重复人员 1 处", lines[0])
+        self.assertIn("第 2 行 D 列：“参加工作时间”格式无效，当前值为“不是日期”", lines)
+        self.assertIn("第 5 行：与第 2 行重复 序号=1 姓名=张三", lines)
+
+    def test_summary_lists_first_issues_and_counts_the_rest(self):
+        db_path = self.make_db()
+        path = self.write_sheet([["序号", "姓名", "出生年月"]] + [[index, f"人员{index}", "错误"] for index in range(30)])
+
+        result = prepare_import_preview(path, db_path, "base_info")
+
+        self.assertEqual(30, len(result["validation"].issues))
+        self.assertIn("另有 10 处问题未列出，请导出错误清单查看", result["message"])
+
+    def test_error_workbook_marks_issue_cells_and_reimports_after_fixes(self):
+        db_path = self.make_db()
+        path = self.write_base_info_with_issues()
+        report = prepare_import_preview(path, db_path, "base_info")["validation"]
+        error_path = self.make_temp_path(".xlsx")
+
+        write_validation_workbook(error_path, [report])
+
+        workbook = openpyxl.load_workbook(error_path)
+        sheet = workbook.active
+        self.assertEqual(
+            ["序号", "姓名", "出生年月", "参加工作时间", "错误说明", "原行号"],
+            [cell.value for cell in sheet[1]],
+        )
+        self.assertEqual([2, 3, 5], [row[5].value for row in sheet.iter_rows(min_row=2)])
+        self.assertEqual(ERROR_FILL.start_color.rgb, sheet["D2"].fill.start_color.rgb)
+        self.assertEqual(ERROR_FILL.start_color.rgb, sheet["A4"].fill.start_color.rgb)
+        self.assertIsNone(sheet["C2"].fill.fill_type)
+        self.assertIn("与第 2 行重复", sheet["E4"].value)
+        # 全空行不写入错误清单
+        self.assertEqual(4, sheet.max_row)
+
+        sheet["D2"] = "2002.03"
+        sheet["C3"] = "1980.12"
+        sheet["B4"] = "王五"
+        workbook.save(error_path)
+
+        result = prepare_import_preview(error_path, db_path, "base_info")
+
+        self.assertTrue(result["success"], result["message"])
+        self.assertEqual(["张三", "李四", "王五"], [record["name"] for record in result["records"]])
+
+    def test_error_workbook_writes_formula_text_as_plain_text(self):
+        db_path = self.make_db()
+        path = self.make_temp_path(".csv")
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write("序号,姓名,出生年月,=备注\n1,=HYPERLINK(\"http://x\"),错误,+1\n")
+        report = prepare_import_preview(path, db_path, "base_info")["validation"]
+        error_path = self.make_temp_path(".xlsx")
+
+        write_validation_workbook(error_path, [report])
+
+        sheet = openpyxl.load_workbook(error_path).active
+        self.assertEqual("=备注", sheet["D1"].value)
+        self.assertEqual("=HYPERLINK(\"http://x\")", sheet["B2"].value)
+        self.assertEqual("+1", sheet["D2"].value)
+        self.assertNotIn("f", {cell.data_type for row in sheet.iter_rows() for cell in row})
+
+    def test_error_workbook_round_trips_original_values(self):
+        db_path = self.make_db()
+        path = self.write_sheet([
+            ["序号", "姓名", "出生年月", "参加工作时间", "备注"],
+            [1, "张三", "-", "不是日期", "+86"],
+            [2, "@李四", "1980.01", "2000.01", "-负数"],
+        ])
+        report = prepare_import_preview(path, db_path, "base_info")["validation"]
+        error_path = self.make_temp_path(".xlsx")
+        write_validation_workbook(error_path, [report])
+
+        workbook = openpyxl.load_workbook(error_path)
+        self.assertEqual(["-", "+86", "@李四", "-负数"], [
+            workbook.active[coordinate].value for coordinate in ("C2", "E2", "B3", "E3")
+        ])
+        workbook.active["D2"] = "2002.03"
+        workbook.save(error_path)
+        result = prepare_import_preview(error_path, db_path, "base_info")
+
+        self.assertTrue(result["success"], result["message"])
+        records = result["records"]
+        self.assertEqual(["张三", "@李四"], [record["name"] for record in records])
+        self.assertIsNone(records[0]["birth_date"])
+        self.assertEqual("2002-03", records[0]["work_start_date"])
+
+    def test_assessment_mismatch_is_reported_on_header_with_row_issues(self):
+        db_path = self.make_db([2019, 2020, 2021, 2022, 2023])
+        years = [f"{year}年年度考核结果" for year in range(2020, 2025)]
+        path = self.write_sheet([
+            ["序号", "姓名", "出生年月", *years],
+            [1, "张三", "错误", "优秀", "称职", "称职", "称职", "称职"],
+        ])
+
+        result = prepare_import_preview(path, db_path, "base_info")
+
+        report = result["validation"]
+        self.assertEqual({"assessment": 5, "date": 1}, report.counts())
+        self.assertEqual(
+            ["第 1 行 D 列", "第 1 行 E 列", "第 1 行 F 列", "第 1 行 G 列", "第 1 行 H 列"],
+            [issue.location for issue in report.sorted_issues() if issue.kind == "assessment"],
+        )
+        self.assertIn("年度考核区间不匹配", result["message"])
+
+    def test_workbook_validates_every_sheet_before_writing(self):
+        db_path = self.make_db()
+        path = self.make_temp_path(".xlsx")
+        workbook = openpyxl.Workbook()
+        base_info = workbook.active
+        base_info.title = "人员基本信息"
+        for row in (["序号", "姓名", "出生年月"], [1, "张三", "错误"], [2, "李四", "1980.01"]):
+            base_info.append(row)
+        family = workbook.create_sheet("人员家庭成员信息")
+        for row in (["序号", "姓名", "称谓", "出生日期"], [1, "张三", "父亲", "1950.13"]):
+            family.append(row)
+        workbook.save(path)
+
+        result = import_workbook(path, db_path)
+
+        self.assertFalse(result["success"])
+        self.assertEqual({}, result["results"])
+        self.assertEqual(["base_info", "family"], list(result["validation"]))
+        self.assertIn("工作表“人员基本信息”：人员基本信息校验发现 1 处问题", result["message"])
+        self.assertIn("工作表“人员家庭成员信息”：人员家庭成员信息校验发现 1 处问题", result["message"])
+        self.assertEqual("人员家庭成员信息", result["validation"]["family"].sheet_name)
+        db = Database(db_path)
+        try:
+            self.assertEqual([], db.get_all_data("base_info"))
+        finally:
+            db.close()
+
+        # 错误清单从源文件重新读取各工作表，而不是保留读取时的数据
+        error_path = self.make_temp_path(".xlsx")
+        write_validation_workbook(error_path, list(result["validation"].values()))
+        error_book = openpyxl.load_workbook(error_path)
+        self.assertEqual(["人员基本信息", "人员家庭成员信息"], error_book.sheetnames)
+        self.assertEqual(
+            [["张三", 2], ["李四", 3]],
+            [[row[1].value, row[4].value] for row in error_book["人员基本信息"].iter_rows(min_row=2)],
+        )
+        self.assertEqual(
+            [["父亲", "1950.13", 2]],
+            [[row[2].value, row[3].value, row[5].value] for row in error_book["人员家庭成员信息"].iter_rows(min_row=2)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,10 @@ from unittest.mock import patch
 
 os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
 
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QMessageBox
 
 from ui.loading_dialog import ModernLoadingDialog
+from ui import main_window
 from ui.main_window import MainWindow
 
 
@@ -101,11 +102,46 @@ class MainWindowProgressDialogTests(unittest.TestCase):
                 self.assertEqual("测试标题", dialog.windowTitle())
                 dialog.close()
 
+    def test_modern_loading_dialog_shows_progress_and_requests_cancel(self):
+        dialog = ModernLoadingDialog(None, title="正在导入数据", message="正在导入", icon_kind="import")
+        self.addCleanup(dialog.deleteLater)
+        cancelled = []
+
+        dialog.set_progress(*MainWindow._format_import_progress(
+            {"stage": "written", "parsed": 10, "validated": 10, "written": 4, "total": 10, "rows_per_sec": 2000.0}
+        ))
+        dialog.set_cancel_handler(lambda: cancelled.append(True))
+        dialog.cancel_button.click()
+
+        self.assertEqual((4, 10), (dialog.progress_bar.value(), dialog.progress_bar.maximum()))
+        self.assertEqual("已解析 10 行 · 已校验 10 行 · 已写入 4 / 10 行 · 2,000 行/秒", dialog.detail_label.text())
+        self.assertEqual([True], cancelled)
+        self.assertFalse(dialog.cancel_button.isEnabled())
+
+    def test_worker_passes_progress_and_cancel_callbacks(self):
+        from ui.worker import Worker
+
+        reported = []
+
+        def task(report_progress, is_cancelled):
+            report_progress({"stage": "parsed"})
+            worker.cancel()
+            return is_cancelled()
+
+        worker = Worker(task, reports_progress=True)
+        worker.progress.connect(reported.append)
+        results = []
+        worker.finished.connect(results.append)
+        worker.run()
+
+        self.assertEqual([{"stage": "parsed"}], reported)
+        self.assertEqual([True], results)
+
     def test_export_data_uses_modern_export_progress_dialog(self):
         window = self.make_window_stub()
         calls = []
 
-        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None):
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
             calls.append((title, progress_dialog_factory))
 
         window.run_background_task = run_background_task
@@ -120,11 +156,12 @@ class MainWindowProgressDialogTests(unittest.TestCase):
         self.assertEqual("正在导出数据", dialog.windowTitle())
         self.assertEqual("export", dialog.icon_kind)
 
-    def test_export_data_reads_full_rows_from_database_connection(self):
+    def test_export_data_streams_batches_from_database_connection(self):
         window = self.make_window_stub()
         calls = {}
+        exported = []
 
-        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None):
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
             calls["title"] = title
             calls["task_fn"] = task_fn
             calls["on_success"] = on_success
@@ -136,14 +173,9 @@ class MainWindowProgressDialogTests(unittest.TestCase):
             def __init__(self):
                 self.closed = False
 
-            def search_personnel(self, **kwargs):
-                return {
-                    "base_info": [
-                        {"sequence": 1, "name": "张三"},
-                        {"sequence": 2, "name": "李四"},
-                    ],
-                    "total_count": 2,
-                }
+            def iter_search_personnel(self, **kwargs):
+                yield [{"sequence": 1, "name": "张三"}]
+                yield [{"sequence": 2, "name": "李四"}]
 
             def get_assessment_years(self):
                 return [2020, 2021, 2022, 2023, 2024]
@@ -156,27 +188,105 @@ class MainWindowProgressDialogTests(unittest.TestCase):
         with (
             patch("ui.main_window.QFileDialog.getSaveFileName", return_value=("D:/tmp/base_info.xlsx", "")),
             patch("ui.main_window.Database", return_value=fake_db),
-            patch("ui.main_window.export_table_data", return_value=2) as export_mock,
+            patch(
+                "ui.main_window.export_table_batches",
+                side_effect=lambda batches, *args: exported.append((list(batches), *args)) or 2,
+            ),
         ):
             MainWindow.export_data(window, "base_info")
             exported_count = calls["task_fn"]()
 
         self.assertEqual("正在导出数据", calls["title"])
         self.assertTrue(calls["progress_dialog_factory"] is not None)
-        export_mock.assert_called_once_with(
-            [{"sequence": 1, "name": "张三"}, {"sequence": 2, "name": "李四"}],
-            "D:/tmp/base_info.xlsx",
-            "base_info",
-            [2020, 2021, 2022, 2023, 2024],
+        self.assertEqual(
+            [(
+                [[{"sequence": 1, "name": "张三"}], [{"sequence": 2, "name": "李四"}]],
+                "D:/tmp/base_info.xlsx",
+                "base_info",
+                [2020, 2021, 2022, 2023, 2024],
+            )],
+            exported,
         )
         self.assertEqual(2, exported_count)
         self.assertTrue(fake_db.closed)
 
+    def test_export_all_data_runs_one_job_for_permitted_tables(self):
+        window = self.make_window_stub()
+        window.permissions = {"base_info": True, "rewards": False, "family": True, "resume": True}
+        calls = {}
+        window.set_status = lambda message: calls.setdefault("status", message)
+
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **options):
+            calls["options"] = options
+            on_success(task_fn(lambda info: None, lambda: False))
+
+        window.run_background_task = run_background_task
+        fake_db = type("FakeDb", (), {"close": lambda self: calls.setdefault("closed", True)})()
+
+        with (
+            patch("ui.main_window.QFileDialog.getSaveFileName", return_value=("D:/tmp/all.xlsx", "")),
+            patch("ui.main_window.Database", return_value=fake_db),
+            patch("ui.main_window.show_toast"),
+            patch(
+                "ui.main_window.export_all_tables",
+                return_value={"base_info": 2, "family": 3, "resume": 0},
+            ) as export_mock,
+        ):
+            MainWindow.export_all_data(window)
+
+        self.assertEqual((fake_db, "D:/tmp/all.xlsx", ["base_info", "family", "resume"]), export_mock.call_args.args[:3])
+        self.assertIs(MainWindow._format_export_progress, calls["options"]["progress_formatter"])
+        self.assertTrue(calls["closed"])
+        self.assertIn("人员家庭成员信息 3 条", calls["status"])
+        self.assertEqual(
+            (1, 4, "正在导出人员家庭成员信息（第 2/4 个工作表），已写入 500 行"),
+            MainWindow._format_export_progress({"table": "family", "index": 2, "total": 4, "rows": 500}),
+        )
+
+    def test_export_changed_data_runs_delta_job_for_permitted_tables(self):
+        window = self.make_window_stub()
+        window.permissions = {"base_info": True, "rewards": False, "family": True, "resume": False}
+        calls = {}
+        window.set_status = lambda message: calls.setdefault("status", message)
+
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **options):
+            calls["options"] = options
+            on_success(task_fn(lambda info: None, lambda: False))
+
+        window.run_background_task = run_background_task
+        fake_db = type("FakeDb", (), {"close": lambda self: calls.setdefault("closed", True)})()
+
+        with (
+            patch("ui.main_window.QFileDialog.getSaveFileName", return_value=("D:/tmp/delta.xlsx", "")),
+            patch("ui.main_window.Database", return_value=fake_db),
+            patch("ui.main_window.show_toast"),
+            patch(
+                "ui.main_window.export_changed_tables",
+                return_value={"base_info": 1, "family": 0},
+            ) as export_mock,
+        ):
+            MainWindow.export_changed_data(window)
+
+        self.assertEqual((fake_db, "D:/tmp/delta.xlsx", ["base_info", "family"]), export_mock.call_args.args[:3])
+        self.assertIs(MainWindow._format_export_progress, calls["options"]["progress_formatter"])
+        self.assertTrue(calls["closed"])
+        self.assertIn("增量导出成功：人员基本信息 1 条", calls["status"])
+
+    def test_export_path_gets_extension_of_selected_format(self):
+        self.assertEqual("D:/tmp/a.csv", MainWindow._export_path_with_extension("D:/tmp/a", "CSV文件 (*.csv)"))
+        self.assertEqual("D:/tmp/a.JSONL", MainWindow._export_path_with_extension("D:/tmp/a.JSONL", "Excel文件 (*.xlsx)"))
+        self.assertEqual("D:/tmp/a.b.xlsx", MainWindow._export_path_with_extension("D:/tmp/a.b", ""))
+
+    def test_parquet_export_is_offered_only_with_pyarrow(self):
+        self.assertEqual(main_window.pq is not None, ".parquet" in main_window.EXPORT_FILE_FILTERS)
+        self.assertEqual([".xlsx", ".csv"], list(main_window.EXPORT_FILE_FILTERS)[:2])
+        self.assertEqual(".jsonl", list(main_window.EXPORT_FILE_FILTERS)[-1])
+
     def test_import_data_preview_uses_modern_import_progress_dialog(self):
         window = self.make_window_stub()
         calls = []
 
-        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None):
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
             calls.append((title, progress_dialog_factory))
 
         window.run_background_task = run_background_task
@@ -195,7 +305,7 @@ class MainWindowProgressDialogTests(unittest.TestCase):
         window = self.make_window_stub()
         calls = []
 
-        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None):
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
             calls.append((title, progress_dialog_factory))
             if len(calls) == 1:
                 on_success(
@@ -245,7 +355,7 @@ class MainWindowProgressDialogTests(unittest.TestCase):
         window = self.make_window_stub()
         calls = []
 
-        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None):
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
             calls.append(title)
             if title == "正在读取数据":
                 on_success(
@@ -276,7 +386,7 @@ class MainWindowProgressDialogTests(unittest.TestCase):
         window = self.make_window_stub()
         calls = []
 
-        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None):
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
             calls.append(title)
             if title == "正在读取数据":
                 on_success(
@@ -285,6 +395,7 @@ class MainWindowProgressDialogTests(unittest.TestCase):
                         "records": [{"sequence": 1, "name": "张三", "relation": "父亲"}],
                         "assessment_years": [],
                         "duplicate_keys": [("1", "张三")],
+                        "session": "preview-session",
                     }
                 )
             else:
@@ -302,7 +413,100 @@ class MainWindowProgressDialogTests(unittest.TestCase):
         self.assertEqual(["正在读取数据", "正在导入数据"], calls)
         self.assertTrue(import_mock.called)
         self.assertEqual({}, import_mock.call_args.kwargs)
+        self.assertEqual("preview-session", import_mock.call_args.args[4])
+
+
+    def test_import_workbook_data_runs_one_cancellable_job_for_permitted_tables(self):
+        window = self.make_window_stub()
+        window.permissions = {"base_info": True, "rewards": False, "family": True, "resume": False}
+        calls = {}
+
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **options):
+            calls["title"] = title
+            calls["options"] = options
+            on_success(task_fn())
+
+        window.run_background_task = run_background_task
+        window.set_status = lambda message: calls.setdefault("status", message)
+
+        with (
+            patch("ui.main_window.QFileDialog.getOpenFileName", return_value=("D:/tmp/roster.xlsx", "")),
+            patch("ui.main_window.QMessageBox.question", return_value=QMessageBox.Yes),
+            patch("ui.main_window.show_toast"),
+            patch(
+                "ui.main_window.import_workbook",
+                return_value={"success": True, "message": "人员基本信息：ok", "results": {"base_info": {}}},
+            ) as import_mock,
+        ):
+            MainWindow.import_workbook_data(window)
+
+        self.assertEqual("正在导入数据", calls["title"])
+        self.assertTrue(calls["options"]["cancellable"])
+        self.assertIs(MainWindow._format_import_progress, calls["options"]["progress_formatter"])
+        self.assertEqual(["base_info", "family"], import_mock.call_args.args[4])
+        self.assertEqual("导入成功：整本工作簿，人员基本信息：ok", calls["status"])
+
+    def test_preview_validation_failure_offers_error_workbook_export(self):
+        window = self.make_window_stub()
+        statuses = []
+        window.set_status = statuses.append
+        report = object()
+        exported = []
+
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
+            on_success({"success": False, "message": "校验发现 2 处问题\n第 2 行 C 列：有误", "validation": report})
+
+        class ExportingMessageBox(self.FakeMessageBox):
+            Critical = object()
+            instances = []
+
+            def exec_(self):
+                self.clicked_button = self.buttons[0]
+
+        window.run_background_task = run_background_task
+        window.export_validation_reports = exported.append
+
+        with (
+            patch("ui.main_window.QFileDialog.getOpenFileName", return_value=("D:/tmp/base_info.xlsx", "")),
+            patch("ui.main_window.QMessageBox", ExportingMessageBox),
+        ):
+            MainWindow.import_data(window, "base_info")
+
+        message_box = ExportingMessageBox.instances[0]
+        self.assertEqual("校验发现 2 处问题", message_box.text)
+        self.assertIn("第 2 行 C 列：有误", message_box.informative_text)
+        self.assertEqual("导出错误清单", message_box.buttons[0]["text"])
+        self.assertEqual([[report]], exported)
+        self.assertEqual(["导入失败：人员基本信息，校验发现 2 处问题"], statuses)
+
+    def test_import_data_stops_when_preview_finds_nothing_to_write(self):
+        window = self.make_window_stub()
+        window.set_status = lambda message: None
+        calls = []
+
+        def run_background_task(title, task_fn, on_success=None, on_error=None, progress_dialog_factory=None, **_options):
+            calls.append(title)
+            on_success(
+                {
+                    "success": True,
+                    "records": [{"sequence": 1, "name": "张三"}],
+                    "duplicate_keys": [("1", "张三")],
+                    "diff": {"new": 0, "changed": 0, "unchanged": 1},
+                }
+            )
+
+        window.run_background_task = run_background_task
+
+        with (
+            patch("ui.main_window.QFileDialog.getOpenFileName", return_value=("D:/tmp/base_info.xlsx", "")),
+            patch("ui.main_window.QMessageBox.information") as information,
+            patch.object(MainWindow, "confirm_import_mode") as confirm,
+        ):
+            MainWindow.import_data(window, "base_info")
 
+        self.assertEqual(["正在读取数据"], calls)
+        confirm.assert_not_called()
+        self.assertIn("未变化 1 人", information.call_args.args[2])
 
 if __name__ == "__main__":
     unittest.main()
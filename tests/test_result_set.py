@@ -0,0 +1,80 @@
+import json
+import unittest
+
+from core.result_set import ResultSet, json_default
+
+
+class ResultSetTests(unittest.TestCase):
+    def make_result_set(self):
+        return ResultSet(("id", "name", "grade"), [(1, "张三", "一级"), (2, "李四", None), (3, "王五", "二级")])
+
+    def test_rows_behave_like_read_only_dicts(self):
+        result_set = self.make_result_set()
+
+        row = result_set[1]
+        self.assertEqual("李四", row["name"])
+        self.assertIsNone(row.get("grade"))
+        self.assertEqual("缺省", row.get("missing", "缺省"))
+        self.assertIn("name", row)
+        self.assertEqual({"id": 2, "name": "李四", "grade": None}, dict(row))
+        self.assertEqual({"id": 2, "name": "李四", "grade": None}, row)
+        self.assertEqual(["张三", "李四", "王五"], [item["name"] for item in result_set])
+        with self.assertRaises(TypeError):
+            row["name"] = "改名"
+
+    def test_slicing_and_projection_share_header_without_building_dicts(self):
+        result_set = self.make_result_set()
+
+        page = result_set[1:]
+        self.assertIsInstance(page, ResultSet)
+        self.assertEqual(result_set.columns, page.columns)
+        self.assertEqual([(2, "李四", None), (3, "王五", "二级")], page.rows)
+
+        projected = result_set.project(["name", "remarks"], default="")
+        self.assertEqual(("name", "remarks"), projected.columns)
+        self.assertEqual([("张三", ""), ("李四", ""), ("王五", "")], projected.rows)
+        self.assertIs(result_set, result_set.project(result_set.columns))
+        self.assertEqual([1, 2, 3], result_set.column("id"))
+
+    def test_compares_equal_to_equivalent_list_of_dicts(self):
+        result_set = self.make_result_set()
+        records = result_set.to_dicts()
+
+        self.assertEqual(records, result_set)
+        self.assertEqual(result_set, ResultSet.from_dicts(records))
+        self.assertNotEqual(records[:2], result_set)
+        self.assertFalse(ResultSet(()))
+
+    def test_concat_and_coerce_accept_batches_and_plain_dicts(self):
+        result_set = self.make_result_set()
+
+        joined = ResultSet.concat([result_set[:1], [], [{"id": 9, "name": "赵六"}], result_set[2:]])
+
+        self.assertEqual(result_set.columns, joined.columns)
+        self.assertEqual([1, 9, 3], joined.column("id"))
+        self.assertIsNone(joined[1]["grade"])
+        self.assertIs(result_set, ResultSet.coerce(result_set))
+        self.assertEqual(("a", "b"), ResultSet.coerce([{"a": 1}, {"b": 2}]).columns)
+
+    def test_concat_keeps_columns_that_only_later_batches_have(self):
+        first = ResultSet(("id", "name"), [(1, "张三")])
+        second = ResultSet(("id", "grade"), [(2, "一级")])
+
+        joined = ResultSet.concat([first, second])
+
+        self.assertEqual(("id", "name", "grade"), joined.columns)
+        self.assertEqual([(1, "张三", None), (2, None, "一级")], joined.rows)
+
+    def test_json_default_serializes_result_sets(self):
+        result_set = self.make_result_set()[:1]
+
+        text = json.dumps({"rows": result_set, "row": result_set[0]}, ensure_ascii=False, default=json_default)
+
+        self.assertEqual(
+            {"rows": [{"id": 1, "name": "张三", "grade": "一级"}], "row": {"id": 1, "name": "张三", "grade": "一级"}},
+            json.loads(text),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,6 +30,7 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
+from core.result_set import ResultSet, json_default
 from services.ai_context import recommend_context_length
 from services.ai_direct import ask_model, ask_model_stream, build_analysis_data_json, build_messages, is_context_length_error
 from services.ollama_manager import APP_OLLAMA_HOST, fetch_ollama_models
@@ -1001,10 +1002,7 @@ def filter_analysis_payload_by_columns(analysis_payload: dict, column_selection:
             "table_name": source_table.get("table_name") or table_name,
             "table_label": source_table.get("table_label") or schema.get("table_label") or table_name,
             "field_labels": selected_labels,
-            "rows": [
-                {field: row.get(field, "") for field in selected}
-                for row in list(source_table.get("rows") or [])
-            ],
+            "rows": ResultSet.coerce(source_table.get("rows") or []).project(selected, default=""),
         }
 
     return {
@@ -1035,7 +1033,7 @@ def estimate_text_tokens(text: str) -> int:
 
 
 def estimate_payload_tokens(analysis_payload: dict) -> int:
-    payload_text = json.dumps(analysis_payload or {}, ensure_ascii=False, separators=(",", ":"), default=str)
+    payload_text = json.dumps(analysis_payload or {}, ensure_ascii=False, separators=(",", ":"), default=json_default)
     raw_tokens = estimate_text_tokens(payload_text)
     return max(1, math.ceil(raw_tokens * (1 + CONTEXT_BUFFER_RATIO)))
 
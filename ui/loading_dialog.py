@@ -6,6 +6,8 @@ from PyQt5.QtWidgets import (
     QGraphicsDropShadowEffect,
     QHBoxLayout,
     QLabel,
+    QProgressBar,
+    QPushButton,
     QSizePolicy,
     QVBoxLayout,
     QWidget,
@@ -180,11 +182,28 @@ class ModernLoadingDialog(QDialog):
         message_label.setObjectName("loadingMessage")
         message_label.setWordWrap(True)
 
+        # 进度条、进度说明和取消按钮仅在后台任务报告进度或允许取消时显示
+        self.progress_bar = QProgressBar(panel)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setFixedHeight(8)
+        self.progress_bar.hide()
+        self.detail_label = QLabel("")
+        self.detail_label.setObjectName("loadingDetail")
+        self.detail_label.setWordWrap(True)
+        self.detail_label.hide()
+        self.cancel_button = QPushButton("取消", panel)
+        self.cancel_button.hide()
+        self._cancel_handler = None
+        self.cancel_button.clicked.connect(self._request_cancel)
+
         text_layout = QVBoxLayout()
         text_layout.setContentsMargins(0, 0, 0, 0)
         text_layout.setSpacing(6)
         text_layout.addWidget(title_label)
         text_layout.addWidget(message_label)
+        text_layout.addWidget(self.progress_bar)
+        text_layout.addWidget(self.detail_label)
+        text_layout.addWidget(self.cancel_button, 0, Qt.AlignRight)
 
         row.addWidget(self._create_icon(panel, icon_kind), 0, Qt.AlignTop)
         row.addLayout(text_layout, 1)
@@ -207,6 +226,10 @@ class ModernLoadingDialog(QDialog):
                 color: #57606A;
                 font-size: 15px;
             }
+            QLabel#loadingDetail {
+                color: #57606A;
+                font-size: 13px;
+            }
             """
         )
 
@@ -217,6 +240,30 @@ class ModernLoadingDialog(QDialog):
             return FileTransferIcon(icon_kind, parent)
         return AiChipIcon(parent)
 
+    def set_progress(self, value=None, maximum=None, detail=""):
+        """显示进度；maximum 未知时进度条为忙碌状态。"""
+        if maximum:
+            self.progress_bar.setRange(0, int(maximum))
+            self.progress_bar.setValue(min(int(value or 0), int(maximum)))
+        else:
+            self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.detail_label.setText(detail)
+        self.detail_label.setVisible(bool(detail))
+
+    def set_cancel_handler(self, handler):
+        """显示取消按钮，点击后调用 handler（协作式取消，由后台任务自行停止）。"""
+        self._cancel_handler = handler
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setText("取消")
+        self.cancel_button.setVisible(handler is not None)
+
+    def _request_cancel(self):
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setText("正在取消...")
+        if self._cancel_handler is not None:
+            self._cancel_handler()
+
     def reject(self):
         return
 
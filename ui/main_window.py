@@ -7,8 +7,9 @@ from PyQt5.QtWidgets import (
     QMessageBox, QStatusBar, QDialog, QLabel, QProgressDialog
 )
 from core.database import Database
-from services.excel_export import export_table_data
-from services.excel_import import import_prepared_records, prepare_import_preview
+from services.excel_export import export_all_tables, export_changed_tables, export_table_batches, pq
+from services.excel_import import import_prepared_records, import_workbook, prepare_import_preview
+from services.import_validation import write_validation_workbook
 from config import config
 from ui.change_password import ChangePasswordDialog
 from ui.confirm_dialog import confirm_danger
@@ -21,6 +22,18 @@ from metadata.constants import ADMIN_PERMISSIONS, DEFAULT_PERMISSIONS, TABLE_LAB
 
 logger = logging.getLogger('MainWindow')
 
+# Parquet 需要可选依赖 pyarrow，未安装时不在保存对话框中提供
+EXPORT_FILE_FILTERS = {
+    extension: file_filter
+    for extension, file_filter in (
+        (".xlsx", "Excel文件 (*.xlsx)"),
+        (".csv", "CSV文件 (*.csv)"),
+        (".parquet", "Parquet文件 (*.parquet)"),
+        (".jsonl", "JSON Lines文件 (*.jsonl)"),
+    )
+    if extension != ".parquet" or pq is not None
+}
+
 
 class MainWindow(QMainWindow):
     def __init__(self, db, username, permissions):
@@ -111,6 +124,11 @@ class MainWindow(QMainWindow):
                 import_action.triggered.connect(lambda _, t=table_name: self.import_data(t))
                 file_menu.addAction(import_action)
 
+        if any(self.permissions.get(table_name) for table_name in TABLE_LABELS):
+            import_workbook_action = QAction("导入整本工作簿", self)
+            import_workbook_action.triggered.connect(self.import_workbook_data)
+            file_menu.addAction(import_workbook_action)
+
         # 清空数据库菜单项（仅管理员可见）
         if self.is_admin:
             file_menu.addSeparator()
@@ -127,6 +145,15 @@ class MainWindow(QMainWindow):
                 export_action.triggered.connect(lambda _, t=table_name: self.export_data(t))
                 export_menu.addAction(export_action)
 
+        if any(self.permissions.get(table_name) for table_name in TABLE_LABELS):
+            export_menu.addSeparator()
+            export_all_action = QAction("导出全部表", self)
+            export_all_action.triggered.connect(self.export_all_data)
+            export_menu.addAction(export_all_action)
+            export_changed_action = QAction("增量导出（自上次增量导出以来的变化）", self)
+            export_changed_action.triggered.connect(self.export_changed_data)
+            export_menu.addAction(export_changed_action)
+
         # 账户菜单
         account_menu = menubar.addMenu("账户")
 
@@ -189,8 +216,15 @@ class MainWindow(QMainWindow):
         on_success=None,
         on_error=None,
         progress_dialog_factory=None,
+        progress_formatter=None,
+        cancellable=False,
     ):
-        """在线程中执行耗时任务，并显示忙碌进度框。"""
+        """在线程中执行耗时任务，并显示忙碌进度框。
+
+        传入 progress_formatter 时，task_fn 以 (report_progress, is_cancelled) 调用，
+        formatter 把任务上报的进度转换为 (当前值, 最大值, 说明) 显示在进度框中；
+        cancellable 为真且进度框支持时显示取消按钮，取消由任务在批次边界响应。
+        """
         if progress_dialog_factory is not None:
             progress = progress_dialog_factory(self, title)
         else:
@@ -204,8 +238,14 @@ class MainWindow(QMainWindow):
         progress.show()
 
         thread = QThread(self)
-        worker = Worker(task_fn)
+        worker = Worker(task_fn, reports_progress=progress_formatter is not None)
         worker.moveToThread(thread)
+        if cancellable and hasattr(progress, "set_cancel_handler"):
+            progress.set_cancel_handler(worker.cancel)
+
+        def show_progress(info):
+            if hasattr(progress, "set_progress"):
+                progress.set_progress(*progress_formatter(info))
 
         task_ref = {
             "thread": thread,
@@ -228,6 +268,7 @@ class MainWindow(QMainWindow):
             on_error=on_error or default_error,
             on_done=cleanup,
             parent=self,
+            on_progress=show_progress if progress_formatter is not None else None,
         )
         task_ref["handler"] = handler
         self._background_tasks.append(task_ref)
@@ -235,12 +276,31 @@ class MainWindow(QMainWindow):
         thread.started.connect(worker.run)
         worker.finished.connect(handler.handle_finished)
         worker.failed.connect(handler.handle_failed)
+        worker.progress.connect(handler.handle_progress)
         worker.done.connect(handler.handle_done)
         worker.done.connect(worker.deleteLater)
         worker.done.connect(thread.quit)
         thread.finished.connect(thread.deleteLater)
         thread.start()
 
+    @staticmethod
+    def _format_import_progress(info: dict) -> tuple:
+        """把导入进度转换为 (当前值, 最大值, 说明)；总行数未知时显示忙碌进度条。"""
+        stage = info.get("stage")
+        total = info.get("total")
+        parts = [f"已解析 {info.get('parsed', 0)} 行", f"已校验 {info.get('validated', 0)} 行"]
+        if stage == "written":
+            parts.append(f"已写入 {info.get('written', 0)} / {total} 行" if total else f"已写入 {info.get('written', 0)} 行")
+        elif total:
+            parts[0] = f"已解析 {info.get('parsed', 0)} / 约 {total} 行"
+        rows_per_sec = info.get("rows_per_sec")
+        if rows_per_sec:
+            parts.append(f"{rows_per_sec:,.0f} 行/秒")
+        value = info.get(stage or "parsed", 0)
+        if total:
+            value = min(value, total)
+        return value, total, " · ".join(parts)
+
     # =================== 新增导出数据方法 ===================
     def export_data(self, table_name: str):
         """导出指定表的数据到Excel文件"""
@@ -278,29 +338,34 @@ class MainWindow(QMainWindow):
                 if last_dialog_dir else default_file_name
             )
 
-            # 选择保存位置
-            file_path, _ = QFileDialog.getSaveFileName(
+            # 选择保存位置和格式；CSV/Parquet/JSON Lines 供统计脚本等程序读取
+            file_path, selected_filter = QFileDialog.getSaveFileName(
                 self, f"保存{chinese_name}",
                 default_save_path,
-                "Excel文件 (*.xlsx)"
+                ";;".join(EXPORT_FILE_FILTERS.values())
             )
 
             if not file_path:
                 return  # 用户取消了保存
+            file_path = self._export_path_with_extension(file_path, selected_filter)
             self.last_export_dir = self.get_selected_dir(file_path)
 
             export_query_conditions = dict(query_conditions)
 
             def export_task():
-                export_db = Database(config.DB_PATH)
+                export_db = Database(config.DB_PATH, open_existing=True)
                 try:
-                    results_dict = export_db.search_personnel(
-                        table_name=table_name,
-                        **export_query_conditions,
-                    )
-                    export_data = [dict(row) for row in results_dict.get(table_name, [])]
                     assessment_years = export_db.get_assessment_years()
-                    return export_table_data(export_data, file_path, table_name, assessment_years)
+                    # 逐批从游标读取并写入，不在内存中保留完整结果
+                    return export_table_batches(
+                        export_db.iter_search_personnel(
+                            table_name=table_name,
+                            **export_query_conditions,
+                        ),
+                        file_path,
+                        table_name,
+                        assessment_years,
+                    )
                 finally:
                     export_db.close()
 
@@ -336,6 +401,120 @@ class MainWindow(QMainWindow):
                 self, "严重错误",
                 f"导出过程中发生严重错误:\n{str(e)}"
             )
+
+    @staticmethod
+    def _export_path_with_extension(file_path: str, selected_filter: str) -> str:
+        """文件名没有可识别的导出扩展名时，按所选文件类型补上扩展名。"""
+        if os.path.splitext(file_path)[1].lower() in EXPORT_FILE_FILTERS:
+            return file_path
+        for extension, file_filter in EXPORT_FILE_FILTERS.items():
+            if file_filter == selected_filter:
+                return file_path + extension
+        return file_path + ".xlsx"
+
+    @staticmethod
+    def _format_export_progress(info: dict) -> tuple:
+        """把整库导出进度转换为 (当前值, 最大值, 说明)，按工作表推进。"""
+        label = TABLE_LABELS.get(info.get("table"), info.get("table", ""))
+        index, total = info.get("index", 0), info.get("total", 0)
+        return index - 1, total, f"正在导出{label}（第 {index}/{total} 个工作表），已写入 {info.get('rows', 0)} 行"
+
+    def export_all_data(self):
+        """按当前查询条件把有权限的全部表导出到一个工作簿，每表一个工作表。"""
+        query_conditions_getter = getattr(getattr(self, "query_tab", None), "get_last_query_conditions", None)
+        query_conditions = query_conditions_getter() if callable(query_conditions_getter) else None
+        if query_conditions is None:
+            self.set_status("导出失败：请先执行查询操作")
+            QMessageBox.warning(self, "导出失败", "请先执行查询操作")
+            return
+
+        tables = [table_name for table_name in TABLE_LABELS if self.permissions.get(table_name)]
+        last_dialog_dir = self.get_dialog_dir(self.last_export_dir)
+        default_file_name = "人员信息全部表.xlsx"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "保存全部表",
+            os.path.join(last_dialog_dir, default_file_name) if last_dialog_dir else default_file_name,
+            "Excel文件 (*.xlsx)"
+        )
+        if not file_path:
+            return
+        self.last_export_dir = self.get_selected_dir(file_path)
+        export_query_conditions = dict(query_conditions)
+
+        def export_task(report_progress=None, is_cancelled=None):
+            export_db = Database(config.DB_PATH, open_existing=True)
+            try:
+                return export_all_tables(export_db, file_path, tables, report_progress, **export_query_conditions)
+            finally:
+                export_db.close()
+
+        def handle_export_success(counts):
+            summary = "，".join(f"{TABLE_LABELS[table_name]} {count} 条" for table_name, count in counts.items())
+            self.set_status(f"导出成功：全部表，{summary}，保存到 {file_path}")
+            show_toast(self, f"全部表导出成功：{summary}")
+
+        def handle_export_error(message: str):
+            logger.error(f"导出全部表失败: {message}")
+            self.set_status("导出失败：全部表")
+            QMessageBox.critical(self, "导出失败", f"导出全部表时发生错误:\n{message}")
+
+        self.run_background_task(
+            "正在导出数据",
+            export_task,
+            handle_export_success,
+            handle_export_error,
+            progress_dialog_factory=self._modern_progress_dialog_factory(
+                "正在导出数据",
+                "正在把全部表导出到一个 Excel 文件，请稍候...",
+                "export",
+            ),
+            progress_formatter=self._format_export_progress,
+        )
+
+    def export_changed_data(self):
+        """把有权限的各表中自上次增量导出以来新增或修改的行导出到一个工作簿。"""
+        tables = [table_name for table_name in TABLE_LABELS if self.permissions.get(table_name)]
+        last_dialog_dir = self.get_dialog_dir(self.last_export_dir)
+        default_file_name = "人员信息增量.xlsx"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "保存增量数据",
+            os.path.join(last_dialog_dir, default_file_name) if last_dialog_dir else default_file_name,
+            "Excel文件 (*.xlsx)"
+        )
+        if not file_path:
+            return
+        self.last_export_dir = self.get_selected_dir(file_path)
+
+        def export_task(report_progress=None, is_cancelled=None):
+            export_db = Database(config.DB_PATH, open_existing=True)
+            try:
+                return export_changed_tables(export_db, file_path, tables, report_progress)
+            finally:
+                export_db.close()
+
+        def handle_export_success(counts):
+            summary = "，".join(f"{TABLE_LABELS[table_name]} {count} 条" for table_name, count in counts.items())
+            self.set_status(f"增量导出成功：{summary}，保存到 {file_path}")
+            show_toast(self, f"增量导出成功：{summary}")
+
+        def handle_export_error(message: str):
+            logger.error(f"增量导出失败: {message}")
+            self.set_status("增量导出失败")
+            QMessageBox.critical(self, "导出失败", f"增量导出时发生错误:\n{message}")
+
+        self.run_background_task(
+            "正在导出数据",
+            export_task,
+            handle_export_success,
+            handle_export_error,
+            progress_dialog_factory=self._modern_progress_dialog_factory(
+                "正在导出数据",
+                "正在导出自上次增量导出以来的新增和修改，请稍候...",
+                "export",
+            ),
+            progress_formatter=self._format_export_progress,
+        )
+
     # ============== 新增：日志相关方法 ==============
     def ensure_admin_log_access(self) -> bool:
         """Return True only when the current user can manage logs."""
@@ -409,7 +588,17 @@ class MainWindow(QMainWindow):
         """获取用户选择文件所在目录。"""
         return os.path.dirname(file_path) if file_path else ""
 
-    def confirm_import_mode(self, table_name: str, duplicate_keys: list) -> str:
+    @staticmethod
+    def _format_import_diff(table_name: str, diff: dict) -> str:
+        """把预览的变化统计转换为一行说明。"""
+        if table_name == "base_info":
+            return (
+                f"新增 {diff.get('new', 0)} 人，内容有变化 {diff.get('changed', 0)} 人，"
+                f"未变化 {diff.get('unchanged', 0)} 人（将跳过）"
+            )
+        return f"新增明细 {diff.get('new', 0)} 条，重复明细 {diff.get('unchanged', 0)} 条（将跳过）"
+
+    def confirm_import_mode(self, table_name: str, duplicate_keys: list, diff: dict = None) -> str:
         """当本次导入记录与数据库已有记录重复时，确认导入方式。"""
         if not duplicate_keys:
             return 'append'
@@ -423,6 +612,8 @@ class MainWindow(QMainWindow):
         sample_text = "\n".join(sample_keys)
         if len(duplicate_keys) > 5:
             sample_text += f"\n等 {len(duplicate_keys)} 条重复记录"
+        if diff:
+            sample_text += f"\n\n本次变化：{self._format_import_diff(table_name, diff)}"
 
         message_box = QMessageBox(self)
         message_box.setIcon(QMessageBox.Question)
@@ -458,6 +649,65 @@ class MainWindow(QMainWindow):
         return 'cancel'
 
 
+    def show_import_failure(self, message: str, reports: list = None):
+        """显示导入失败信息；有校验报告时提供“导出错误清单”按钮。"""
+        if not reports:
+            QMessageBox.critical(self, "导入失败", message)
+            return
+
+        summary, _, details = message.partition("\n")
+        message_box = QMessageBox(self)
+        message_box.setIcon(QMessageBox.Critical)
+        message_box.setWindowTitle("导入失败")
+        message_box.setText(summary)
+        message_box.setInformativeText(
+            f"{details}\n\n"
+            "可导出错误清单：清单包含全部数据行，问题单元格标红并在行末说明原因，"
+            "修正后可直接重新导入。"
+        )
+        export_button = message_box.addButton("导出错误清单", QMessageBox.AcceptRole)
+        close_button = message_box.addButton("关闭", QMessageBox.RejectRole)
+        message_box.setDefaultButton(close_button)
+        message_box.exec_()
+        if message_box.clickedButton() == export_button:
+            self.export_validation_reports(reports)
+
+    def export_validation_reports(self, reports: list):
+        """把导入校验报告导出为标注了问题的错误工作簿。"""
+        last_dialog_dir = self.get_dialog_dir(self.last_import_dir)
+        default_file_name = "导入错误清单.xlsx"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "保存错误清单",
+            os.path.join(last_dialog_dir, default_file_name) if last_dialog_dir else default_file_name,
+            "Excel文件 (*.xlsx)"
+        )
+        if not file_path:
+            return
+
+        def export_task():
+            write_validation_workbook(file_path, reports)
+            return sum(len(report.issues) for report in reports)
+
+        def handle_export_success(issue_count):
+            self.set_status(f"已导出错误清单：{issue_count} 处问题，保存到 {file_path}")
+            show_toast(self, f"错误清单导出成功，共 {issue_count} 处问题")
+
+        def handle_export_error(message: str):
+            logger.error(f"导出错误清单失败: {message}")
+            QMessageBox.critical(self, "导出失败", f"导出错误清单时发生错误:\n{message}")
+
+        self.run_background_task(
+            "正在导出错误清单",
+            export_task,
+            handle_export_success,
+            handle_export_error,
+            progress_dialog_factory=self._modern_progress_dialog_factory(
+                "正在导出错误清单",
+                "正在生成错误清单 Excel 文件，请稍候...",
+                "export",
+            ),
+        )
+
     def import_data(self, table_name: str):
         """导入指定表的数据"""
         logger.info(f"尝试导入表: {table_name}")
@@ -469,7 +719,8 @@ class MainWindow(QMainWindow):
 
         file_path, _ = QFileDialog.getOpenFileName(
             self, f"选择{TABLE_LABELS[table_name]}数据文件",
-            self.get_dialog_dir(self.last_import_dir), "Excel Files (*.xlsx *.xls)"
+            self.get_dialog_dir(self.last_import_dir),
+            "数据文件 (*.xlsx *.xls *.csv *.parquet);;Excel Files (*.xlsx *.xls);;CSV Files (*.csv);;Parquet Files (*.parquet)"
         )
         if not file_path:
             return
@@ -477,18 +728,33 @@ class MainWindow(QMainWindow):
 
         table_label = TABLE_LABELS[table_name]
 
-        def preview_task():
-            return prepare_import_preview(file_path, config.DB_PATH, table_name)
+        def preview_task(report_progress=None, is_cancelled=None):
+            return prepare_import_preview(file_path, config.DB_PATH, table_name, report_progress, is_cancelled)
 
         def handle_preview_success(preview_result):
+            if preview_result.get("cancelled"):
+                self.set_status(f"导入已取消：{table_label}")
+                return
             if not preview_result.get("success"):
                 message = preview_result.get("message", "读取文件失败")
-                QMessageBox.critical(self, "导入失败", message)
-                self.set_status(f"导入失败：{table_label}，{message}")
+                report = preview_result.get("validation")
+                self.show_import_failure(message, [report] if report else None)
+                self.set_status(f"导入失败：{table_label}，{message.splitlines()[0]}")
+                return
+
+            diff = preview_result.get("diff")
+            if preview_result.get("unchanged_file") or (
+                diff and not diff.get("new") and not diff.get("changed")
+            ):
+                message = preview_result.get("message") if preview_result.get("unchanged_file") else (
+                    f"没有需要写入的数据：{self._format_import_diff(table_name, diff)}"
+                )
+                QMessageBox.information(self, "无需导入", message)
+                self.set_status(f"无需导入：{table_label}，{message}")
                 return
 
             duplicate_keys = preview_result.get("duplicate_keys", [])
-            import_mode = self.confirm_import_mode(table_name, duplicate_keys)
+            import_mode = self.confirm_import_mode(table_name, duplicate_keys, diff)
             if import_mode == 'cancel':
                 self.set_status(f"导入已取消：{table_label}")
                 return
@@ -500,16 +766,25 @@ class MainWindow(QMainWindow):
             }
             mode_label = mode_labels.get(import_mode, "导入")
 
-            def import_task():
+            def import_task(report_progress=None, is_cancelled=None):
                 return import_prepared_records(
                     config.DB_PATH,
                     table_name,
                     preview_result.get("records", []),
                     preview_result.get("assessment_years"),
+                    preview_result.get("session"),
+                    report_progress,
+                    is_cancelled,
                 )
 
             def handle_import_success(import_result):
                 message = import_result.get("message", "导入完成")
+                if import_result.get("cancelled"):
+                    # 已提交的批次保留，需刷新查询缓存
+                    self.clear_query_cache()
+                    QMessageBox.information(self, "导入已取消", message)
+                    self.set_status(f"导入已取消：{table_label}，{message}")
+                    return
                 if not import_result.get("success"):
                     QMessageBox.critical(self, "导入失败", message)
                     self.set_status(f"导入失败：{table_label}，{message}")
@@ -533,6 +808,8 @@ class MainWindow(QMainWindow):
                     f"正在{mode_label}{table_label}，请稍候...",
                     "import",
                 ),
+                progress_formatter=self._format_import_progress,
+                cancellable=True,
             )
 
         def handle_preview_error(message: str):
@@ -554,6 +831,79 @@ class MainWindow(QMainWindow):
                 f"正在解析{table_label}导入文件，请稍候...",
                 "import",
             ),
+            progress_formatter=self._format_import_progress,
+            cancellable=True,
+        )
+
+    def import_workbook_data(self):
+        """导入整本工作簿：按工作表名称对应各表，在一个后台任务中依次导入。"""
+        tables = [table_name for table_name in TABLE_LABELS if self.permissions.get(table_name)]
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择包含多个工作表的数据文件",
+            self.get_dialog_dir(self.last_import_dir), "Excel Files (*.xlsx *.xls)"
+        )
+        if not file_path:
+            return
+        self.last_import_dir = self.get_selected_dir(file_path)
+
+        sheet_names = "、".join(config.REQUIRED_SHEETS[table_name] for table_name in tables)
+        reply = QMessageBox.question(
+            self,
+            "导入整本工作簿",
+            f"将按工作表名称导入：{sheet_names}。\n"
+            "已存在的人员将被更新，已存在的明细将被跳过。是否继续？",
+        )
+        if reply != QMessageBox.Yes:
+            self.set_status("导入已取消：整本工作簿")
+            return
+
+        def import_task(report_progress=None, is_cancelled=None):
+            return import_workbook(
+                file_path,
+                config.DB_PATH,
+                report_progress,
+                is_cancelled,
+                tables,
+                config.REQUIRED_SHEETS,
+            )
+
+        def handle_import_success(import_result):
+            message = import_result.get("message", "导入完成")
+            if import_result.get("results"):
+                # 部分工作表已写入，需刷新查询缓存
+                self.clear_query_cache()
+            if import_result.get("cancelled"):
+                QMessageBox.information(self, "导入已取消", message)
+                self.set_status(f"导入已取消：整本工作簿，{message}")
+                return
+            if not import_result.get("success"):
+                reports = list(import_result.get("validation", {}).values()) + [
+                    result["validation"]
+                    for result in import_result.get("results", {}).values()
+                    if result.get("validation")
+                ]
+                self.show_import_failure(message, reports)
+                self.set_status("导入失败：整本工作簿，请查看提示")
+                return
+            self.set_status(f"导入成功：整本工作簿，{message.replace(chr(10), '；')}")
+            show_toast(self, "整本工作簿导入成功")
+
+        def handle_import_error(message: str):
+            QMessageBox.critical(self, "导入失败", message)
+            self.set_status(f"导入失败：整本工作簿，{message}")
+
+        self.run_background_task(
+            "正在导入数据",
+            import_task,
+            handle_import_success,
+            handle_import_error,
+            progress_dialog_factory=self._modern_progress_dialog_factory(
+                "正在导入数据",
+                "正在导入整本工作簿，请稍候...",
+                "import",
+            ),
+            progress_formatter=self._format_import_progress,
+            cancellable=True,
         )
 
     def on_clear_database(self):
@@ -1,6 +1,5 @@
 import re
 import logging
-from pathlib import Path
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel,
@@ -13,6 +12,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QSignalBlocker, QThread, pyqtSignal
 from PyQt5.QtGui import QColor, QFont
 from core.database import Database
+from core.result_set import ResultSet
 from config import config
 from metadata.constants import (
     TABLE_LABELS,
@@ -45,8 +45,6 @@ from services.ollama_manager import ensure_ollama_ready
 
 logger = logging.getLogger('QueryTab')
 
-DB_SIGNATURE_SUFFIXES = ("", "-wal", "-shm")
-
 
 def _safe_instance_attr(obj, name: str, default=None):
     try:
@@ -69,24 +67,21 @@ def _freeze_cache_value(value):
     return value
 
 
-def _file_signature(path: Path) -> tuple:
-    try:
-        stat = path.stat()
-        return True, int(stat.st_size), int(stat.st_mtime_ns)
-    except OSError:
-        return False, 0, 0
-
-
-def database_file_signature(db_path) -> tuple:
-    base_path_text = str(db_path)
-    return tuple(
-        (base_path_text + suffix, *_file_signature(Path(base_path_text + suffix)))
-        for suffix in DB_SIGNATURE_SUFFIXES
-    )
+def _project_analysis_rows(source, allowed_fields: set) -> ResultSet:
+    """把结果集（或逐批产出的结果集）投影为只含允许字段的 ResultSet。"""
+    batches = [source] if isinstance(source, (ResultSet, list, tuple)) else source
+    projected = []
+    for batch in batches:
+        batch = ResultSet.coerce(batch)
+        projected.append(batch.project([column for column in batch.columns if column in allowed_fields]))
+    return ResultSet.concat(projected)
 
 
 def build_ai_analysis_payload(results_dict: dict, permissions: dict, assessment_years=None) -> dict:
-    """构建 AI 分析 payload：schema 用于选列，rows 仅供第二阶段分析。"""
+    """构建 AI 分析 payload：schema 用于选列，rows 仅供第二阶段分析。
+
+    每张表的数据可以是行列表、ResultSet 或逐批产出 ResultSet 的迭代器。
+    """
     permissions = normalize_permissions(permissions)
     payload = {
         "schemas": {},
@@ -100,15 +95,7 @@ def build_ai_analysis_payload(results_dict: dict, permissions: dict, assessment_
 
     for table_name in allowed_tables:
         field_labels = get_table_field_labels(table_name, assessment_years or [])
-        allowed_fields = set(field_labels.keys())
-        rows = [
-            {
-                field_name: value
-                for field_name, value in dict(row).items()
-                if field_name in allowed_fields
-            }
-            for row in (results_dict or {}).get(table_name, [])
-        ]
+        rows = _project_analysis_rows((results_dict or {}).get(table_name, []), set(field_labels.keys()))
         payload["schemas"][table_name] = {
             "table_name": table_name,
             "table_label": get_table_label(table_name),
@@ -803,12 +790,17 @@ class QueryTab(QWidget):
             self.parttime_combo.addItem(level, level)
         apply_field_metrics(self.parttime_combo)
 
+        self.keyword_input = QLineEdit()
+        self.keyword_input.setPlaceholderText("职务、学校、奖惩、备注、简历等，空格分隔多个词")
+        apply_field_metrics(self.keyword_input)
+
         add_form_item(0, 0, "姓名", self.name_input)
         add_form_item(0, 1, "出生年月范围", self.birth_range_picker)
         add_form_item(0, 2, "现任职务", self.position_combo)
         add_form_item(1, 0, "职级/等级", grade_widget)
         add_form_item(1, 1, "全日制学历学位", self.education_combo)
         add_form_item(1, 2, "在职学历学位", self.parttime_combo)
+        grid_layout.addWidget(create_form_item("全文检索", self.keyword_input), 2, 0, 1, 3)
 
         # ======== 按钮行 ========
         button_layout = QHBoxLayout()
@@ -857,7 +849,7 @@ class QueryTab(QWidget):
         # ==========================================
         button_layout.addStretch()
 
-        grid_layout.addLayout(button_layout, 2, 0, 1, 3)
+        grid_layout.addLayout(button_layout, 3, 0, 1, 3)
 
         condition_layout.addLayout(grid_layout)
         main_layout.addWidget(condition_group)
@@ -967,6 +959,7 @@ class QueryTab(QWidget):
             self.birth_range_picker,
             self.education_combo,
             self.parttime_combo,
+            self.keyword_input,
         ]
 
     def bind_query_state_events(self):
@@ -990,6 +983,7 @@ class QueryTab(QWidget):
             "birth_end": birth_end,
             "education": self.education_combo.currentData() or "",
             "parttime_education": self.parttime_combo.currentData() or "",
+            "keyword": self.keyword_input.text(),
         }
 
     def save_query_state(self, *_):
@@ -1019,6 +1013,7 @@ class QueryTab(QWidget):
             )
             self.set_combo_by_data(self.education_combo, self._query_state.get("education", ""))
             self.set_combo_by_data(self.parttime_combo, self._query_state.get("parttime_education", ""))
+            self.keyword_input.setText(self._query_state.get("keyword", ""))
         finally:
             del blockers
             self._restoring_query_state = False
@@ -1064,6 +1059,9 @@ class QueryTab(QWidget):
         # 重置学历下拉框
         self.education_combo.setCurrentIndex(0)
         self.parttime_combo.setCurrentIndex(0)
+
+        # 清空全文检索关键词
+        self.keyword_input.clear()
         self.save_query_state()
 
     def update_table_buttons(self, has_results: bool):
@@ -1117,6 +1115,7 @@ class QueryTab(QWidget):
             "birth_end": birth_end,
             "education": education_keywords,
             "parttime_education": parttime_keywords,
+            "keyword": self.keyword_input.text().strip() or None,
         }
 
     def get_last_query_conditions(self):
@@ -1155,7 +1154,12 @@ class QueryTab(QWidget):
         )
 
     def _ai_database_signature(self) -> tuple:
-        return database_file_signature(config.DB_PATH)
+        """数据库路径与变更日志版本号；任何数据写入后版本号都会增大，检查点等无关的文件变化不影响。"""
+        db = Database(config.DB_PATH, open_existing=True)
+        try:
+            return str(config.DB_PATH), db.get_change_version()
+        finally:
+            db.close()
 
     def get_table_total_count(self, table_name: str, query_conditions=None) -> int:
         """按最后一次查询条件获取指定表的总行数。"""
@@ -1163,7 +1167,7 @@ class QueryTab(QWidget):
         if conditions is None:
             return 0
 
-        db = Database(config.DB_PATH)
+        db = Database(config.DB_PATH, open_existing=True)
         try:
             results_dict = db.search_personnel(
                 table_name=table_name,
@@ -1206,13 +1210,9 @@ class QueryTab(QWidget):
         if conditions is None:
             return []
 
-        db = Database(config.DB_PATH)
+        db = Database(config.DB_PATH, open_existing=True)
         try:
-            results_dict = db.search_personnel(
-                table_name=table_name,
-                **conditions,
-            )
-            return [dict(row) for row in results_dict.get(table_name, [])]
+            return ResultSet.concat(db.iter_search_personnel(table_name=table_name, **conditions))
         finally:
             db.close()
 
@@ -1224,7 +1224,7 @@ class QueryTab(QWidget):
         query_conditions=None,
     ):
         """刷新当前页查询结果和表格显示。"""
-        rows = [dict(row) for row in (results_dict or {}).get(table_name, [])]
+        rows = ResultSet.coerce((results_dict or {}).get(table_name, []))
         total_count = int((results_dict or {}).get("total_count", len(rows)))
 
         self.current_results_dict = {table_name: rows}
@@ -1247,27 +1247,16 @@ class QueryTab(QWidget):
         if conditions is None:
             return False
 
-        target_page = max(1, page)
-        offset = (target_page - 1) * self.page_size
+        # 先按（缓存的）总数把越界页码收回到最后一页，只查询一次目标页
+        total_pages = self.get_total_pages(self.db.count_search_personnel(table_name, **conditions))
+        target_page = max(1, min(page, total_pages or 1))
         results_dict = self.db.search_personnel(
             table_name=table_name,
             limit=self.page_size,
-            offset=offset,
+            offset=(target_page - 1) * self.page_size,
             **conditions,
         )
 
-        total_count = int(results_dict.get("total_count", 0))
-        total_pages = self.get_total_pages(total_count)
-        if total_pages and target_page > total_pages:
-            target_page = total_pages
-            offset = (target_page - 1) * self.page_size
-            results_dict = self.db.search_personnel(
-                table_name=table_name,
-                limit=self.page_size,
-                offset=offset,
-                **conditions,
-            )
-
         self.refresh_query_results(
             results_dict,
             table_name=table_name,
@@ -1347,15 +1336,15 @@ class QueryTab(QWidget):
         if cache_key in cache:
             return cache[cache_key]
 
-        db = Database(config.DB_PATH)
+        db = Database(config.DB_PATH, open_existing=True)
         try:
             assessment_years = db.get_assessment_years() or []
             full_results = {}
             for table_name in TABLE_LABELS.keys():
                 if not self.permissions.get(table_name, False):
                     continue
-                table_results = db.search_personnel(table_name=table_name, **query_conditions)
-                full_results[table_name] = table_results.get(table_name, [])
+                # 逐批读取，构建 payload 时只保留允许的字段
+                full_results[table_name] = db.iter_search_personnel(table_name=table_name, **query_conditions)
             analysis_payload = build_ai_analysis_payload(full_results, self.permissions, assessment_years)
         finally:
             db.close()
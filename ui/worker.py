@@ -1,4 +1,5 @@
 import logging
+import threading
 from typing import Callable
 
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
@@ -8,20 +9,39 @@ logger = logging.getLogger("Worker")
 
 
 class Worker(QObject):
-    """Run a callable in a QThread and report the result back with signals."""
+    """Run a callable in a QThread and report the result back with signals.
+
+    With ``reports_progress=True`` the callable is invoked as
+    ``task_fn(report_progress, is_cancelled)``: ``report_progress(info)`` emits
+    ``progress`` and ``is_cancelled()`` turns true once ``cancel()`` is called.
+    """
 
     finished = pyqtSignal(object)
     failed = pyqtSignal(str)
+    progress = pyqtSignal(object)
     done = pyqtSignal()
 
-    def __init__(self, task_fn: Callable):
+    def __init__(self, task_fn: Callable, reports_progress: bool = False):
         super().__init__()
         self.task_fn = task_fn
+        self.reports_progress = reports_progress
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Request cooperative cancellation; safe to call from any thread."""
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
 
     @pyqtSlot()
     def run(self):
         try:
-            self.finished.emit(self.task_fn())
+            if self.reports_progress:
+                result = self.task_fn(self.progress.emit, self.is_cancelled)
+            else:
+                result = self.task_fn()
+            self.finished.emit(result)
         except Exception as e:
             logger.exception("后台任务执行失败")
             self.failed.emit(str(e))
@@ -32,17 +52,23 @@ class Worker(QObject):
 class WorkerResultHandler(QObject):
     """Keep Worker callbacks on the GUI thread."""
 
-    def __init__(self, on_success=None, on_error=None, on_done=None, parent=None):
+    def __init__(self, on_success=None, on_error=None, on_done=None, parent=None, on_progress=None):
         super().__init__(parent)
         self.on_success = on_success
         self.on_error = on_error
         self.on_done = on_done
+        self.on_progress = on_progress
 
     @pyqtSlot(object)
     def handle_finished(self, result):
         if self.on_success is not None:
             self.on_success(result)
 
+    @pyqtSlot(object)
+    def handle_progress(self, info):
+        if self.on_progress is not None:
+            self.on_progress(info)
+
     @pyqtSlot(str)
     def handle_failed(self, message: str):
         if self.on_error is not None: